@@ -11,8 +11,9 @@ from src.level_editor import LevelEditor
 from src.config import *
 from src.assets_manager import load_assets
 from src.enemy_manager import load_enemies  # 🔥 Import enemy loader
+from src.run_store import DEFAULT_PLAYER
 
-def main_app():
+def main_app(player=DEFAULT_PLAYER):
     """
     Hàm điều phối chính của ứng dụng.
     Khởi tạo Pygame MỘT LẦN, sau đó load assets, rồi chạy các trạng thái.
@@ -32,7 +33,7 @@ def main_app():
     selected_level = None
     
     # Tạo instance của manager một lần để giữ lại tiến trình
-    manager = LevelManager(screen)
+    manager = LevelManager(screen, player=player)
 
     while True:
         if app_state == "MENU":
@@ -50,8 +51,11 @@ def main_app():
             game = Game(screen, selected_level)
             game_result = game.run() 
 
-            if game_result == 'COMPLETED' and selected_level != 'ENDLESS_MODE':
+            completed = game_result == 'COMPLETED'
+            if completed and selected_level != 'ENDLESS_MODE':
                 manager.complete_level(selected_level)
+            # Progress ghi ở nền; mọi lượt chơi vào run store (leaderboard)
+            manager.record_run(selected_level, game, completed)
             
             app_state = "MENU"  # Luôn quay lại menu
 
@@ -60,9 +64,17 @@ def main_app():
             editor.run()                  # Chạy editor
             app_state = "MENU"            # Sau khi thoát editor, quay lại menu
 
+    manager.close()  # Đợi tiến độ được ghi xong
     print("Exiting application.")
     pygame.quit()
     sys.exit()
 
 if __name__ == '__main__':
-    main_app()
\ No newline at end of file
+    if '--train' in sys.argv:
+        # Train AI headless: python game.py --train --gen 50 --level level1.json
+        from src.trainer import main as train_main
+        train_main([arg for arg in sys.argv[1:] if arg != '--train'])
+    else:
+        # Tên người chơi cho leaderboard: python game.py --player Alice
+        player = sys.argv[sys.argv.index('--player') + 1] if '--player' in sys.argv[:-1] else DEFAULT_PLAYER
+        main_app(player)
\ No newline at end of file
@@ -0,0 +1,304 @@
+# checkpoint.py - INCREMENTAL NEAT TRAINING CHECKPOINTS
+import gzip
+import hashlib
+import os
+import pickle
+import random
+import re
+import zlib
+
+import neat
+from neat.reporting import BaseReporter, ReporterSet
+from neat.species import Species
+
+DEFAULT_CHECKPOINT_DIR = "checkpoints"
+GENOME_STORE_FILE = "genomes.dat"
+# Store sau khi compact: tên mới để manifest cũ vẫn trỏ vào file cũ cho tới khi được ghi lại
+COMPACT_STORE_PATTERN = "genomes-{0:05d}.dat"
+MANIFEST_PATTERN = "gen-{0:05d}.ckpt"
+MANIFEST_RE = re.compile(r"^gen-(\d+)\.ckpt$")
+# Mỗi lần train mới (không --resume) có thư mục riêng trong checkpoint dir
+RUN_DIR_PATTERN = "run-{0:04d}"
+RUN_DIR_RE = re.compile(r"^run-(\d+)$")
+# Compact genome store khi phần còn được tham chiếu nhỏ hơn tỉ lệ này của file
+COMPACT_LIVE_RATIO = 0.5
+CHECKPOINT_VERSION = 1
+
+# -------------------------
+# Append-only Genome Store
+# -------------------------
+class GenomeStore:
+    """
+    File append-only chứa các genome đã nén (zlib + pickle).
+    Genome được định danh bằng hash nội dung: genome không đổi giữa hai checkpoint
+    (elites, representatives) không bị ghi lại, manifest chỉ lưu (offset, length).
+    """
+    def __init__(self, path):
+        self.path = path
+        self.known = {}  # content hash -> (offset, length)
+
+    def put(self, genome, handle):
+        blob = zlib.compress(pickle.dumps(genome, protocol=pickle.HIGHEST_PROTOCOL))
+        digest = hashlib.sha1(blob).hexdigest()
+        ref = self.known.get(digest)
+        if ref is None:
+            offset = handle.tell()
+            handle.write(blob)
+            ref = (offset, len(blob))
+            self.known[digest] = ref
+        return ref
+
+    def get(self, ref, handle):
+        offset, length = ref
+        handle.seek(offset)
+        return pickle.loads(zlib.decompress(handle.read(length)))
+
+# -------------------------
+# Run directories / manifests
+# -------------------------
+def _numbered_entries(directory, pattern):
+    """[(số, path)] của các entry khớp pattern, sắp xếp theo số (không theo tên file)."""
+    if not os.path.isdir(directory):
+        return []
+    found = []
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match:
+            found.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(found)
+
+def list_manifests(directory):
+    """[(generation, path)] các manifest trong một thư mục run, theo generation."""
+    return _numbered_entries(directory, MANIFEST_RE)
+
+def new_run_directory(root=DEFAULT_CHECKPOINT_DIR):
+    """Tạo thư mục run-NNNN mới trong root cho một lần train mới."""
+    runs = [number for number, path in _numbered_entries(root, RUN_DIR_RE) if os.path.isdir(path)]
+    path = os.path.join(root, RUN_DIR_PATTERN.format(max(runs, default=0) + 1))
+    os.makedirs(path)
+    return path
+
+def _manifest_refs(manifest):
+    refs = [tuple(ref) for ref in manifest["genomes"].values()]
+    refs.extend(tuple(data["representative"]) for data in manifest["species"])
+    return refs
+
+def _manifest_store(manifest):
+    return manifest.get("genome_store", GENOME_STORE_FILE)
+
+def _write_manifest(manifest, manifest_path):
+    tmp_path = manifest_path + ".tmp"
+    with gzip.open(tmp_path, "wb", compresslevel=5) as f:
+        pickle.dump(manifest, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, manifest_path)
+
+# -------------------------
+# Checkpoint Reporter
+# -------------------------
+class IncrementalCheckpointer(BaseReporter):
+    """
+    Lưu population, species, trạng thái RNG, bộ đếm id và fitness cache mỗi
+    generation_interval generations. Chỉ các genome mới được ghi vào genomes.dat;
+    mỗi checkpoint còn lại là một manifest nhỏ (gzip pickle) trỏ vào file đó.
+    directory là thư mục của riêng lần train này (new_run_directory, hoặc thư mục của
+    checkpoint đang resume): chỉ keep_manifests manifest mới nhất (theo generation) được giữ,
+    và genome store được compact khi phần lớn nội dung không còn manifest nào dùng.
+    """
+    def __init__(self, population, directory=DEFAULT_CHECKPOINT_DIR, generation_interval=5,
+                 fitness_cache=None, keep_manifests=5, extra_state=None):
+        self.population = population
+        # extra_state(): dict trạng thái riêng của trainer (ví dụ curriculum stage)
+        self.extra_state = extra_state
+        self.directory = directory
+        self.generation_interval = generation_interval
+        self.fitness_cache = fitness_cache
+        self.keep_manifests = keep_manifests
+        self.current_generation = None
+        self.last_checkpoint_generation = population.generation
+        os.makedirs(directory, exist_ok=True)
+        self.store = GenomeStore(os.path.join(directory, GENOME_STORE_FILE))
+        self._load_known_refs()
+
+    def _load_known_refs(self):
+        """Khi resume, nạp hash của các genome trong checkpoint mới nhất để không ghi lại chúng."""
+        manifests = list_manifests(self.directory)
+        if not manifests:
+            return
+        manifest = _read_manifest(manifests[-1][1])
+        self.store = GenomeStore(os.path.join(self.directory, _manifest_store(manifest)))
+        if not os.path.exists(self.store.path):
+            return
+        with open(self.store.path, "rb") as handle:
+            for ref in _manifest_refs(manifest):
+                handle.seek(ref[0])
+                self.store.known[hashlib.sha1(handle.read(ref[1])).hexdigest()] = ref
+
+    def start_generation(self, generation):
+        self.current_generation = generation
+
+    def end_generation(self, config, population, species_set):
+        # population lúc này là thế hệ kế tiếp (chưa đánh giá)
+        next_generation = self.current_generation + 1
+        if next_generation - self.last_checkpoint_generation >= self.generation_interval:
+            self.save_checkpoint(config, population, species_set, next_generation)
+            self.last_checkpoint_generation = next_generation
+
+    def save_checkpoint(self, config, population, species_set, generation):
+        genome_refs = {}
+        species_data = []
+        # Ghi genome trước, fsync rồi mới ghi manifest: nếu bị dừng giữa chừng,
+        # manifest cũ vẫn chỉ trỏ tới dữ liệu hợp lệ.
+        with open(self.store.path, "ab") as handle:
+            for genome_id, genome in population.items():
+                genome_refs[genome_id] = self.store.put(genome, handle)
+            for sid, s in species_set.species.items():
+                species_data.append({
+                    "key": s.key,
+                    "created": s.created,
+                    "last_improved": s.last_improved,
+                    "fitness": s.fitness,
+                    "adjusted_fitness": s.adjusted_fitness,
+                    "fitness_history": list(s.fitness_history),
+                    "members": list(s.members.keys()),
+                    "representative": self.store.put(s.representative, handle),
+                })
+            handle.flush()
+            os.fsync(handle.fileno())
+
+        reproduction = self.population.reproduction
+        manifest = {
+            "version": CHECKPOINT_VERSION,
+            "generation": generation,
+            "config": config,
+            "genomes": genome_refs,
+            "species": species_data,
+            "species_indexer": species_set.indexer,
+            "genome_to_species": dict(species_set.genome_to_species),
+            "genome_indexer": reproduction.genome_indexer,
+            # Chỉ cha mẹ của genome còn sống: reproduction.ancestors giữ mọi genome từng sinh ra
+            "ancestors": {gid: reproduction.ancestors[gid] for gid in population
+                          if gid in reproduction.ancestors},
+            "random_state": random.getstate(),
+            "fitness_cache": None,
+            "extra": self.extra_state() if self.extra_state is not None else {},
+            "genome_store": os.path.basename(self.store.path),
+        }
+        if self.fitness_cache is not None:
+            self.fitness_cache.save()
+            manifest["fitness_cache"] = self.fitness_cache.path
+
+        manifest_path = os.path.join(self.directory, MANIFEST_PATTERN.format(generation))
+        _write_manifest(manifest, manifest_path)
+        print(f"💾 Checkpoint saved: {manifest_path} ({os.path.getsize(self.store.path)} bytes of genomes)")
+        self._prune_manifests()
+        self._compact_store(generation)
+
+    def _prune_manifests(self):
+        if not self.keep_manifests:
+            return
+        for _, path in list_manifests(self.directory)[:-self.keep_manifests]:
+            os.remove(path)
+
+    def _compact_store(self, generation):
+        """
+        Chép các genome mà manifest còn lại dùng sang store mới, ghi lại các manifest trỏ vào
+        store mới, rồi mới xoá store cũ. Dừng giữa chừng thì mỗi manifest vẫn trỏ vào một
+        store còn nguyên vẹn.
+        """
+        manifests = [(path, _read_manifest(path)) for _, path in list_manifests(self.directory)]
+        live = set()
+        for _, manifest in manifests:
+            live.update(_manifest_refs(manifest))
+        live_bytes = sum(length for _, length in live)
+        store_bytes = sum(os.path.getsize(os.path.join(self.directory, name))
+                          for name in {_manifest_store(manifest) for _, manifest in manifests})
+        if store_bytes == 0 or live_bytes >= store_bytes * COMPACT_LIVE_RATIO:
+            return
+
+        new_store = GenomeStore(os.path.join(self.directory, COMPACT_STORE_PATTERN.format(generation)))
+        remap = {}
+        with open(new_store.path, "wb") as out:
+            for path, manifest in manifests:
+                old_refs = [ref for ref in _manifest_refs(manifest) if (_manifest_store(manifest), ref) not in remap]
+                with open(os.path.join(self.directory, _manifest_store(manifest)), "rb") as handle:
+                    for ref in old_refs:
+                        handle.seek(ref[0])
+                        blob = handle.read(ref[1])
+                        digest = hashlib.sha1(blob).hexdigest()
+                        new_ref = new_store.known.get(digest)
+                        if new_ref is None:
+                            new_ref = (out.tell(), len(blob))
+                            out.write(blob)
+                            new_store.known[digest] = new_ref
+                        remap[(_manifest_store(manifest), ref)] = new_ref
+            out.flush()
+            os.fsync(out.fileno())
+
+        for path, manifest in manifests:
+            store_name = _manifest_store(manifest)
+            manifest["genomes"] = {gid: remap[(store_name, tuple(ref))] for gid, ref in manifest["genomes"].items()}
+            for data in manifest["species"]:
+                data["representative"] = remap[(store_name, tuple(data["representative"]))]
+            manifest["genome_store"] = os.path.basename(new_store.path)
+            _write_manifest(manifest, path)
+
+        for name in os.listdir(self.directory):
+            if name.endswith(".dat") and name != os.path.basename(new_store.path):
+                os.remove(os.path.join(self.directory, name))
+        self.store = new_store
+        print(f"🗜️ Compacted genome store: {store_bytes} -> {os.path.getsize(new_store.path)} bytes")
+
+# -------------------------
+# Restore
+# -------------------------
+def _read_manifest(path):
+    with gzip.open(path, "rb") as f:
+        manifest = pickle.load(f)
+    if manifest.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version in {path}")
+    return manifest
+
+def latest_checkpoint(directory=DEFAULT_CHECKPOINT_DIR):
+    """
+    Manifest mới nhất (theo generation) của lần train mới nhất (run-NNNN lớn nhất có
+    checkpoint). Thư mục chứa trực tiếp gen-*.ckpt (layout cũ) vẫn được đọc.
+    """
+    for _, run_dir in reversed(_numbered_entries(directory, RUN_DIR_RE)):
+        manifests = list_manifests(run_dir)
+        if manifests:
+            return manifests[-1][1]
+    manifests = list_manifests(directory)
+    return manifests[-1][1] if manifests else None
+
+def restore_checkpoint(path):
+    """
+    Dựng lại neat.Population từ một manifest.
+    Trả về (population, fitness_cache_path, extra_state).
+    Trạng thái RNG toàn cục được khôi phục như neat.Checkpointer.
+    """
+    manifest = _read_manifest(path)
+    config = manifest["config"]
+    store = GenomeStore(os.path.join(os.path.dirname(path), _manifest_store(manifest)))
+
+    with open(store.path, "rb") as handle:
+        genomes = {gid: store.get(ref, handle) for gid, ref in manifest["genomes"].items()}
+        species_set = config.species_set_type(config.species_set_config, ReporterSet())
+        for data in manifest["species"]:
+            s = Species(data["key"], data["created"])
+            s.last_improved = data["last_improved"]
+            s.fitness = data["fitness"]
+            s.adjusted_fitness = data["adjusted_fitness"]
+            s.fitness_history = data["fitness_history"]
+            s.representative = store.get(data["representative"], handle)
+            s.members = {gid: genomes[gid] for gid in data["members"] if gid in genomes}
+            species_set.species[s.key] = s
+    species_set.genome_to_species = manifest["genome_to_species"]
+    species_set.indexer = manifest["species_indexer"]
+
+    population = neat.Population(config, (genomes, species_set, manifest["generation"]))
+    species_set.reporters = population.reporters
+    population.reproduction.genome_indexer = manifest["genome_indexer"]
+    population.reproduction.ancestors = manifest["ancestors"]
+    random.setstate(manifest["random_state"])
+    print(f"✓ Restored generation {manifest['generation']} ({len(genomes)} genomes) from {path}")
+    return population, manifest["fitness_cache"], manifest["extra"]
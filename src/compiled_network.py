@@ -0,0 +1,124 @@
+# compiled_network.py - NUMPY FEED-FORWARD EVALUATION FOR NEAT GENOMES
+import numpy as np
+from neat.graphs import feed_forward_layers
+
+# Chỉ hỗ trợ đúng những gì config-neat.txt cho phép
+SUPPORTED_ACTIVATION = "sigmoid"
+SUPPORTED_AGGREGATION = "sum"
+
+def sigmoid(z):
+    """Giống neat.activations.sigmoid_activation (hệ số 5, clamp ±60)"""
+    z = np.clip(5.0 * z, -60.0, 60.0)
+    return 1.0 / (1.0 + np.exp(-z))
+
+def compile_genome(genome, config):
+    """
+    Sắp xếp topo genome thành các layer (giống neat.nn.FeedForwardNetwork.create).
+    Trả về dict:
+    - node_index: node key -> cột (inputs trước, rồi outputs, rồi hidden)
+    - layers: list các list node index, theo thứ tự tính
+    - weights: list (out_index, in_index, weight)
+    - bias, response: dict node index -> giá trị
+    """
+    genome_config = config.genome_config
+    if not genome_config.feed_forward:
+        raise ValueError("Only feed_forward genomes can be compiled")
+
+    input_keys = genome_config.input_keys
+    output_keys = genome_config.output_keys
+    connections = [cg.key for cg in genome.connections.values() if cg.enabled]
+    layers = feed_forward_layers(input_keys, output_keys, connections)
+    # neat-python >= 1.0 trả về (layers, required)
+    if isinstance(layers, tuple):
+        layers = layers[0]
+
+    node_index = {}
+    for key in list(input_keys) + list(output_keys):
+        node_index[key] = len(node_index)
+
+    compiled_layers = []
+    weights = []
+    bias = {}
+    response = {}
+    for layer in layers:
+        layer_nodes = []
+        for node in sorted(layer):
+            if node not in node_index:
+                node_index[node] = len(node_index)
+            ng = genome.nodes[node]
+            if ng.activation != SUPPORTED_ACTIVATION or ng.aggregation != SUPPORTED_AGGREGATION:
+                raise ValueError(f"Node {node}: unsupported {ng.activation}/{ng.aggregation}")
+            idx = node_index[node]
+            layer_nodes.append(idx)
+            bias[idx] = ng.bias
+            response[idx] = ng.response
+        compiled_layers.append(layer_nodes)
+
+    for inode, onode in connections:
+        # Connection từ node không được tính (không nối tới input) có giá trị 0, bỏ qua
+        if onode in node_index and inode in node_index:
+            weights.append((node_index[onode], node_index[inode], genome.connections[(inode, onode)].weight))
+
+    return {
+        "node_index": node_index,
+        "layers": compiled_layers,
+        "weights": weights,
+        "bias": bias,
+        "response": response,
+    }
+
+class CompiledPopulation:
+    """
+    Mạng của cả population dưới dạng tensor:
+    W (P, N, N), bias/response (P, N) và mask (L, P, N) cho từng layer.
+    activate() tính output của mọi genome cho một batch observations (một dòng / genome)
+    bằng L phép nhân ma trận theo batch thay vì duyệt node Python cho từng agent.
+    """
+    def __init__(self, genomes, config):
+        genome_config = config.genome_config
+        self.num_inputs = len(genome_config.input_keys)
+        self.num_outputs = len(genome_config.output_keys)
+        compiled = [compile_genome(genome, config) for genome in genomes]
+
+        num_genomes = len(compiled)
+        num_nodes = max([len(c["node_index"]) for c in compiled] + [self.num_inputs + self.num_outputs])
+        num_layers = max([len(c["layers"]) for c in compiled] + [0])
+
+        self.weights = np.zeros((num_genomes, num_nodes, num_nodes), dtype=np.float64)
+        self.bias = np.zeros((num_genomes, num_nodes), dtype=np.float64)
+        self.response = np.ones((num_genomes, num_nodes), dtype=np.float64)
+        self.layer_masks = np.zeros((num_layers, num_genomes, num_nodes), dtype=bool)
+
+        for p, c in enumerate(compiled):
+            for out_idx, in_idx, weight in c["weights"]:
+                self.weights[p, out_idx, in_idx] += weight
+            for idx, value in c["bias"].items():
+                self.bias[p, idx] = value
+            for idx, value in c["response"].items():
+                self.response[p, idx] = value
+            for l, layer_nodes in enumerate(c["layers"]):
+                self.layer_masks[l, p, layer_nodes] = True
+
+        self.num_nodes = num_nodes
+
+    def __len__(self):
+        return len(self.weights)
+
+    def activate(self, inputs, rows=None):
+        """
+        inputs: (len(rows), num_inputs). rows: chỉ số genome cần tính (mặc định: tất cả).
+        Trả về outputs (len(rows), num_outputs).
+        """
+        inputs = np.asarray(inputs, dtype=np.float64)
+        if rows is None:
+            weights, bias, response, masks = self.weights, self.bias, self.response, self.layer_masks
+        else:
+            weights, bias, response = self.weights[rows], self.bias[rows], self.response[rows]
+            masks = self.layer_masks[:, rows]
+
+        values = np.zeros((len(weights), self.num_nodes), dtype=np.float64)
+        values[:, :self.num_inputs] = inputs
+        for mask in masks:
+            z = np.einsum("pij,pj->pi", weights, values)
+            values = np.where(mask, sigmoid(bias + response * z), values)
+        return values[:, self.num_inputs:self.num_inputs + self.num_outputs]
@@ -75,6 +75,11 @@ CAMERA_CATCH_UP_SPEED_MULTIPLIER = 1.0
 # GAME SETTINGS
 # ============================================
 MAX_STEPS_PER_GENOME = 2000
+
+# Early termination khi train AI (0 = tắt)
+EARLY_STOP_NO_PROGRESS_TICKS = 90   # Không tiến về phía trước trong K ticks
+EARLY_STOP_WALL_SLIDE_TICKS = 45    # Trượt tường mà không leo lên được trong K ticks
+EARLY_STOP_TOP_K = 2                # Dừng nếu không thể vượt top-k của generation hiện tại
 DEFAULT_GENERATIONS = 40
 DEFAULT_LEVEL = "level_tutorial.json"
 
@@ -0,0 +1,484 @@
+# difficulty_analyzer.py - LEVEL DIFFICULTY FROM SIMULATED PLAY
+import argparse
+import glob
+import json
+import math
+import multiprocessing
+import os
+from bisect import bisect_right
+
+from config import *
+from main import build_level
+from simulation import Simulation, STATUS_RUNNING, STATUS_COMPLETED, ACTION_NOOP, ACTION_JUMP
+
+# Số frame nhìn lại trước điểm chết để tìm thời điểm nhảy (> thời gian bám tường tối đa)
+LOOKBACK_TICKS = int(WALL_CLIMB_TIME_LIMIT * FPS) + 30
+# Giới hạn số tick mô phỏng cho một level (tránh quay lui vô hạn trên level không qua được)
+SEARCH_BUDGET = 500_000
+# Số hot spot được báo cáo
+HOT_SPOTS = 5
+
+# Nhãn metadata (màu trong level_manager) theo score
+DIFFICULTY_LABELS = {1: "Easy", 2: "Normal", 3: "Hard", 4: "Expert"}
+# Cửa sổ phản xạ nhỏ nhất (ticks) cho score 1, 2, 3; nhỏ hơn nữa là 4
+WINDOW_THRESHOLDS = (24, 14, 8)
+# Mật độ cú nhảy bắt buộc (trên 1000px) làm tăng score thêm 1
+DENSE_JUMPS_PER_1000PX = 6
+
+class _BudgetExceeded(Exception):
+    pass
+
+class ScriptedAgent:
+    """
+    Agent "nhảy muộn": chạy thẳng cho đến khi chết, rồi quay lui tới các frame trước đó và
+    thử nhảy. Một frame chỉ hợp lệ nếu sau cú nhảy ở đó phần còn lại của level vẫn qua được
+    (_viable); các frame hợp lệ liên tiếp tạo thành cửa sổ phản xạ của quyết định. Agent chọn
+    các frame sao cho cửa sổ nhỏ nhất trên cả đường đi là lớn nhất (maximin, _best), nên cửa sổ
+    đo được là tính chất của level chứ không phụ thuộc lựa chọn ở các quyết định trước.
+    Mỗi quyết định là một cú nhảy bắt buộc.
+    Kết quả được memo theo vị trí tại frame nhảy (không có tick, như LevelSolver), và các đoạn
+    chạy thẳng được dùng chung khi nhánh nhảy sớm/muộn hội tụ lại trên cùng platform.
+    """
+    def __init__(self, sim, max_ticks=None, budget=SEARCH_BUDGET):
+        self.sim = sim
+        if max_ticks is None:
+            max_ticks = MAX_STEPS_PER_GENOME if sim.is_endless else default_max_ticks(sim.level_length)
+        self.max_ticks = max_ticks
+        self.budget = budget
+        self.ticks_used = 0
+        self.budget_exceeded = False
+        # (tick, world x, số frame nhảy hợp lệ, cửa sổ liên tục chứa frame đã chọn)
+        self.decisions = []
+        # Cửa sổ nhỏ nhất trên đường đi tốt nhất (None nếu không có cú nhảy bắt buộc)
+        self.min_window = None
+        # world x -> số lần bế tắc tại đó
+        self.dead_ends = {}
+        self.furthest_x = 0.0
+        # trạng thái trên một đoạn chạy thẳng -> _Run chứa nó
+        self._runs = {}
+        # vị trí tại frame nhảy -> qua được level hay không
+        self._viable_memo = {}
+        # vị trí tại frame nhảy -> (kết quả của _best với tick tương đối, alpha đã dùng)
+        self._best_memo = {}
+
+    def _step(self, action):
+        self.ticks_used += 1
+        if self.ticks_used > self.budget:
+            raise _BudgetExceeded()
+        return self.sim.step(action)
+
+    def _succeeded(self):
+        # Level endless: sống tới max_ticks; level thường: phải hoàn thành
+        sim = self.sim
+        if sim.is_endless:
+            return sim.status is STATUS_RUNNING and sim.ticks >= self.max_ticks
+        return sim.status == STATUS_COMPLETED
+
+    def _can_jump(self):
+        player = self.sim.player
+        return player.on_ground or (player.wall_state.is_sliding and player.wall_state.can_jump)
+
+    def _state_key(self):
+        sim = self.sim
+        player = sim.player
+        wall = player.wall_state
+        return (sim.ticks, round(sim.world_x_offset, 2), player.hitbox.y, round(player.vy, 3), player.on_ground,
+                wall.is_sliding, wall.side, wall.can_jump, round(wall.time_elapsed, 2),
+                round(max(wall.jump_cooldown, 0.0), 2), round(max(wall.re_attach_cooldown, 0.0), 2))
+
+    def _position_key(self):
+        # Như LevelSolver._state_key: không có tick, x làm tròn tới pixel. Cùng vị trí ở tick
+        # khác (bám tường lâu hơn, đứng chờ ở chân tường) được coi là có cùng tương lai; với
+        # level endless (tăng tốc theo thời gian) đây là xấp xỉ, _replay kiểm tra lại đường đi
+        sim = self.sim
+        player = sim.player
+        wall = player.wall_state
+        return (round(sim.world_x_offset), player.hitbox.y, round(player.vy, 3), player.on_ground,
+                wall.is_sliding, wall.side, wall.can_jump, round(wall.time_elapsed, 2),
+                round(max(wall.jump_cooldown, 0.0), 2), round(max(wall.re_attach_cooldown, 0.0), 2))
+
+    def solve(self):
+        """True nếu tìm được cách hoàn thành level (hoặc sống tới max_ticks)."""
+        self.sim.reset()
+        try:
+            result = self._best(self.sim.snapshot(), 0)
+        except _BudgetExceeded:
+            self.budget_exceeded = True
+            return False
+        if result is None:
+            return False
+        bottleneck, decisions = result
+        self.decisions = list(decisions)
+        self.min_window = None if bottleneck == math.inf else bottleneck
+        if not self._replay():
+            # Memo theo vị trí là xấp xỉ: đường đi chọn được phải qua được khi chơi lại
+            self.decisions = []
+            self.min_window = None
+            return False
+        return True
+
+    def _replay(self):
+        """Chơi lại đường đi đã chọn để sim dừng ở trạng thái cuối (ticks của lượt chơi).
+        True nếu qua được level."""
+        sim = self.sim
+        sim.reset()
+        jumps = {t for t, _, _, _ in self.decisions}
+        while not sim.done and sim.ticks < self.max_ticks:
+            sim.step(ACTION_JUMP if sim.ticks in jumps else ACTION_NOOP)
+        return self._succeeded()
+
+    def _frames(self, state):
+        """
+        Chạy thẳng từ state tới khi chết. Trả về (_Run, các frame nhảy được (tick, snapshot)
+        trong LOOKBACK_TICKS trước điểm chết, từ state trở đi). Khi gặp một trạng thái đã nằm
+        trên run của nhánh khác thì dùng chung run đó từ điểm hội tụ.
+        """
+        sim = self.sim
+        sim.restore(state)
+        own = []
+        keys = []
+        merged = None
+        best_x = sim.player_world_x
+        progress_tick = sim.ticks
+        while not sim.done and sim.ticks < self.max_ticks:
+            key = self._state_key()
+            merged = self._runs.get(key)
+            if merged is not None:
+                break
+            keys.append(key)
+            if self._can_jump():
+                own.append((sim.ticks, sim.snapshot()))
+            self._step(ACTION_NOOP)
+            if sim.player_world_x > best_x:
+                best_x = sim.player_world_x
+                progress_tick = sim.ticks
+            elif sim.player.on_ground and sim.ticks - progress_tick >= EARLY_STOP_NO_PROGRESS_TICKS:
+                # Kẹt (ví dụ chạy vào chân tường): coi như chết ở đây
+                break
+        self.furthest_x = max(self.furthest_x, sim.player_world_x)
+
+        if merged is None:
+            run = _Run(self._succeeded(), sim.ticks, sim.player_world_x)
+            window_start = run.death_tick - LOOKBACK_TICKS
+            run.frames = [(t, snapshot) for t, snapshot in own if t >= window_start]
+            for key in keys:
+                self._runs[key] = run
+            return run, run.frames
+        merge_tick = sim.ticks
+        window_start = merged.death_tick - LOOKBACK_TICKS
+        frames = [(t, snapshot) for t, snapshot in own if t >= window_start]
+        frames.extend((t, snapshot) for t, snapshot in merged.frames if t >= merge_tick)
+        return merged, frames
+
+    def _jump(self):
+        """Nhảy ở frame hiện tại rồi bay tới frame nhảy được tiếp theo (đáp đất hoặc bám tường).
+        Trả về True (qua level), None (chết) hoặc snapshot tại frame đó."""
+        sim = self.sim
+        self._step(ACTION_JUMP)
+        while not sim.done and sim.ticks < self.max_ticks and not self._can_jump():
+            self._step(ACTION_NOOP)
+        if self._succeeded():
+            return True
+        if sim.done or sim.ticks >= self.max_ticks:
+            return None
+        return sim.snapshot()
+
+    def _viable(self):
+        """Nhảy ở frame hiện tại có còn qua được level không (tìm sâu, dừng ở lời giải đầu tiên)."""
+        key = self._position_key()
+        viable = self._viable_memo.get(key)
+        if viable is not None:
+            return viable
+        outcome = self._jump()
+        if outcome is None or outcome is True:
+            viable = outcome is True
+        else:
+            run, frames = self._frames(outcome)
+            viable = run.success
+            # Thử nhảy muộn trước
+            for _, snapshot in reversed(frames):
+                if viable:
+                    break
+                self.sim.restore(snapshot)
+                viable = self._viable()
+            if not viable:
+                x = round(run.death_x)
+                self.dead_ends[x] = self.dead_ends.get(x, 0) + 1
+        self._viable_memo[key] = viable
+        return viable
+
+    def _jump_best(self, alpha):
+        """
+        _best sau cú nhảy ở frame hiện tại. Memo theo vị trí tại frame nhảy (_position_key),
+        tick của các decision được lưu tương đối so với frame nhảy và dời lại khi dùng lại.
+        """
+        key = self._position_key()
+        tick = self.sim.ticks
+        memo = self._best_memo.get(key)
+        if memo is not None:
+            result, memo_alpha = memo
+            if result is not None:
+                return _shift(result, tick) if result[0] > alpha else None
+            if alpha >= memo_alpha:
+                return None
+        outcome = self._jump()
+        if outcome is None:
+            result = None
+        elif outcome is True:
+            result = (math.inf, ())
+        else:
+            result = self._best(outcome, alpha)
+        self._best_memo[key] = (_shift(result, -tick), alpha)
+        return result if result is not None and result[0] > alpha else None
+
+    def _best(self, state, alpha):
+        """
+        Đường đi có cửa sổ nhỏ nhất lớn nhất từ state: (cửa sổ nhỏ nhất, decisions), chính xác
+        nếu lớn hơn alpha; None nếu mọi đường đi đều không quá alpha (hoặc không qua được).
+        """
+        sim = self.sim
+        run, frames = self._frames(state)
+        if run.success:
+            return (math.inf, ())
+        snapshots = dict(frames)
+        viable = set()
+        for t, snapshot in frames:
+            sim.restore(snapshot)
+            if self._viable():
+                viable.add(t)
+        if not viable:
+            return None
+
+        runs = _contiguous_runs([t for t, _ in frames], viable)
+        run_of = {t: window for window in runs for t in range(window[0], window[1] + 1)}
+        def width(t):
+            first, last = run_of[t]
+            return last - first + 1
+        # Cửa sổ rộng trước, trong cửa sổ ưu tiên giữa cửa sổ (cách chơi an toàn nhất)
+        order = sorted(viable, key=lambda t: (-width(t), abs(t - sum(run_of[t]) / 2)))
+        best = None
+        for t in order:
+            floor = alpha if best is None else max(alpha, best[0])
+            if width(t) <= floor:
+                # Cửa sổ của các frame còn lại không vượt được kết quả đang có
+                break
+            sim.restore(snapshots[t])
+            child = self._jump_best(floor)
+            if child is None:
+                continue
+            decision = (t, snapshots[t][0] + PLAYER_TARGET_X, len(viable), width(t))
+            best = (min(width(t), child[0]), (decision,) + child[1])
+        return best
+
+class _Run:
+    """Một đoạn chạy thẳng tới điểm chết và các frame nhảy được trong LOOKBACK_TICKS trước đó."""
+    __slots__ = ("success", "death_tick", "death_x", "frames")
+
+    def __init__(self, success, death_tick, death_x):
+        self.success = success
+        self.death_tick = death_tick
+        self.death_x = death_x
+        self.frames = []
+
+def _shift(result, ticks):
+    """Dời tick của các decision trong kết quả _best."""
+    if result is None or ticks == 0:
+        return result
+    bottleneck, decisions = result
+    return bottleneck, tuple((t + ticks, x, viable, window) for t, x, viable, window in decisions)
+
+def default_max_ticks(level_length):
+    """Đủ thời gian để chạy hết level gấp đôi thời gian chạy thẳng (leo tường, đứng chờ)."""
+    return int(2 * level_length / RUN_SPEED) + LOOKBACK_TICKS
+
+def _contiguous_runs(jumpable, viable):
+    """
+    Các cửa sổ (first, last) của frame nhảy được liên tiếp trong danh sách jumpable,
+    ví dụ jumpable [3, 5, 7, 9], viable {3, 5, 9} -> [(3, 5), (9, 9)].
+    """
+    runs = []
+    previous_viable = False
+    for t in jumpable:
+        if t in viable:
+            if previous_viable:
+                runs[-1] = (runs[-1][0], t)
+            else:
+                runs.append((t, t))
+        previous_viable = t in viable
+    return runs
+
+def _section_starts(level_data):
+    """x bắt đầu của từng segment trong world (segment 0 là safe zone)."""
+    starts = []
+    x = 0
+    for seg in level_data["world"]:
+        starts.append(x)
+        x += seg["length"]
+    return starts
+
+def difficulty_score(min_window, jumps_per_1000px):
+    """1 (Easy) .. 4 (Expert) từ cửa sổ phản xạ nhỏ nhất (ticks) và mật độ cú nhảy."""
+    score = len(WINDOW_THRESHOLDS) + 1
+    for i, threshold in enumerate(WINDOW_THRESHOLDS):
+        if min_window >= threshold:
+            score = i + 1
+            break
+    if jumps_per_1000px >= DENSE_JUMPS_PER_1000PX:
+        score += 1
+    return min(score, len(DIFFICULTY_LABELS))
+
+def analyze_level_play(level_json, seed=0, max_ticks=None, budget=SEARCH_BUDGET):
+    """
+    Chơi thử level bằng ScriptedAgent và trả về dict:
+    completed, ticks, forced_jumps, jumps_per_1000px, min/mean reaction window (ticks, ms),
+    hot_spots (các cú nhảy có cửa sổ hẹp nhất), failure_hot_spots (nơi agent hay bế tắc),
+    failure (điểm bế tắc nếu không qua được),
+    score / label (None nếu không qua được, kể cả khi hết budget: level chưa có nhãn).
+    Level endless được chơi với seed và phải sống tới max_ticks (mặc định MAX_STEPS_PER_GENOME).
+    """
+    level_data = build_level(level_json)
+    sim = Simulation(level_data, seed=seed)
+    agent = ScriptedAgent(sim, max_ticks=max_ticks, budget=budget)
+    completed = agent.solve()
+
+    starts = None if level_data["is_endless"] else _section_starts(level_data)
+    def section_of(x):
+        # -1: safe zone
+        return None if starts is None else bisect_right(starts, x) - 2
+
+    windows = [window for _, _, _, window in agent.decisions]
+    distance = max(agent.furthest_x, 1.0)
+    if completed and not level_data["is_endless"]:
+        distance = level_data["length"]
+    forced_jumps = len(agent.decisions)
+    jumps_per_1000px = forced_jumps / distance * 1000
+    min_window = agent.min_window
+    report = {
+        "completed": completed,
+        "ticks": sim.ticks if completed else None,
+        "distance": round(distance),
+        # Chỉ đo được trên một đường đi qua hết level
+        "forced_jumps": forced_jumps if completed else None,
+        "jumps_per_1000px": round(jumps_per_1000px, 2) if completed else None,
+        "min_window_ticks": min_window,
+        "min_window_ms": None if min_window is None else round(min_window * 1000 / FPS),
+        "mean_window_ticks": round(sum(windows) / len(windows), 1) if windows else None,
+        "hot_spots": [
+            {"x": round(x), "section": section_of(x), "window_ticks": window, "viable_ticks": viable}
+            for _, x, viable, window in sorted(agent.decisions, key=lambda d: d[3])[:HOT_SPOTS]
+        ],
+        # Nơi agent bế tắc trong lúc tìm (kể cả khi cuối cùng vẫn qua được)
+        "failure_hot_spots": [
+            {"x": x, "section": section_of(x), "dead_ends": count}
+            for x, count in sorted(agent.dead_ends.items(), key=lambda item: -item[1])[:HOT_SPOTS]
+        ],
+        "failure": None,
+        "search_ticks": agent.ticks_used,
+        "score": None,
+        "label": None,
+    }
+    if not completed:
+        # Nơi agent bế tắc nhiều nhất, hoặc xa nhất nếu hết budget
+        if agent.dead_ends:
+            x = max(agent.dead_ends, key=lambda k: (agent.dead_ends[k], k))
+        else:
+            x = round(agent.furthest_x)
+        report["failure"] = {"x": x, "section": section_of(x), "furthest_x": round(agent.furthest_x),
+                             "budget_exceeded": agent.budget_exceeded}
+    else:
+        score = difficulty_score(min_window if min_window is not None else WINDOW_THRESHOLDS[0], jumps_per_1000px)
+        report["score"] = score
+        report["label"] = DIFFICULTY_LABELS[score]
+    return report
+
+# -------------------------
+# Batch
+# -------------------------
+def _analyze_file(task):
+    filename, seed, max_ticks, budget = task
+    with open(filename, "r", encoding="utf-8") as f:
+        level_json = json.load(f)
+    report = analyze_level_play(level_json, seed=seed, max_ticks=max_ticks, budget=budget)
+    report["file"] = filename
+    return report
+
+def level_files(paths):
+    """Các file .json từ danh sách file / thư mục."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.json"))))
+        else:
+            files.append(path)
+    return files
+
+def analyze_files(files, seed=0, max_ticks=None, workers=None, budget=SEARCH_BUDGET):
+    """Phân tích nhiều level song song (mỗi level một task). Trả về report theo thứ tự files."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    tasks = [(filename, seed, max_ticks, budget) for filename in files]
+    if workers <= 1 or len(tasks) <= 1:
+        return [_analyze_file(task) for task in tasks]
+    reports = {}
+    with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+        for report in pool.imap_unordered(_analyze_file, tasks):
+            reports[report["file"]] = report
+    return [reports[filename] for filename in files]
+
+def update_metadata(filename, report):
+    """Ghi nhãn difficulty đo được vào metadata của level (chỉ với level qua được)."""
+    if report["label"] is None:
+        return False
+    with open(filename, "r", encoding="utf-8") as f:
+        level_json = json.load(f)
+    if level_json.get("mode") == "endless":
+        return False
+    metadata = level_json.setdefault("metadata", {})
+    if metadata.get("difficulty") == report["label"]:
+        return False
+    metadata["difficulty"] = report["label"]
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(level_json, f, indent=2, ensure_ascii=False)
+    return True
+
+def print_report(report):
+    name = os.path.basename(report["file"])
+    if report["completed"]:
+        window = "no forced jumps" if report["min_window_ticks"] is None else \
+            f"min window {report['min_window_ticks']} ticks ({report['min_window_ms']} ms)"
+        print(f"✓ {name}: {report['label']} (score {report['score']}), {report['forced_jumps']} forced jumps, {window}")
+    else:
+        failure = report["failure"]
+        if failure["budget_exceeded"]:
+            print(f"? {name}: unlabelled, search budget exceeded ({report['search_ticks']:,} ticks, "
+                  f"furthest x={failure['furthest_x']}), try a larger --budget")
+        else:
+            print(f"✗ {name}: not completed, stuck at x={failure['x']} (section {failure['section']})")
+    for spot in report["hot_spots"]:
+        print(f"    hot spot x={spot['x']} section {spot['section']}: {spot['window_ticks']} ticks")
+    for spot in report["failure_hot_spots"]:
+        print(f"    dead end x={spot['x']} section {spot['section']}: {spot['dead_ends']}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score level difficulty by simulated play")
+    parser.add_argument("paths", nargs="*", default=["levels"], help="level files or directories")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for endless levels")
+    parser.add_argument("--max-ticks", type=int, default=None,
+                        help="tick limit (endless: ticks to survive, default MAX_STEPS_PER_GENOME)")
+    parser.add_argument("--budget", type=int, default=SEARCH_BUDGET,
+                        help=f"simulated ticks per level before giving up (default {SEARCH_BUDGET:,})")
+    parser.add_argument("--json", help="write all reports to this file")
+    parser.add_argument("--update-metadata", action="store_true",
+                        help="write the measured label into metadata.difficulty")
+    args = parser.parse_args()
+
+    files = level_files(args.paths)
+    reports = analyze_files(files, args.seed, args.max_ticks, args.workers, args.budget)
+    for report in reports:
+        print_report(report)
+        if args.update_metadata and update_metadata(report["file"], report):
+            print(f"    metadata.difficulty -> {report['label']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
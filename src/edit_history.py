@@ -0,0 +1,118 @@
+# edit_history.py - UNDO/REDO FOR THE LEVEL EDITOR
+import json
+import sys
+from collections import deque
+
+# Tổng dung lượng (bytes, ước lượng) các bước undo/redo được giữ lại
+UNDO_MEMORY_LIMIT = 64 * 1024 * 1024
+
+def freeze_section(section):
+    """Bản chụp bất biến của một section (JSON string, dùng chung giữa các bước không đổi)."""
+    return json.dumps(section, sort_keys=True, separators=(",", ":"))
+
+def thaw_section(frozen):
+    return json.loads(frozen)
+
+class _Step:
+    """
+    Một bước sửa: bản chụp trước/sau của đúng các section bị sửa (cùng object section) và,
+    với bước thêm/xoá section, thứ tự section trước/sau (tuple tham chiếu, không copy section).
+    """
+    __slots__ = ("sections", "before", "after", "order_before", "order_after", "size")
+
+    def __init__(self, sections, before, after, order_before, order_after):
+        self.sections = sections
+        self.before = before
+        self.after = after
+        self.order_before = order_before
+        self.order_after = order_after
+        self.size = sum(len(frozen) for frozen in before + after)
+        for order in (order_before, order_after):
+            if order is not None:
+                self.size += sys.getsizeof(order)
+
+class EditHistory:
+    """
+    Undo/redo cho world_data (danh sách section dict mà editor sửa tại chỗ).
+    Gọi begin() trước khi sửa (với các section sẽ bị sửa, hoặc structural=True khi thêm/xoá
+    section) và commit() sau khi sửa. Mỗi bước chỉ lưu các section đã đổi; section khác được
+    chia sẻ (không copy), nên một bước nhỏ trên level lớn vẫn rẻ. Số bước không giới hạn,
+    bước cũ nhất bị bỏ khi tổng dung lượng vượt memory_limit.
+    undo()/redo() khôi phục vào đúng object section cũ (cache theo id(section) của editor
+    vẫn đúng) và trả về (các section đã đổi, thứ tự có đổi không).
+    """
+    def __init__(self, memory_limit=UNDO_MEMORY_LIMIT):
+        self.memory_limit = memory_limit
+        self.clear()
+
+    def clear(self):
+        self._undo = deque()
+        self._redo = []
+        self._pending = None
+        self.size = 0
+
+    @property
+    def can_undo(self):
+        return bool(self._undo)
+
+    @property
+    def can_redo(self):
+        return bool(self._redo)
+
+    def begin(self, world_data, sections=(), structural=False):
+        sections = list(sections)
+        self._pending = (sections, [freeze_section(sec) for sec in sections],
+                         tuple(world_data) if structural else None)
+
+    def commit(self, world_data):
+        """Kết thúc bước đã begin(). Bước không đổi gì bị bỏ. Trả về True nếu có bước mới."""
+        if self._pending is None:
+            return False
+        sections, before, order_before = self._pending
+        self._pending = None
+        after = [freeze_section(sec) for sec in sections]
+        order_after = tuple(world_data) if order_before is not None else None
+        changed = [i for i in range(len(sections)) if before[i] != after[i]]
+        order_changed = order_before is not None and (len(order_before) != len(order_after) or
+                                                      any(a is not b for a, b in zip(order_before, order_after)))
+        if not changed and not order_changed:
+            return False
+        step = _Step([sections[i] for i in changed], [before[i] for i in changed], [after[i] for i in changed],
+                     order_before if order_changed else None, order_after if order_changed else None)
+        self._push(step)
+        return True
+
+    def cancel(self):
+        self._pending = None
+
+    def _push(self, step):
+        for old in self._redo:
+            self.size -= old.size
+        self._redo = []
+        self._undo.append(step)
+        self.size += step.size
+        # Giữ ít nhất bước vừa làm, bỏ bước cũ nhất khi vượt giới hạn
+        while self.size > self.memory_limit and len(self._undo) > 1:
+            self.size -= self._undo.popleft().size
+
+    def _apply(self, world_data, step, states, order):
+        for sec, frozen in zip(step.sections, states):
+            sec.clear()
+            sec.update(thaw_section(frozen))
+        if order is not None:
+            world_data[:] = order
+        return step.sections, order is not None
+
+    def undo(self, world_data):
+        if not self._undo:
+            return None
+        step = self._undo.pop()
+        self._redo.append(step)
+        return self._apply(world_data, step, step.before, step.order_before)
+
+    def redo(self, world_data):
+        if not self._redo:
+            return None
+        step = self._redo.pop()
+        self._undo.append(step)
+        return self._apply(world_data, step, step.after, step.order_after)
@@ -8,7 +8,7 @@ from PIL import Image
 # --- GLOBAL ENEMIES ---
 LOADED_ENEMIES = {}
 
-def detect_sprite_frames(image_path):
+def detect_sprite_frames(image_path, verbose=True):
     """
     Tự động phát hiện số frame trong sprite sheet
     Hỗ trợ nhiều loại sprite sheet:
@@ -40,9 +40,10 @@ def detect_sprite_frames(image_path):
             num_frames = 1
             sheet_type = "single"
         
-        print(f"     - Image size: {width}x{height}px")
-        print(f"     - Type: {sheet_type}")
-        print(f"     - Calculated: {num_frames} frames of {frame_width}x{frame_height}px each")
+        if verbose:
+            print(f"     - Image size: {width}x{height}px")
+            print(f"     - Type: {sheet_type}")
+            print(f"     - Calculated: {num_frames} frames of {frame_width}x{frame_height}px each")
         
         return num_frames, frame_width, frame_height, sheet_type
     except Exception as e:
@@ -200,6 +201,51 @@ def get_enemy_data(enemy_name):
     """Lấy thông tin của một enemy cụ thể"""
     return LOADED_ENEMIES.get(enemy_name)
 
+# {enemy: (width, height, y_offset)} của hitbox, xem enemy_hitbox_sizes
+_HITBOX_SIZES = None
+
+def enemy_hitbox_sizes(enemies_dir="assets/enemies"):
+    """
+    Kích thước va chạm của mỗi enemy giống ObstacleSprite trong game: frame đã crop và scale,
+    lấy lớn nhất qua các frame animation (frame nào cũng nằm trong hitbox này vì cùng midbottom),
+    cùng y_offset. Đọc thẳng từ file ảnh (không cần display) nên Simulation chạy headless dùng
+    được; kết quả được cache cho cả process.
+    """
+    global _HITBOX_SIZES
+    if _HITBOX_SIZES is not None:
+        return _HITBOX_SIZES
+    sizes = {}
+    if os.path.isdir(enemies_dir):
+        for filename in sorted(os.listdir(enemies_dir)):
+            if not filename.endswith('.png'):
+                continue
+            enemy_name = os.path.splitext(filename)[0]
+            filepath = os.path.join(enemies_dir, filename)
+            num_frames, frame_width, frame_height, sheet_type = detect_sprite_frames(filepath, verbose=False)
+            try:
+                spritesheet = pygame.image.load(filepath)
+            except pygame.error:
+                continue
+            cropped_frames = []
+            for i in range(num_frames):
+                x_pos = i * frame_width if sheet_type == "horizontal" else 0
+                y_pos = i * frame_height if sheet_type == "vertical" else 0
+                if x_pos + frame_width > spritesheet.get_width() or \
+                   y_pos + frame_height > spritesheet.get_height():
+                    break
+                frame = spritesheet.subsurface(pygame.Rect(x_pos, y_pos, frame_width, frame_height))
+                cropped_frames.append(crop_transparent_borders(frame))
+            if not cropped_frames:
+                continue
+            config = ENEMY_CONFIGS.get(enemy_name, {})
+            scale = config.get('scale', 1.0)
+            y_offset = config.get('y_offset', auto_detect_ground_position(cropped_frames[0]))
+            sizes[enemy_name] = (max(int(f.get_width() * scale) for f in cropped_frames),
+                                 max(int(f.get_height() * scale) for f in cropped_frames),
+                                 y_offset)
+    _HITBOX_SIZES = sizes
+    return sizes
+
 # 🔥 CONFIG TÙY CHỈNH (OPTIONAL)
 # Chỉ cần thêm vào đây nếu muốn override giá trị tự động
 ENEMY_CONFIGS = {
@@ -0,0 +1,144 @@
+# environment.py - GYM-STYLE ENVIRONMENTS OVER THE HEADLESS SIMULATION
+import argparse
+import time
+
+import numpy as np
+
+from config import *
+from main import load_level
+from simulation import Simulation, STATUS_COMPLETED, ACTION_NOOP, ACTION_JUMP, ACTION_UPPER, ACTION_LOWER
+
+# 4 action của README: noop, jump, chọn đường trên, chọn đường dưới
+NUM_ACTIONS = 4
+ACTION_NAMES = {
+    ACTION_NOOP: "noop",
+    ACTION_JUMP: "jump",
+    ACTION_UPPER: "upper",
+    ACTION_LOWER: "lower",
+}
+
+# Thưởng khi hoàn thành level, giống fitness của trainer
+COMPLETION_REWARD = 500
+
+class ParkourEnv:
+    """
+    Một môi trường theo API Gymnasium (không cần cài gymnasium):
+    reset(seed) -> (obs, info), step(action) -> (obs, reward, terminated, truncated, info).
+    - obs: float32 (observation_size,), 7 inputs như NEAT (observations.py), cộng 2 giá trị
+      (khoảng cách, loại vật thể) cho mỗi tia RaySensor khi rays > 0
+    - reward: quãng đường đi được trong bước + COMPLETION_REWARD khi xong level,
+      nên tổng reward của một episode bằng fitness của trainer
+    - terminated: chết, hết thời gian bám tường hoặc hoàn thành level
+    - truncated: đạt max_steps
+    """
+    num_actions = NUM_ACTIONS
+
+    def __init__(self, level_file=DEFAULT_LEVEL, seed=None, max_steps=MAX_STEPS_PER_GENOME, level_data=None, rays=0):
+        self.level_file = level_file
+        self.level_data = level_data if level_data is not None else load_level(level_file)
+        self.max_steps = max_steps
+        self.sim = Simulation(self.level_data, seed=seed, rays=rays)
+        self.observation_size = self.sim.observation_size
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.sim.seed = seed
+        self.sim.reset()
+        return np.asarray(self.sim.observe(), dtype=np.float32), self._info()
+
+    def step(self, action):
+        sim = self.sim
+        if sim.done or sim.ticks >= self.max_steps:
+            raise RuntimeError("step() called on a finished episode, call reset() first")
+        previous_x = sim.world_x_offset
+        sim.step(int(action))
+        reward = sim.world_x_offset - previous_x
+        if sim.status == STATUS_COMPLETED:
+            reward += COMPLETION_REWARD
+        terminated = sim.done
+        truncated = not terminated and sim.ticks >= self.max_steps
+        return np.asarray(sim.observe(), dtype=np.float32), float(reward), terminated, truncated, self._info()
+
+    def _info(self):
+        return {"status": self.sim.status, "ticks": self.sim.ticks, "distance": self.sim.world_x_offset}
+
+class VectorParkourEnv:
+    """
+    N môi trường trong cùng một process, observation/reward theo batch:
+    reset() -> obs (N, observation_size); step(actions (N,)) -> (obs, rewards, terminated, truncated, infos).
+    Auto-reset: env kết thúc được reset ngay trong step; obs trả về là obs đầu
+    episode mới, obs cuối của episode cũ nằm trong infos["final_observation"].
+    Level endless: env i dùng seed + i.
+    """
+    num_actions = NUM_ACTIONS
+
+    def __init__(self, num_envs, level_file=DEFAULT_LEVEL, seed=0, max_steps=MAX_STEPS_PER_GENOME, rays=0):
+        self.num_envs = num_envs
+        level_data = load_level(level_file)
+        self.envs = [ParkourEnv(level_file, seed + i, max_steps, level_data=level_data, rays=rays)
+                     for i in range(num_envs)]
+        self.observation_size = self.envs[0].observation_size
+        self.observations = np.zeros((num_envs, self.observation_size), dtype=np.float32)
+        self.episode_returns = np.zeros(num_envs, dtype=np.float64)
+        self.episode_lengths = np.zeros(num_envs, dtype=np.int64)
+
+    def reset(self, seed=None):
+        for i, env in enumerate(self.envs):
+            self.observations[i], _ = env.reset(None if seed is None else seed + i)
+        self.episode_returns[:] = 0
+        self.episode_lengths[:] = 0
+        return self.observations.copy()
+
+    def step(self, actions):
+        num_envs = self.num_envs
+        rewards = np.zeros(num_envs, dtype=np.float32)
+        terminated = np.zeros(num_envs, dtype=bool)
+        truncated = np.zeros(num_envs, dtype=bool)
+        final_observation = np.zeros((num_envs, self.observation_size), dtype=np.float32)
+        episode_return = np.zeros(num_envs, dtype=np.float64)
+        episode_length = np.zeros(num_envs, dtype=np.int64)
+
+        for i, env in enumerate(self.envs):
+            obs, rewards[i], terminated[i], truncated[i], _ = env.step(actions[i])
+            self.episode_returns[i] += rewards[i]
+            self.episode_lengths[i] += 1
+            if terminated[i] or truncated[i]:
+                final_observation[i] = obs
+                episode_return[i] = self.episode_returns[i]
+                episode_length[i] = self.episode_lengths[i]
+                self.episode_returns[i] = 0
+                self.episode_lengths[i] = 0
+                obs, _ = env.reset()
+            self.observations[i] = obs
+
+        done = terminated | truncated
+        infos = {
+            "final_observation": final_observation,
+            "episode_return": episode_return,
+            "episode_length": episode_length,
+            "done": done,
+        }
+        return self.observations.copy(), rewards, terminated, truncated, infos
+
+def benchmark(num_envs=64, steps=2000, level_file=DEFAULT_LEVEL, seed=0, rays=0):
+    """Đo env-steps/giây với action ngẫu nhiên. Trả về (steps/sec, số episode xong)."""
+    env = VectorParkourEnv(num_envs, level_file, seed, rays=rays)
+    rng = np.random.default_rng(seed)
+    env.reset()
+    episodes = 0
+    start = time.perf_counter()
+    for _ in range(steps):
+        _, _, terminated, truncated, _ = env.step(rng.integers(0, NUM_ACTIONS, size=num_envs))
+        episodes += int(np.count_nonzero(terminated | truncated))
+    elapsed = time.perf_counter() - start
+    return num_envs * steps / elapsed, episodes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized parkour environment")
+    parser.add_argument("--envs", type=int, default=64)
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--level", default=DEFAULT_LEVEL)
+    parser.add_argument("--rays", type=int, default=0, help="ray-cast sensors added to each observation")
+    args = parser.parse_args()
+    steps_per_sec, episodes = benchmark(args.envs, args.steps, args.level, rays=args.rays)
+    print(f"✓ {steps_per_sec:,.0f} env-steps/sec ({args.envs} envs, {episodes} episodes finished)")
@@ -0,0 +1,114 @@
+# fitness_cache.py - PERSISTENT FITNESS CACHE FOR NEAT TRAINING
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+# Tăng khi physics / fitness thay đổi để vô hiệu hoá các cache cũ
+CACHE_VERSION = 3
+DEFAULT_CACHE_FILE = "fitness_cache.json"
+DEFAULT_MAX_ENTRIES = 50000
+
+# Làm tròn trọng số để các genome "giống hệt" cho cùng một key
+WEIGHT_PRECISION = 6
+
+def genome_hash(genome):
+    """
+    Hash chuẩn hoá của genome: các node (bias, response, activation, aggregation)
+    và các connection đang bật, sắp xếp theo key. Không phụ thuộc genome.key
+    nên elites và offspring giống hệt nhau có cùng hash.
+    """
+    nodes = [
+        (key, round(node.bias, WEIGHT_PRECISION), round(node.response, WEIGHT_PRECISION),
+         node.activation, node.aggregation)
+        for key, node in sorted(genome.nodes.items())
+    ]
+    connections = [
+        (key[0], key[1], round(conn.weight, WEIGHT_PRECISION))
+        for key, conn in sorted(genome.connections.items())
+        if conn.enabled
+    ]
+    payload = json.dumps([nodes, connections], separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def level_hash(level_json):
+    """Hash nội dung level (dict JSON gốc, không phụ thuộc format/indent của file)."""
+    payload = json.dumps(level_json, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def level_file_hash(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return level_hash(json.load(f))
+
+class FitnessCache:
+    """
+    Cache fitness theo (genome hash, level hash, seed), lưu ra file JSON giữa các lần train.
+    Giới hạn số entry, loại bỏ entry ít dùng gần đây nhất (LRU).
+    """
+    def __init__(self, path=DEFAULT_CACHE_FILE, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        if path:
+            self.load()
+
+    @staticmethod
+    def make_key(genome, level_digest, seed=None, context=""):
+        """context: chuỗi mô tả thiết lập đánh giá (max steps, ...) để tránh dùng lại fitness sai"""
+        return f"{CACHE_VERSION}:{genome_hash(genome)}:{level_digest}:{seed}:{context}"
+
+    def get(self, key):
+        fitness = self.entries.get(key)
+        if fitness is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return fitness
+
+    def put(self, key, fitness):
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.dirty = True
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"⚠️ Could not read fitness cache '{self.path}': {e}")
+            return
+        if data.get("version") != CACHE_VERSION:
+            print(f"ℹ️ Fitness cache '{self.path}' is from an older version, starting fresh.")
+            return
+        # File lưu theo thứ tự LRU (cũ -> mới)
+        for key, fitness in data.get("entries", []):
+            self.entries[key] = fitness
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        print(f"✓ Loaded {len(self.entries)} cached fitness values from {self.path}")
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        # Ghi file tạm rồi rename để không bao giờ để lại cache hỏng
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "entries": list(self.entries.items())}, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0.0
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "hit_rate": hit_rate}
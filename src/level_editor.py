@@ -3,29 +3,323 @@ import pygame
 import json
 import sys
 import os
+from bisect import bisect_left, bisect_right
 from config import *
+from edit_history import EditHistory
+from main import (Game, IncrementalLevelBuilder, TerrainGenerator, _START_Y_KEYS,
+                  _first_platform_y, _segment_exit_y, _segment_platforms)
 
 # CẢI TIẾN: Thêm hằng số cho editor
 GRID_SIZE = 20
 RESIZE_HANDLE_WIDTH = 10
 
+# Kích thước obstacle trong bản xem trước của editor
+PREVIEW_OBSTACLE_W = 30
+PREVIEW_OBSTACLE_H = 50
+PREVIEW_PLATFORM_H = 6
+BACKGROUND_COLOR = (20, 20, 30)
+GRID_COLOR = (30, 30, 40)
+PLATFORM_COLOR = (80, 80, 80)
+PATH_COLORS = [(100, 150, 100), (100, 100, 150)]
+WALL_COLOR = (100, 100, 80)
+# Số text đã render được giữ lại trước khi xoá cache
+TEXT_CACHE_SIZE = 64
+
+# Section mới (phím 1-6), bắt đầu ở độ cao cuối của level hiện tại
+SECTION_TYPES = ["straight", "stairs_up", "stairs_down", "gap", "wall_jump", "branch"]
+SECTION_TEMPLATES = {
+    "straight": {"type": "straight", "length": 400, "obstacles": []},
+    "stairs_up": {"type": "stairs_up", "step_count": 4, "step_width": 120, "step_height": 40, "obstacles": []},
+    "stairs_down": {"type": "stairs_down", "step_count": 4, "step_width": 100, "step_height": 40, "obstacles": []},
+    "gap": {"type": "gap", "length": 400, "platforms": [{"x": 0, "width": 160}, {"x": 260, "width": 140}], "obstacles": []},
+    "wall_jump": {"type": "wall_jump", "height": 160, "shaft_width": 150},
+    "branch": {"type": "branch", "paths": [
+        {"label": "Lower Path", "offset_y": 0, "length": 400, "obstacles": []},
+        {"label": "Upper Path", "offset_y": -140, "length": 400, "obstacles": []},
+    ]},
+}
+# Bước chỉnh chiều cao tường, bằng chiều cao một WallTile của TerrainGenerator.wall_jump
+WALL_TILE_HEIGHT = 40
+# Giới hạn độ cao khi dời section lên/xuống
+MIN_SECTION_Y = GRID_SIZE * 4
+MAX_SECTION_Y = SCREEN_H - GRID_SIZE
+# Toạ độ editor = toạ độ game trừ safe zone mà build_level thêm vào đầu level
+EDITOR_ORIGIN_X = SAFE_ZONE_DISTANCE
+# Play-test: bước dò vị trí xuất phát (px) và khoảng trống tối thiểu trước player tới
+# obstacle thật / wall tile gần nhất
+PLAY_TEST_SCAN_STEP = 2
+PLAY_TEST_CLEARANCE = 40
+
+# -------------------------
+# Section interval index
+# -------------------------
+class _SectionEntry:
+    """Vị trí của một section trong world (toạ độ editor), segment đã compile và các lane của nó."""
+    __slots__ = ("order", "section", "segment", "start_x", "end_x", "exit_y", "draw_left", "draw_right", "lanes")
+
+class _Lane:
+    """
+    Một platform của section mà editor đặt obstacle lên và kéo dài được (x tính từ đầu section):
+    - "straight": obstacle {"x", "y": "ground"} trong config["obstacles"], kéo dài "length"
+    - "step": bậc thứ index của stairs, obstacle {"step_index", "x_offset"}, kéo dài "step_width"
+    - "platform": platform thứ index của gap, obstacle {"platform_index", "x"}, kéo dài "width"
+    config là dict của section (hoặc của path trong branch) chứa danh sách obstacles.
+    """
+    __slots__ = ("kind", "config", "index", "path_index", "origin_x", "platform_y", "length",
+                 "resize_target", "resize_key", "xs", "list_positions")
+
+    def __init__(self, kind, config, index, path_index, origin_x, platform_y, length, resize_target, resize_key):
+        self.kind = kind
+        self.config = config
+        self.index = index
+        self.path_index = path_index
+        self.origin_x = origin_x
+        self.platform_y = platform_y
+        self.length = length
+        self.resize_target = resize_target
+        self.resize_key = resize_key
+        placed = sorted((x, pos) for pos, x in enumerate(map(self.obstacle_x, self.obstacles)) if x is not None)
+        self.xs = [x for x, _ in placed]
+        self.list_positions = [pos for _, pos in placed]
+
+    @property
+    def obstacles(self):
+        return self.config.get('obstacles', [])
+
+    def obstacle_x(self, ob):
+        """x của obstacle tính từ đầu lane, None nếu obstacle không nằm trên lane này."""
+        if self.kind == 'straight':
+            return ob['x'] if 'x' in ob and 'step_index' not in ob and 'platform_index' not in ob else None
+        if self.kind == 'step':
+            return ob.get('x_offset', self.length / 2) if ob.get('step_index') == self.index else None
+        return ob.get('x', self.length / 2) if ob.get('platform_index') == self.index else None
+
+    def make_obstacle(self, rel_x, kind):
+        if self.kind == 'straight':
+            return {"x": rel_x, "y": "ground", "kind": kind}
+        if self.kind == 'step':
+            return {"step_index": self.index, "x_offset": rel_x, "kind": kind}
+        return {"platform_index": self.index, "x": rel_x, "kind": kind}
+
+def _terrain_type(config):
+    terrain = config.get('type', 'straight')
+    # Giống build_level: loại không biết được build như straight
+    return terrain if hasattr(TerrainGenerator, terrain) else 'straight'
+
+def _config_lanes(config, platforms, base_x, path_index=None):
+    terrain = _terrain_type(config)
+    if terrain == 'straight' and platforms:
+        p = platforms[0]
+        return [_Lane('straight', config, 0, path_index, p.x - base_x, p.y, p.length, config, 'length')]
+    if terrain in ('stairs_up', 'stairs_down'):
+        return [_Lane('step', config, i, path_index, p.x - base_x, p.y, p.length, config, 'step_width')
+                for i, p in enumerate(platforms[:config.get('step_count', 5)])]
+    if terrain == 'gap':
+        return [_Lane('platform', config, i, path_index, p.x - base_x, p.y, p.length, p_data, 'width')
+                for i, (p, p_data) in enumerate(zip(platforms, config.get('platforms', [])))]
+    # wall_jump, section_sequence: chỉ xem trước, sửa bằng phím
+    return []
+
+def _gap_platforms_end(config):
+    """Mép phải xa nhất (tính từ đầu section) của các platform trong config của một gap."""
+    return max((p.get("x", 0) + p.get("width", 0) for p in config.get("platforms", [])), default=0)
+
+def _section_lanes(sec, segment, base_x):
+    if _terrain_type(sec) == 'branch':
+        lanes = []
+        for path, path_config in zip(segment['paths'], sec.get('paths', [])):
+            lanes.extend(_config_lanes(path_config, path['platforms'], base_x, path['index']))
+        return lanes
+    return _config_lanes(sec, _segment_platforms(segment), base_x)
+
+def _segment_rects(segment, base_x):
+    """Các (color, rect) xem trước của một segment đã compile, x tính từ base_x."""
+    path_colors = {}
+    for path in segment.get('paths', []):
+        for p in path['platforms']:
+            path_colors[id(p)] = PATH_COLORS[min(path['index'], 1)]
+    rects = []
+    for p in _segment_platforms(segment):
+        rects.append((path_colors.get(id(p), PLATFORM_COLOR), pygame.Rect(p.x - base_x, p.y, p.length, PREVIEW_PLATFORM_H)))
+    for tile in segment.get('wall_tiles', []):
+        rects.append((WALL_COLOR, pygame.Rect(tile.x - base_x, tile.y, tile.width, tile.tile_height)))
+    for ob in segment.get('obstacles', []):
+        color = (200,40,40) if ob.kind == 'real' else (120,120,220)
+        rects.append((color, pygame.Rect(ob.x - base_x, ob.y - ob.h, ob.w, ob.h)))
+    return [(color, rect) for color, rect in rects if rect.width > 0 and rect.height > 0]
+
+class SectionIndex:
+    """
+    Chỉ mục khoảng [start_x, end_x) của các section trong toạ độ editor. Hình học của mỗi section
+    là segment do TerrainGenerator tạo ra (qua IncrementalLevelBuilder, giống hệt khi chơi).
+    Truy vấn theo x bằng bisect trên danh sách sắp theo draw_left (giống _SortedItems trong
+    simulation.py) và danh sách cạnh resize sắp theo x.
+    Khi một section bị sửa chỉ segment và lane của nó được tạo lại; các section phía sau chỉ dời
+    theo x (lane và extent lưu theo toạ độ tính từ đầu section nên không phải tính lại).
+    """
+    def __init__(self, world_data=None, builder=None):
+        self.builder = builder or IncrementalLevelBuilder()
+        self.reset(world_data if world_data is not None else [])
+
+    def reset(self, world_data):
+        self.world_data = world_data
+        self.entries = []
+        self._order = {}
+        self._local = {}  # id(section) -> (section, segment, lanes, local_left, local_right)
+        self._dirty_from = 0
+
+    def reorder(self):
+        """Section đã bị xoá/chèn: tính lại vị trí mọi section, giữ hình học đã có."""
+        self.entries = []
+        self._order = {}
+        self._dirty_from = 0
+
+    def invalidate(self, section):
+        """Section đã bị sửa (hoặc vừa được thêm vào cuối world_data)."""
+        self._local.pop(id(section), None)
+        order = self._order.get(id(section), len(self.entries))
+        self._dirty_from = order if self._dirty_from is None else min(self._dirty_from, order)
+
+    def _section_local(self, sec, segment, base_x):
+        local = self._local.get(id(sec))
+        if local is None or local[0] is not sec or local[1] is not segment:
+            rects = [rect for _, rect in _segment_rects(segment, base_x)]
+            local_left = min([0] + [rect.left for rect in rects])
+            local_right = max([segment['length']] + [rect.right for rect in rects])
+            local = self._local[id(sec)] = (sec, segment, _section_lanes(sec, segment, base_x), local_left, local_right)
+        return local
+
+    def _refresh(self):
+        if self._dirty_from is None:
+            return
+        first = min(self._dirty_from, len(self.entries))
+        del self.entries[first:]
+        if self.entries:
+            cursor_x, last_y = self.entries[-1].end_x, self.entries[-1].exit_y
+        else:
+            cursor_x, last_y = 0, _first_platform_y(self.world_data)
+        for order in range(first, len(self.world_data)):
+            sec = self.world_data[order]
+            game_x = cursor_x + EDITOR_ORIGIN_X
+            segment = self.builder.compile_section(sec, game_x, last_y)
+            _, _, lanes, local_left, local_right = self._section_local(sec, segment, game_x)
+            entry = _SectionEntry()
+            entry.order = order
+            entry.section = sec
+            entry.segment = segment
+            entry.lanes = lanes
+            entry.start_x = cursor_x
+            entry.end_x = cursor_x + segment['length']
+            entry.exit_y = _segment_exit_y(segment, last_y)
+            entry.draw_left = cursor_x + local_left
+            entry.draw_right = cursor_x + local_right
+            self.entries.append(entry)
+            self._order[id(sec)] = order
+            cursor_x, last_y = entry.end_x, entry.exit_y
+        self._dirty_from = None
+
+        placed = sorted((e.draw_left, e.order) for e in self.entries)
+        self._lefts = [left for left, _ in placed]
+        self._by_left = [self.entries[order] for _, order in placed]
+        self._max_width = max((e.draw_right - e.draw_left for e in self._by_left), default=0)
+        edges = sorted((e.start_x + lane.origin_x + lane.length, e.order, lane_i)
+                       for e in self.entries for lane_i, lane in enumerate(e.lanes))
+        self._edge_xs = [edge_x for edge_x, _, _ in edges]
+        self._edges = [(self.entries[order], self.entries[order].lanes[lane_i]) for _, order, lane_i in edges]
+
+    @property
+    def length(self):
+        self._refresh()
+        return self.entries[-1].end_x if self.entries else 0
+
+    @property
+    def exit_y(self):
+        """Độ cao cuối level, nơi section mới được nối vào."""
+        self._refresh()
+        return self.entries[-1].exit_y if self.entries else None
+
+    def entry_of(self, section):
+        self._refresh()
+        return self.entries[self._order[id(section)]]
+
+    def visible(self, x_min, x_max):
+        """Các section có phần vẽ giao [x_min, x_max], theo thứ tự world_data."""
+        self._refresh()
+        start = bisect_left(self._lefts, x_min - self._max_width)
+        stop = bisect_right(self._lefts, x_max)
+        return sorted((e for e in self._by_left[start:stop] if e.draw_right >= x_min), key=lambda e: e.order)
+
+    def sections_at(self, world_x):
+        """Các section có start_x <= world_x < end_x, theo thứ tự world_data."""
+        return [e for e in self.visible(world_x, world_x) if e.start_x <= world_x < e.end_x]
+
+    def edges_near(self, world_x, radius):
+        """(entry, lane) có cạnh phải cách world_x dưới radius, theo thứ tự world_data."""
+        self._refresh()
+        start = bisect_right(self._edge_xs, world_x - radius)
+        stop = bisect_left(self._edge_xs, world_x + radius)
+        return sorted(self._edges[start:stop], key=lambda item: (item[0].order, item[0].lanes.index(item[1])))
+
+    def lane_at(self, world_pos):
+        """(entry, lane) có platform chứa world_x, gần world_y nhất; (None, None) nếu không có."""
+        world_x, world_y = world_pos
+        best = None
+        for entry in self.visible(world_x, world_x):
+            for lane in entry.lanes:
+                left = entry.start_x + lane.origin_x
+                if left <= world_x < left + lane.length:
+                    distance = abs(world_y - lane.platform_y)
+                    if best is None or distance < best[0]:
+                        best = (distance, entry, lane)
+        return (best[1], best[2]) if best else (None, None)
+
+    def obstacle_at(self, world_pos):
+        """(entry, lane, obstacle) có hình xem trước chứa world_pos, hoặc (None, None, None)."""
+        world_x, world_y = world_pos
+        for entry in self.visible(world_x, world_x):
+            for lane in entry.lanes:
+                if not lane.platform_y - PREVIEW_OBSTACLE_H <= world_y < lane.platform_y:
+                    continue
+                rel_x = world_x - entry.start_x - lane.origin_x
+                start = bisect_right(lane.xs, rel_x - PREVIEW_OBSTACLE_W)
+                stop = bisect_right(lane.xs, rel_x)
+                if start < stop:
+                    # Giống thứ tự duyệt cũ: obstacle đứng sau trong danh sách được ưu tiên
+                    pos = max(lane.list_positions[start:stop])
+                    return entry, lane, lane.obstacles[pos]
+        return None, None, None
+
 class LevelEditor:
     def __init__(self, screen):
         self.screen = screen
         pygame.display.set_caption("Level Editor")
         self.clock = pygame.time.Clock()
         self.font = pygame.font.SysFont(None, 24)
-        
+
         self.running = True
         self.world_data = []
+        # Các key khác của file level (theme, metadata, ...) được giữ nguyên khi lưu
+        self.level_header = {}
         self.view_x = 0
-        self.tool = 'add_real' # add_real, add_fake, delete, add_straight
+        self.tool = 'add_real' # add_real, add_fake, delete, add_section
+        self.section_type = 'straight' # loại section của tool add_section
         self.current_file = None
         self.status_message = ""
         self.status_timer = 0
 
         # CẢI TIẾN: Thêm trạng thái cho việc thay đổi kích thước
-        self.resizing_info = None # Sẽ lưu trữ { 'section': sec, 'path_index': idx, 'start_x': mouse_x }
+        self.resizing_info = None # { 'entry': entry, 'lane': lane, 'start_mouse_x': x, 'start_length': length }
+
+        # Cache render: grid vẽ một lần, mỗi section một surface (xoá khi section bị sửa);
+        # vị trí và hình học các section nằm trong SectionIndex, cập nhật sau mỗi thay đổi.
+        # Play-test dùng chung builder nên chỉ section đã sửa được compile lại.
+        self._grid_surface = self._render_grid()
+        self._section_surfaces = {}  # id(section) -> (section, segment, surface, offset_x, top_y)
+        self.level_builder = IncrementalLevelBuilder()
+        self.index = SectionIndex(self.world_data, self.level_builder)
+        self._text_cache = {}
+        # Undo/redo: mỗi bước chỉ lưu các section đã đổi
+        self.history = EditHistory()
 
     def set_status(self, message, duration=120):
         self.status_message = message
@@ -33,8 +327,11 @@ class LevelEditor:
 
     def new_level(self):
         self.world_data = []
+        self.level_header = {}
         self.current_file = None
         self.view_x = 0
+        self.invalidate()
+        self.history.clear()
         pygame.display.set_caption("Level Editor - New Level*")
         self.set_status("Started a new level.")
 
@@ -43,55 +340,22 @@ class LevelEditor:
 
     # CẢI TIẾN: Tìm kiếm cạnh để resize
     def find_resizable_edge_at(self, world_pos):
-        cursor_x = 0
-        for sec in self.world_data:
-            if sec['type'] == 'straight':
-                sec_len = sec.get('length', 0)
-                plat_y = sec.get('platform_y', GROUND_Y)
-                edge_x = cursor_x + sec_len
-                if abs(world_pos[0] - edge_x) < RESIZE_HANDLE_WIDTH and abs(world_pos[1] - plat_y) < 20:
-                    return sec, None # None for path_index
-                cursor_x += sec_len
-            elif sec['type'] == 'branch':
-                branch_x = sec.get('branch_x', cursor_x)
-                sec_len = 0
-                for i, path in enumerate(sec.get('paths', [])):
-                    path_len = path.get('length', 0)
-                    plat_y = GROUND_Y + path.get('offset_y', 0)
-                    edge_x = branch_x + path_len
-                    if abs(world_pos[0] - edge_x) < RESIZE_HANDLE_WIDTH and abs(world_pos[1] - plat_y) < 20:
-                        return sec, i
-                    sec_len = max(sec_len, path_len)
-                cursor_x = branch_x + sec_len
+        for entry, lane in self.index.edges_near(world_pos[0], RESIZE_HANDLE_WIDTH):
+            if abs(world_pos[1] - lane.platform_y) < 20:
+                return entry, lane
         return None, None
 
-    def find_section_and_path_at(self, world_x, world_y):
-        cursor_x = 0
-        for sec in self.world_data:
-            if sec['type'] == 'straight':
-                sec_len = sec.get('length', 0)
-                if cursor_x <= world_x < cursor_x + sec_len:
-                    return sec, cursor_x, None
-                cursor_x += sec_len
-            elif sec['type'] == 'branch':
-                branch_start_x = sec.get('branch_x', cursor_x)
-                paths = sec.get('paths', [])
-                sec_len = max(p.get('length', 0) for p in paths) if paths else 0
-                if branch_start_x <= world_x < branch_start_x + sec_len:
-                    for i, path in enumerate(paths):
-                        path_y = GROUND_Y + path.get('offset_y', 0)
-                        if abs(world_y - path_y) < 50:
-                            return sec, branch_start_x, i
-                cursor_x = branch_start_x + sec_len
-        return None, None, None
+    def find_section_at(self, world_x):
+        entries = self.index.sections_at(world_x)
+        return entries[0] if entries else None
 
     def handle_events(self):
         mouse_pos = pygame.mouse.get_pos()
         world_pos = self.screen_to_world(mouse_pos)
-        
+
         # CẢI TIẾN: Thay đổi con trỏ chuột khi hover
-        resizable_sec, _ = self.find_resizable_edge_at(world_pos)
-        if resizable_sec:
+        _, resizable_lane = self.find_resizable_edge_at(world_pos)
+        if resizable_lane:
             pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_SIZEWE)
         else:
             pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_ARROW)
@@ -99,129 +363,208 @@ class LevelEditor:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.running = False
-            
+
             if event.type == pygame.DROPFILE:
                 self.load_level(event.file)
-            
+
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE: self.running = False
                 if event.key == pygame.K_r: self.tool = 'add_real'
                 if event.key == pygame.K_f: self.tool = 'add_fake'
                 if event.key == pygame.K_d: self.tool = 'delete'
-                if event.key == pygame.K_a: self.tool = 'add_straight' # Thêm section
+                if event.key == pygame.K_a: self.select_section_type('straight') # Thêm section
+                if pygame.K_1 <= event.key < pygame.K_1 + len(SECTION_TYPES):
+                    self.select_section_type(SECTION_TYPES[event.key - pygame.K_1])
+                if event.key == pygame.K_x: self.delete_section(world_pos)
+                if event.key == pygame.K_PAGEUP: self.move_section(world_pos, -GRID_SIZE)
+                if event.key == pygame.K_PAGEDOWN: self.move_section(world_pos, GRID_SIZE)
+                if event.key in (pygame.K_EQUALS, pygame.K_KP_PLUS): self.adjust_section(world_pos, 1)
+                if event.key in (pygame.K_MINUS, pygame.K_KP_MINUS): self.adjust_section(world_pos, -1)
                 if event.key == pygame.K_s and pygame.key.get_mods() & pygame.KMOD_CTRL:
                     self.save_level(save_as=False)
                 if event.key == pygame.K_s and pygame.key.get_mods() & pygame.KMOD_SHIFT:
                     self.save_level(save_as=True) # Save As
                 if event.key == pygame.K_n and pygame.key.get_mods() & pygame.KMOD_CTRL:
                     self.new_level() # New Level
+                if event.key == pygame.K_z and pygame.key.get_mods() & pygame.KMOD_CTRL:
+                    if pygame.key.get_mods() & pygame.KMOD_SHIFT: self.redo()
+                    else: self.undo()
+                if event.key == pygame.K_y and pygame.key.get_mods() & pygame.KMOD_CTRL:
+                    self.redo()
+                if event.key == pygame.K_F5:
+                    self.play_test()
 
             # CẢI TIẾN: Logic kéo thả để resize
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:
-                    section, path_idx = self.find_resizable_edge_at(world_pos)
-                    if section:
+                    entry, lane = self.find_resizable_edge_at(world_pos)
+                    if lane:
+                        # Cả lần kéo là một bước undo
+                        self.history.begin(self.world_data, [entry.section])
                         self.resizing_info = {
-                            'section': section, 
-                            'path_index': path_idx, 
-                            'start_mouse_x': world_pos[0]
+                            'entry': entry,
+                            'lane': lane,
+                            'start_mouse_x': world_pos[0],
+                            'start_length': lane.length,
                         }
+                        if lane.kind == 'platform':
+                            # Gap: section dài theo platform, giữ nguyên khoảng trống phía sau
+                            self.resizing_info['gap_trailing'] = max(
+                                0, lane.config.get('length', 500) - _gap_platforms_end(lane.config))
                     elif self.tool in ['add_real', 'add_fake']:
                         self.add_obstacle(world_pos)
                     elif self.tool == 'delete':
                         self.delete_obstacle(world_pos)
-                    elif self.tool == 'add_straight':
-                        self.add_straight_section()
+                    elif self.tool == 'add_section':
+                        self.add_section(self.section_type)
 
             if event.type == pygame.MOUSEMOTION:
                 if self.resizing_info:
-                    dx = world_pos[0] - self.resizing_info['start_mouse_x']
-                    target = None
-                    if self.resizing_info['section']['type'] == 'straight':
-                        target = self.resizing_info['section']
-                    elif self.resizing_info['path_index'] is not None:
-                        target = self.resizing_info['section']['paths'][self.resizing_info['path_index']]
-                    
-                    if target:
-                        original_length = target.get('length', 0) - dx
-                        new_length = original_length + (world_pos[0] - self.resizing_info['start_mouse_x'])
-                        target['length'] = max(GRID_SIZE * 2, int(new_length / GRID_SIZE) * GRID_SIZE) # Snap to grid
+                    self.resize_lane(world_pos[0])
 
             if event.type == pygame.MOUSEBUTTONUP:
-                if event.button == 1:
+                if event.button == 1 and self.resizing_info:
+                    self.history.commit(self.world_data)
                     self.resizing_info = None
 
         keys = pygame.key.get_pressed()
         if keys[pygame.K_LEFT]: self.view_x = max(0, self.view_x - 15)
         if keys[pygame.K_RIGHT]: self.view_x += 15
-    
+
+    # -------------------------
+    # Edits
+    # -------------------------
+    def select_section_type(self, section_type):
+        self.tool = 'add_section'
+        self.section_type = section_type
+        self.set_status(f"Click to append a {section_type} section.")
+
+    def add_section(self, section_type):
+        """Nối một section mới (theo SECTION_TEMPLATES) vào cuối level, ở độ cao cuối level."""
+        new_section = json.loads(json.dumps(SECTION_TEMPLATES[section_type]))
+        start_y = self.index.exit_y
+        new_section[_START_Y_KEYS[section_type]] = start_y if start_y is not None else 360
+        # Branch không lưu branch_x: mặc định 0 tách nhánh ngay đầu section và vẫn đúng khi các
+        # section phía trước đổi chiều dài (branch_x tuyệt đối sẽ lệch, xem TerrainGenerator.branch)
+        self.history.begin(self.world_data, structural=True)
+        self.world_data.append(new_section)
+        self.history.commit(self.world_data)
+        self.invalidate(new_section)
+        self.set_status(f"Added a new {section_type} section.")
+
     # CẢI TIẾN: Hàm thêm section mới
     def add_straight_section(self):
-        new_section = {
-            "type": "straight",
-            "length": 400,
-            "platform_y": 360,
-            "obstacles": []
-        }
-        self.world_data.append(new_section)
-        self.set_status("Added a new straight section.")
+        self.add_section('straight')
+
+    def delete_section(self, world_pos):
+        entry = self.find_section_at(world_pos[0])
+        if entry is None:
+            return
+        self.history.begin(self.world_data, structural=True)
+        del self.world_data[entry.order]
+        self.history.commit(self.world_data)
+        self.index.reorder()
+        self.set_status(f"Deleted {entry.section.get('type', 'straight')} section.")
+
+    def move_section(self, world_pos, dy):
+        """Dời độ cao bắt đầu của section dưới chuột; section phía sau nối theo độ cao mới."""
+        entry = self.find_section_at(world_pos[0])
+        if entry is None:
+            return
+        sec = entry.section
+        key = _START_Y_KEYS.get(_terrain_type(sec), 'platform_y')
+        platforms = _segment_platforms(entry.segment)
+        current_y = sec.get(key, platforms[0].y if platforms else GROUND_Y)
+        self.history.begin(self.world_data, [sec])
+        sec[key] = min(MAX_SECTION_Y, max(MIN_SECTION_Y, current_y + dy))
+        self.history.commit(self.world_data)
+        self.invalidate(sec)
+        self.set_status(f"{sec.get('type', 'straight')}: {key} = {sec[key]}")
+
+    def adjust_section(self, world_pos, step):
+        """+/-: số bậc của stairs, chiều cao tường của wall_jump, số nhánh của branch."""
+        entry = self.find_section_at(world_pos[0])
+        if entry is None:
+            return
+        sec = entry.section
+        terrain = _terrain_type(sec)
+        self.history.begin(self.world_data, [sec])
+        if terrain in ('stairs_up', 'stairs_down'):
+            sec['step_count'] = max(1, sec.get('step_count', 5) + step)
+            message = f"step_count = {sec['step_count']}"
+        elif terrain == 'wall_jump':
+            sec['height'] = max(WALL_TILE_HEIGHT, sec.get('height', 250) + step * WALL_TILE_HEIGHT)
+            message = f"height = {sec['height']}"
+        elif terrain == 'branch':
+            paths = sec.setdefault('paths', [])
+            if step > 0:
+                offset_y = min([p.get('offset_y', 0) for p in paths] + [0]) - 140
+                paths.append({"label": f"Path {len(paths) + 1}", "offset_y": offset_y, "length": 400, "obstacles": []})
+            elif len(paths) > 1:
+                paths.pop()
+            message = f"{len(paths)} paths"
+        else:
+            self.history.cancel()
+            return
+        self.history.commit(self.world_data)
+        self.invalidate(sec)
+        self.set_status(f"{terrain}: {message}")
+
+    def resize_lane(self, world_x):
+        lane = self.resizing_info['lane']
+        new_length = self.resizing_info['start_length'] + world_x - self.resizing_info['start_mouse_x']
+        lane.resize_target[lane.resize_key] = max(GRID_SIZE * 2, int(new_length / GRID_SIZE) * GRID_SIZE) # Snap to grid
+        if lane.kind == 'platform':
+            # TerrainGenerator.gap đặt section sau theo "length", không theo platform
+            lane.config['length'] = _gap_platforms_end(lane.config) + self.resizing_info['gap_trailing']
+        self.invalidate(self.resizing_info['entry'].section)
 
     def add_obstacle(self, world_pos):
-        section, sec_start_x, path_idx = self.find_section_and_path_at(world_pos[0], world_pos[1])
-        if not section:
+        entry, lane = self.index.lane_at(world_pos)
+        if lane is None:
             self.set_status("Cannot add: No platform section here.")
             return
 
         kind = 'real' if self.tool == 'add_real' else 'fake'
-        rel_x = world_pos[0] - sec_start_x
-        new_ob = {
-            "x": int(rel_x / GRID_SIZE) * GRID_SIZE, # Snap to grid
-            "y": "ground",
-            "kind": kind
-        }
-        
-        target_list = None
-        if section['type'] == 'straight':
-            if 'obstacles' not in section: section['obstacles'] = []
-            target_list = section['obstacles']
-        elif section['type'] == 'branch' and path_idx is not None:
-            path = section['paths'][path_idx]
-            if 'obstacles' not in path: path['obstacles'] = []
-            target_list = path['obstacles']
-
-        if target_list is not None:
-            target_list.append(new_ob)
+        rel_x = world_pos[0] - entry.start_x - lane.origin_x
+        new_ob = lane.make_obstacle(int(rel_x / GRID_SIZE) * GRID_SIZE, kind) # Snap to grid
+        self.history.begin(self.world_data, [entry.section])
+        target_list = lane.config.setdefault('obstacles', [])
+        target_list.append(new_ob)
+        if lane.kind == 'straight' and all('x' in ob for ob in target_list):
             target_list.sort(key=lambda ob: ob['x'])
-            self.set_status(f"Added {kind} obstacle.")
+        self.history.commit(self.world_data)
+        self.invalidate(entry.section)
+        self.set_status(f"Added {kind} obstacle.")
 
     def delete_obstacle(self, world_pos):
-        cursor_x = 0
-        for sec in self.world_data:
-            sec_start_x = 0
-            paths_to_check = []
-            if sec['type'] == 'straight':
-                sec_start_x = cursor_x
-                paths_to_check.append({'obstacles': sec.get('obstacles', []), 'y_offset': sec.get('platform_y', GROUND_Y) - GROUND_Y})
-            elif sec['type'] == 'branch':
-                sec_start_x = sec.get('branch_x', cursor_x)
-                paths_to_check.extend([{'obstacles': p.get('obstacles', []), 'y_offset': p.get('offset_y', 0)} for p in sec.get('paths', [])])
-            
-            for path_info in paths_to_check:
-                obstacles_list = path_info['obstacles']
-                path_y = GROUND_Y + path_info['y_offset']
-                for ob in reversed(obstacles_list):
-                    ob_world_x = sec_start_x + ob['x']
-                    ob_rect = pygame.Rect(ob_world_x, path_y - 50, 30, 50)
-                    if ob_rect.collidepoint(world_pos):
-                        obstacles_list.remove(ob)
-                        self.set_status(f"Deleted obstacle at {int(ob_world_x)}.")
-                        return
-
-            if sec['type'] == 'straight':
-                cursor_x += sec.get('length', 0)
-            else:
-                sec_len = max(p.get('length', 0) for p in sec.get('paths', [])) if sec.get('paths') else 0
-                cursor_x = sec.get('branch_x', cursor_x) + sec_len
+        entry, lane, ob = self.index.obstacle_at(world_pos)
+        if ob is None:
+            return
+        ob_world_x = entry.start_x + lane.origin_x + lane.obstacle_x(ob)
+        self.history.begin(self.world_data, [entry.section])
+        lane.obstacles.remove(ob)
+        self.history.commit(self.world_data)
+        self.invalidate(entry.section)
+        self.set_status(f"Deleted obstacle at {int(ob_world_x)}.")
+
+    def undo(self):
+        self._apply_history(self.history.undo(self.world_data), "Undo")
+
+    def redo(self):
+        self._apply_history(self.history.redo(self.world_data), "Redo")
+
+    def _apply_history(self, result, label):
+        if result is None:
+            self.set_status(f"Nothing to {label.lower()}.")
+            return
+        sections, reordered = result
+        self.resizing_info = None
+        for sec in sections:
+            self.invalidate(sec)
+        if reordered:
+            self.index.reorder()
+        self.set_status(f"{label}: {len(sections)} section(s) restored." if sections else f"{label}: section order restored.")
 
     def load_level(self, filepath):
         if not os.path.exists(filepath):
@@ -231,8 +574,11 @@ class LevelEditor:
             with open(filepath, 'r', encoding='utf-8') as f:
                 data = json.load(f)
             self.world_data = data.get('sections', [])
+            self.level_header = {key: value for key, value in data.items() if key != 'sections'}
             self.current_file = filepath
             self.view_x = 0
+            self.invalidate()
+            self.history.clear()
             pygame.display.set_caption(f"Level Editor - {os.path.basename(filepath)}")
             self.set_status(f"Loaded: {os.path.basename(filepath)}")
         except Exception as e:
@@ -250,62 +596,127 @@ class LevelEditor:
             filepath = f"levels/new_level_{num}.json"
             self.current_file = filepath
             pygame.display.set_caption(f"Level Editor - {os.path.basename(filepath)}")
-            
+
         try:
-            data_to_save = {"sections": self.world_data}
+            data_to_save = dict(self.level_header, sections=self.world_data)
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(data_to_save, f, indent=2)
             self.set_status(f"Saved to {os.path.basename(filepath)}")
         except Exception as e:
             self.set_status(f"Error saving level: {e}")
 
-    def draw(self):
-        self.screen.fill((20, 20, 30))
-        
-        # Draw grid
+    # -------------------------
+    # Play-test
+    # -------------------------
+    def play_test_start_x(self, level_data):
+        """
+        world_x_offset để player bắt đầu ở mép trái viewport (toạ độ game có thêm safe zone).
+        Nếu ở đó player không đứng trọn trên platform hoặc có obstacle thật / wall tile cách
+        chưa tới PLAY_TEST_CLEARANCE phía trước, dời tới vị trí hợp lệ gần nhất phía trước.
+        None nếu từ viewport tới cuối level không có vị trí nào như vậy.
+        """
+        start_x = max(0, self.view_x + EDITOR_ORIGIN_X - PLAYER_TARGET_X)
+        world = level_data["world"]
+        platforms = [p for segment in world for p in _segment_platforms(segment)]
+        blockers = [ob.hitbox() for segment in world for ob in segment.get("obstacles", []) if ob.kind == "real"]
+        blockers.extend(tile.rect() for segment in world for tile in segment.get("wall_tiles", []))
+        for world_x_offset in range(int(start_x), int(level_data["length"]) - PLAYER_TARGET_X, PLAY_TEST_SCAN_STEP):
+            left = world_x_offset + PLAYER_TARGET_X
+            center = left + PLAYER_W // 2
+            # Game đặt player lên platform đầu tiên chứa tâm hitbox
+            platform = next((p for p in platforms if p.x <= center < p.x + p.length), None)
+            if platform is None or left < platform.x or left + PLAYER_W > platform.x + platform.length:
+                continue
+            space = pygame.Rect(left, platform.y - PLAYER_H, PLAYER_W + PLAY_TEST_CLEARANCE, PLAYER_H)
+            if space.collidelist(blockers) == -1:
+                return world_x_offset
+        return None
+
+    def play_test(self):
+        """Chơi thử level đang sửa từ vị trí camera; ESC để quay lại editor."""
+        if not self.world_data:
+            self.set_status("Nothing to play: add a section first.")
+            return
+        level_data = self.level_builder.build(dict(self.level_header, sections=self.world_data))
+        start_x = self.play_test_start_x(level_data)
+        if start_x is None:
+            self.set_status("Nothing to play from here: no safe platform ahead of the camera.")
+            return
+        name = os.path.basename(self.current_file) if self.current_file else "New Level"
+        result = Game(self.screen, f"{name} (play-test)", level_data=level_data, start_x=start_x).run()
+        pygame.display.set_caption(f"Level Editor - {name}")
+        pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_ARROW)
+        self.set_status("Play-test: level completed!" if result == 'COMPLETED' else "Play-test ended.")
+
+    # -------------------------
+    # Render cache
+    # -------------------------
+    def invalidate(self, section=None):
+        """Gọi sau mỗi thay đổi world_data: section đã sửa, hoặc None khi thay cả level (load/new)."""
+        self.level_builder.invalidate(section)
+        if section is None:
+            self._section_surfaces.clear()
+            self.index.reset(self.world_data)
+        else:
+            self._section_surfaces.pop(id(section), None)
+            self.index.invalidate(section)
+
+    def _render_grid(self):
+        grid = pygame.Surface((SCREEN_W, SCREEN_H))
+        grid.fill(BACKGROUND_COLOR)
         for x in range(0, SCREEN_W, GRID_SIZE):
-            pygame.draw.line(self.screen, (30, 30, 40), (x, 0), (x, SCREEN_H))
-
-        cursor_x = 0
-        total_length = 0
-        for sec in self.world_data:
-            if sec['type'] == 'straight':
-                plat_y = sec.get('platform_y', GROUND_Y)
-                sec_len = sec.get('length', 0)
-                pygame.draw.rect(self.screen, (80,80,80), (cursor_x - self.view_x, plat_y, sec_len, 6))
-                for ob in sec.get('obstacles', []):
-                    color = (200,40,40) if ob['kind'] == 'real' else (120,120,220)
-                    pygame.draw.rect(self.screen, color, (cursor_x + ob['x'] - self.view_x, plat_y - 50, 30, 50))
-                cursor_x += sec_len
-            elif sec['type'] == 'branch':
-                branch_x = sec.get('branch_x', cursor_x)
-                sec_len = 0
-                for i, path in enumerate(sec.get('paths', [])):
-                    plat_y = GROUND_Y + path.get('offset_y', 0)
-                    path_len = path.get('length', 0)
-                    sec_len = max(sec_len, path_len)
-                    color = (100,150,100) if i==0 else (100,100,150)
-                    pygame.draw.rect(self.screen, color, (branch_x - self.view_x, plat_y, path_len, 6))
-                    for ob in path.get('obstacles', []):
-                        color = (200,40,40) if ob['kind'] == 'real' else (120,120,220)
-                        pygame.draw.rect(self.screen, color, (branch_x + ob['x'] - self.view_x, plat_y - 50, 30, 50))
-                cursor_x = branch_x + sec_len
-            total_length = cursor_x
+            pygame.draw.line(grid, GRID_COLOR, (x, 0), (x, SCREEN_H))
+        return grid
 
-        # UI
-        controls1 = "R:Real | F:Fake | D:Del | A:Add Straight"
-        controls2 = "CTRL+N: New | CTRL+S: Save | SHIFT+S: Save As"
-        info_text = self.font.render(f"Tool: {self.tool.upper()} | Level Length: {total_length}px", True, (255, 255, 255))
-        controls1_text = self.font.render(controls1, True, (200,200,200))
-        controls2_text = self.font.render(controls2, True, (200,200,200))
+    def _section_surface(self, entry):
+        """Surface đã cache của section: (surface, offset_x, top_y); surface là None nếu section rỗng."""
+        sec = entry.section
+        cached = self._section_surfaces.get(id(sec))
+        if cached is not None and cached[0] is sec and cached[1] is entry.segment:
+            return cached[2:]
+        rects = _segment_rects(entry.segment, entry.start_x + EDITOR_ORIGIN_X)
+        if not rects:
+            cached = (sec, entry.segment, None, 0, 0)
+        else:
+            bounds = rects[0][1].unionall([rect for _, rect in rects[1:]])
+            surface = pygame.Surface(bounds.size, pygame.SRCALPHA)
+            for color, rect in rects:
+                pygame.draw.rect(surface, color, rect.move(-bounds.x, -bounds.y))
+            cached = (sec, entry.segment, surface, bounds.x, bounds.y)
+        self._section_surfaces[id(sec)] = cached
+        return cached[2:]
+
+    def _text(self, text, color):
+        key = (text, color)
+        surface = self._text_cache.get(key)
+        if surface is None:
+            if len(self._text_cache) >= TEXT_CACHE_SIZE:
+                self._text_cache.clear()
+            surface = self._text_cache[key] = self.font.render(text, True, color)
+        return surface
 
-        self.screen.blit(info_text, (10, 10))
-        self.screen.blit(controls1_text, (10, 35))
-        self.screen.blit(controls2_text, (10, 60))
+    def draw(self):
+        self.screen.blit(self._grid_surface, (0, 0))
+
+        # Chỉ vẽ section giao với viewport
+        view_left = self.view_x
+        view_right = self.view_x + SCREEN_W
+        for entry in self.index.visible(view_left, view_right):
+            surface, offset_x, top_y = self._section_surface(entry)
+            if surface is not None:
+                self.screen.blit(surface, (entry.start_x + offset_x - self.view_x, top_y))
+        total_length = self.index.length
+
+        # UI
+        tool = self.tool.upper() if self.tool != 'add_section' else f"ADD {self.section_type.upper()}"
+        controls1 = "R:Real | F:Fake | D:Del | A/1-6: Add Section | X: Del Section | PgUp/PgDn: Move | +/-: Adjust"
+        controls2 = "CTRL+N: New | CTRL+S: Save | SHIFT+S: Save As | CTRL+Z/Y: Undo/Redo | F5: Play-test"
+        self.screen.blit(self._text(f"Tool: {tool} | Level Length: {total_length}px", (255, 255, 255)), (10, 10))
+        self.screen.blit(self._text(controls1, (200,200,200)), (10, 35))
+        self.screen.blit(self._text(controls2, (200,200,200)), (10, 60))
 
         if self.status_timer > 0:
-            status_text = self.font.render(self.status_message, True, (255, 255, 0))
-            self.screen.blit(status_text, (10, SCREEN_H - 30))
+            self.screen.blit(self._text(self.status_message, (255, 255, 0)), (10, SCREEN_H - 30))
             self.status_timer -= 1
 
         pygame.display.flip()
@@ -315,4 +726,4 @@ class LevelEditor:
         while self.running:
             self.handle_events()
             self.draw()
-            self.clock.tick(FPS)
\ No newline at end of file
+            self.clock.tick(FPS)
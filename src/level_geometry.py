@@ -0,0 +1,69 @@
+# level_geometry.py - FLAT ARRAY VIEW OF A LOADED LEVEL
+import numpy as np
+
+# Loại hình học (hit type) — 0 dành cho "không chạm gì"
+GEOM_NONE = 0
+GEOM_PLATFORM = 1
+GEOM_WALL = 2
+GEOM_REAL = 3
+GEOM_FAKE = 4
+NUM_GEOM_TYPES = 4
+
+# Độ dày platform khi va chạm, khớp với Player.update
+PLATFORM_THICKNESS = 20
+
+class LevelGeometry:
+    """
+    Toàn bộ hình học của level dưới dạng mảng NumPy, sắp xếp theo cạnh trái:
+    - rects: float32 (N, 4) = [x, y, w, h] trong toạ độ world
+    - kinds: int8 (N,) = GEOM_*
+    Dùng cho các truy vấn hàng loạt (sensors, AI) thay vì duyệt object Python.
+    """
+    def __init__(self, rects, kinds):
+        order = np.argsort(rects[:, 0], kind="stable")
+        self.rects = np.ascontiguousarray(rects[order], dtype=np.float32)
+        self.kinds = np.ascontiguousarray(kinds[order], dtype=np.int8)
+        self.left = self.rects[:, 0]
+        # Chiều rộng lớn nhất cho phép cắt cửa sổ theo x chỉ bằng searchsorted trên cạnh trái
+        self.max_width = float(self.rects[:, 2].max()) if len(self.rects) else 0.0
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @classmethod
+    def from_segments(cls, segments):
+        """Compile các segment do TerrainGenerator tạo ra."""
+        rects = []
+        kinds = []
+        for seg in segments:
+            for p in seg.get("platforms", [seg.get("platform")]):
+                if p is None:
+                    continue
+                rects.append((p.x, p.y, p.length, PLATFORM_THICKNESS))
+                kinds.append(GEOM_PLATFORM)
+            for tile in seg.get("wall_tiles", []):
+                rects.append((tile.x, tile.y, tile.width, tile.tile_height))
+                kinds.append(GEOM_WALL)
+            for ob in seg.get("obstacles", []):
+                # Obstacle thật: đúng hitbox va chạm (Obstacle.hitbox) mà Simulation dùng
+                box = ob.hitbox() if ob.kind == "real" else ob.rect()
+                rects.append((box.x, box.y, box.width, box.height))
+                kinds.append(GEOM_REAL if ob.kind == "real" else GEOM_FAKE)
+        return cls(np.array(rects, dtype=np.float32).reshape(-1, 4),
+                   np.array(kinds, dtype=np.int8))
+
+    @classmethod
+    def from_sorted(cls, rects, kinds):
+        """Dùng trực tiếp các mảng đã sắp xếp (ví dụ view read-only trên shared memory), không copy."""
+        geometry = cls.__new__(cls)
+        geometry.rects = rects
+        geometry.kinds = kinds
+        geometry.left = rects[:, 0]
+        geometry.max_width = float(rects[:, 2].max()) if len(rects) else 0.0
+        return geometry
+
+    def window(self, x_min, x_max):
+        """Slice (start, stop) các rect có thể giao với khoảng [x_min, x_max]."""
+        start = int(np.searchsorted(self.left, x_min - self.max_width, side="left"))
+        stop = int(np.searchsorted(self.left, x_max, side="right"))
+        return start, stop
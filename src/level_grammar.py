@@ -0,0 +1,274 @@
+# level_grammar.py - SECTION GRAMMAR FOR THE RANDOM LEVEL GENERATOR
+import random
+
+from config import *
+
+# -------------------------
+# Physics limits
+# -------------------------
+# Xấp xỉ liên tục của cung nhảy (JumpArcTable trong level_validator là bản chính xác)
+JUMP_RISE = JUMP_V ** 2 / (2 * GRAVITY)
+JUMP_DISTANCE = RUN_SPEED * 2 * -JUMP_V / GRAVITY
+
+# Khoảng cách tối thiểu giữa hai obstacle thật cần hai cú nhảy riêng
+REAL_SPACING = int(JUMP_DISTANCE) + 40
+# Hai obstacle thật gần hơn khoảng này được nhảy qua bằng một cú (>= 60 của validate_level)
+PAIR_SPACING = (60, 85)
+# Obstacle thật cách mép platform (để có chỗ cất cánh và chỗ đáp)
+REAL_START = 110
+REAL_END_MARGIN = 100
+
+# Vùng độ cao platform được dùng: chừa khoảng trống phía trên để nhảy
+MIN_PLATFORM_Y = GROUND_Y - 370
+MAX_PLATFORM_Y = GROUND_Y
+
+# Chiều cao một tile tường (TerrainGenerator.wall_jump)
+WALL_TILE_HEIGHT = 40
+# Platform vào / ra cố định của wall_jump
+WALL_JUMP_FIXED_LENGTH = 100 + 10 + 150
+# Đoạn chạy trước điểm rẽ nhánh
+BRANCH_LEAD_IN = 50
+
+# -------------------------
+# Grammar
+# -------------------------
+# Level := straight Section*; mỗi Section chọn theo trọng số (difficulty 1, difficulty 5),
+# nội suy tuyến tính ở giữa. Branch path := straight | section_sequence(straight|gap|stairs)
+SECTION_WEIGHTS = {
+    "straight": (6, 2),
+    "stairs_up": (1, 2),
+    "stairs_down": (1, 2),
+    "gap": (1, 3),
+    "wall_jump": (0, 2),
+    "branch": (2, 2),
+}
+PATH_SEQUENCE_TYPES = ("straight", "gap", "stairs_up", "stairs_down")
+
+# Mỗi difficulty: (min_gap, max_gap, real_ratio) cho obstacle, như generator cũ
+OBSTACLE_DENSITY = {
+    1: (150, 250, 0.3),
+    2: (120, 200, 0.5),
+    3: (100, 150, 0.6),
+    4: (80, 130, 0.7),
+    5: (70, 100, 0.8),
+}
+
+# Số lần sinh lại một section không qua physics check
+SECTION_RETRIES = 8
+
+def _lerp(low, high, t):
+    return low + (high - low) * t
+
+class SectionGrammar:
+    """
+    Sinh section cho mọi terrain type của TerrainGenerator (straight, stairs_up,
+    stairs_down, gap, wall_jump, branch với path là section_sequence).
+    Mỗi template trả về (config JSON, length, exit_y); tham số lấy trong giới hạn
+    physics và tiến dần tới giới hạn khi difficulty tăng.
+    validate=True: mỗi section được kiểm tra bằng level_validator (nối sau một đoạn chạy
+    cùng độ cao) và sinh lại nếu không qua.
+    """
+    def __init__(self, difficulty=2, rng=None, seed=None, validate=True):
+        self.difficulty = max(1, min(5, int(difficulty)))
+        self.rng = rng if rng is not None else random.Random(seed)
+        # 0 (dễ nhất) .. 1 (khó nhất)
+        self.t = (self.difficulty - 1) / 4
+        self.min_gap, self.max_gap, self.real_ratio = OBSTACLE_DENSITY[self.difficulty]
+        # Tỉ lệ giới hạn physics được dùng (độ cao, bề rộng gap)
+        self.reach = _lerp(0.45, 0.85, self.t)
+        self.validator = None
+        if validate:
+            from level_validator import PhysicsValidator
+            self.validator = PhysicsValidator()
+
+    # --- top level ---
+    def level(self, sections=5, start_y=GROUND_Y, terrain_types=None):
+        """Level JSON: section đầu luôn là straight (spawn), branch_x theo toạ độ level."""
+        level = {"sections": []}
+        y = start_y
+        cursor_x = 0
+        for i in range(sections):
+            if i == 0:
+                # Player spawn ở PLAYER_TARGET_X, sau safe zone
+                config, length, y = self.straight(y, start=PLAYER_TARGET_X - SAFE_ZONE_DISTANCE + REAL_START)
+            else:
+                config, length, y = self.section(y, terrain_types)
+            if config["type"] == "branch":
+                config["branch_x"] = cursor_x + BRANCH_LEAD_IN
+            level["sections"].append(config)
+            cursor_x += length
+        return level
+
+    def section(self, y, terrain_types=None):
+        """Một section hợp lệ bắt đầu ở độ cao y: (config, length, exit_y)."""
+        for _ in range(SECTION_RETRIES):
+            terrain = self.choose(y, terrain_types)
+            config, length, exit_y = getattr(self, terrain)(y)
+            if self.validator is None or self.validator.validate_pattern(config)[0]:
+                return config, length, exit_y
+        # Không tìm được: đoạn chạy thẳng không obstacle luôn đi được
+        return self.straight(y, obstacles=False)
+
+    def choose(self, y, terrain_types=None):
+        weights = {}
+        for terrain, (easy, hard) in SECTION_WEIGHTS.items():
+            if terrain_types is not None and terrain not in terrain_types:
+                continue
+            if not self._fits(terrain, y):
+                continue
+            weights[terrain] = _lerp(easy, hard, self.t)
+        if not any(weights.values()):
+            return "straight"
+        terrains = list(weights)
+        return self.rng.choices(terrains, weights=[weights[t] for t in terrains])[0]
+
+    def _fits(self, terrain, y):
+        """Còn đủ chỗ trên màn hình để đi lên / xuống không."""
+        if terrain in ("stairs_up", "wall_jump", "branch"):
+            return y - 2 * WALL_TILE_HEIGHT >= MIN_PLATFORM_Y
+        if terrain == "stairs_down":
+            return y + 2 * 20 <= MAX_PLATFORM_Y
+        return True
+
+    # --- obstacles ---
+    def obstacles(self, length, start=REAL_START, end_margin=REAL_END_MARGIN, allow_real=True):
+        """
+        Obstacle trên một platform dài length: list (x, kind).
+        Obstacle thật cách nhau ít nhất REAL_SPACING (hai cú nhảy) hoặc đi thành cặp
+        trong PAIR_SPACING (một cú nhảy, difficulty >= 4); fake ở đâu cũng được.
+        """
+        rng = self.rng
+        result = []
+        last_real = None
+        x = rng.randint(start - 30, start + 70)
+        while x < length - 60:
+            real = allow_real and rng.random() < self.real_ratio and x <= length - end_margin and x >= start
+            if real and last_real is not None and x - last_real < REAL_SPACING:
+                real = False
+            if real:
+                result.append((x, "real"))
+                last_real = x
+                if self.difficulty >= 4 and rng.random() < 0.3:
+                    second = x + rng.randint(*PAIR_SPACING)
+                    if second <= length - end_margin:
+                        result.append((second, "real"))
+                        last_real = second
+                        x = second
+            else:
+                result.append((x, "fake"))
+            x += rng.randint(self.min_gap, self.max_gap)
+        return result
+
+    # --- templates ---
+    def straight(self, y, start=REAL_START, obstacles=True):
+        length = self.rng.randint(int(_lerp(500, 350, self.t)), int(_lerp(750, 600, self.t)))
+        obs = self.obstacles(length, start) if obstacles else []
+        config = {
+            "type": "straight",
+            "length": length,
+            "platform_y": y,
+            "obstacles": [{"x": x, "y": "ground", "kind": kind} for x, kind in obs],
+        }
+        return config, length, y
+
+    def _stairs(self, y, direction):
+        rng = self.rng
+        step_height = rng.randint(20, max(21, int(_lerp(40, JUMP_RISE * self.reach, self.t))))
+        step_width = rng.randint(int(_lerp(140, 100, self.t)), int(_lerp(200, 150, self.t)))
+        room = (y - MIN_PLATFORM_Y) if direction < 0 else (MAX_PLATFORM_Y - y)
+        max_steps = min(3 + self.difficulty // 2, room // step_height + 1)
+        if max_steps < 2:
+            step_height = max(1, room)
+            max_steps = 2
+        step_count = rng.randint(2, max_steps)
+        obstacles = []
+        for i in range(1, step_count):
+            # Obstacle trên bậc: chỉ fake, trừ khi bậc đủ rộng
+            if rng.random() < _lerp(0.15, 0.5, self.t):
+                kind = "real" if step_width >= 150 and rng.random() < self.real_ratio else "fake"
+                obstacles.append({"step_index": i, "x_offset": rng.randint(40, step_width - 40), "kind": kind})
+        config = {
+            "type": "stairs_up" if direction < 0 else "stairs_down",
+            "start_y": y,
+            "step_height": step_height,
+            "step_width": step_width,
+            "step_count": step_count,
+            "obstacles": obstacles,
+        }
+        return config, step_width * step_count, y + direction * (step_count - 1) * step_height
+
+    def stairs_up(self, y):
+        return self._stairs(y, -1)
+
+    def stairs_down(self, y):
+        return self._stairs(y, 1)
+
+    def gap(self, y):
+        rng = self.rng
+        max_gap = int(_lerp(70, JUMP_DISTANCE * self.reach, self.t))
+        max_offset = int(JUMP_RISE * self.reach * 0.4) if self.difficulty >= 3 else 0
+        platforms = []
+        obstacles = []
+        x = 0
+        offset = 0
+        for index in range(rng.randint(2, 2 + self.difficulty // 2)):
+            width = rng.randint(int(_lerp(200, 90, self.t)), int(_lerp(300, 200, self.t)))
+            if index > 0:
+                x += rng.randint(40, max(41, max_gap))
+                # Bậc cao / thấp giữa các platform, trong vùng màn hình
+                low = max(-max_offset, MIN_PLATFORM_Y - y - offset)
+                high = min(max_offset, MAX_PLATFORM_Y - y - offset)
+                offset += rng.randint(min(low, 0), max(high, 0))
+            platforms.append({"x": x, "width": width, "y_offset": offset})
+            if width >= 180 and rng.random() < self.real_ratio:
+                obstacles.append({"platform_index": index, "x": width // 2, "kind": "real"})
+            elif rng.random() < 0.3:
+                obstacles.append({"platform_index": index, "kind": "fake"})
+            x += width
+        if self.difficulty >= 3 and rng.random() < 0.3:
+            # Obstacle giả lơ lửng trên gap
+            obstacles.append({"x": platforms[1]["x"] - 30, "y": "midair", "kind": "fake"})
+        config = {"type": "gap", "length": x, "base_y": y, "platforms": platforms, "obstacles": obstacles}
+        return config, x, y + offset
+
+    def wall_jump(self, y):
+        rng = self.rng
+        max_tiles = max(2, min(int(_lerp(4, 8, self.t)), (y - MIN_PLATFORM_Y) // WALL_TILE_HEIGHT))
+        height = rng.randint(2, max_tiles) * WALL_TILE_HEIGHT
+        shaft_width = rng.randint(int(_lerp(110, 130, self.t)), int(_lerp(150, 200, self.t)))
+        config = {"type": "wall_jump", "entry_y": y, "height": height, "shaft_width": shaft_width, "obstacles": []}
+        return config, WALL_JUMP_FIXED_LENGTH + shaft_width, y - height
+
+    def branch(self, y):
+        """Hai path: dưới ở độ cao hiện tại, trên cao hơn tối đa một cú nhảy; hợp nhánh ở path dưới."""
+        rng = self.rng
+        upper_offset = -rng.randint(60, int(JUMP_RISE * self.reach))
+        paths = []
+        lengths = []
+        exits = []
+        for offset in (0, upper_offset):
+            config, length, exit_y = self._path(y + offset)
+            paths.append(dict(config, offset_y=offset))
+            lengths.append(length)
+            exits.append(exit_y)
+        # branch_x là vị trí trong section, level() đổi sang toạ độ level
+        config = {"type": "branch", "branch_x": BRANCH_LEAD_IN, "platform_y": y, "paths": paths}
+        return config, BRANCH_LEAD_IN + max(lengths), exits[0]
+
+    def _path(self, y):
+        """Một path của branch: straight, hoặc chuỗi 2-3 section ở difficulty cao."""
+        rng = self.rng
+        if self.difficulty < 3 or rng.random() < 0.5:
+            config, length, exit_y = self.straight(y, start=REAL_START)
+            config.pop("platform_y")
+            return config, length, exit_y
+        sequence = []
+        total = 0
+        sub_y = y
+        for _ in range(rng.randint(2, 3)):
+            terrain = rng.choice([t for t in PATH_SEQUENCE_TYPES if self._fits(t, sub_y)])
+            sub, length, sub_y = getattr(self, terrain)(sub_y)
+            sequence.append(sub)
+            total += length
+        # Độ cao của path lấy từ offset_y của branch
+        return {"type": "section_sequence", "sequence": sequence}, total, sub_y
@@ -0,0 +1,115 @@
+# level_index.py - METADATA INDEX OF levels/*.json FOR THE LEVEL-SELECT MENU
+import argparse
+import json
+import os
+import time
+
+from fitness_cache import level_hash
+
+DEFAULT_LEVELS_DIR = "levels"
+DEFAULT_INDEX_FILE = "level_index.json"
+# Tăng khi các field của entry thay đổi để build lại toàn bộ index
+INDEX_VERSION = 1
+
+def _read_metadata(path):
+    """Đọc đầy đủ một file level, chỉ giữ lại những gì menu cần."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    metadata = data.get("metadata", {})
+    return {
+        "display_name": metadata.get("display_name", os.path.basename(path)),
+        "difficulty": metadata.get("difficulty", "Normal"),
+        "description": metadata.get("description", ""),
+        "order": metadata.get("order", 999),
+        "mode": data.get("mode"),
+        "hash": level_hash(data),
+    }
+
+class LevelIndex:
+    """
+    Index {filename: metadata} của các level trong levels_dir, lưu trong index_path:
+    display_name, difficulty, description, order, mode, hash (nội dung, như fitness_cache)
+    cùng mtime/size của file. refresh() chỉ stat các file; file chỉ được parse lại khi
+    mtime hoặc size đổi, entry của file đã xoá bị bỏ. Dữ liệu đầy đủ của level chỉ được load
+    khi chơi (PlayingState).
+    """
+    def __init__(self, levels_dir=DEFAULT_LEVELS_DIR, index_path=DEFAULT_INDEX_FILE):
+        self.levels_dir = levels_dir
+        self.index_path = index_path
+        self.entries = {}
+        self.parsed = 0
+        self.reused = 0
+        self._load()
+
+    def _load(self):
+        if not self.index_path or not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"⚠️ Could not read level index '{self.index_path}': {e}")
+            return
+        if data.get("version") == INDEX_VERSION and data.get("levels_dir") == self.levels_dir:
+            self.entries = data.get("levels", {})
+
+    def save(self):
+        if not self.index_path:
+            return
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "levels_dir": self.levels_dir, "levels": self.entries}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def refresh(self):
+        """Đồng bộ index với levels_dir. Trả về các entry (dict filename -> metadata)."""
+        self.parsed = 0
+        self.reused = 0
+        changed = False
+        entries = {}
+        try:
+            files = [entry for entry in os.scandir(self.levels_dir)
+                     if entry.name.endswith(".json") and entry.is_file()]
+        except FileNotFoundError:
+            files = []
+        for file_entry in files:
+            stat = file_entry.stat()
+            cached = self.entries.get(file_entry.name)
+            if cached is not None and cached["mtime"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+                entries[file_entry.name] = cached
+                self.reused += 1
+                continue
+            try:
+                metadata = _read_metadata(file_entry.path)
+            except (json.JSONDecodeError, OSError, UnicodeDecodeError, AttributeError) as e:
+                print(f"⚠️ Warning: Could not load {file_entry.path}: {e}")
+                continue
+            metadata["mtime"] = stat.st_mtime_ns
+            metadata["size"] = stat.st_size
+            entries[file_entry.name] = metadata
+            self.parsed += 1
+            changed = True
+        # Có file mới/đổi hoặc file bị xoá
+        changed = changed or len(entries) != len(self.entries)
+        self.entries = entries
+        if changed:
+            try:
+                self.save()
+            except OSError as e:
+                print(f"⚠️ Could not save level index '{self.index_path}': {e}")
+        return entries
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build / refresh the level metadata index")
+    parser.add_argument("--levels-dir", default=DEFAULT_LEVELS_DIR)
+    parser.add_argument("--index", default=DEFAULT_INDEX_FILE)
+    parser.add_argument("--rebuild", action="store_true", help="ignore the existing index")
+    args = parser.parse_args()
+
+    if args.rebuild and os.path.exists(args.index):
+        os.remove(args.index)
+    start = time.perf_counter()
+    index = LevelIndex(args.levels_dir, args.index)
+    entries = index.refresh()
+    print(f"✓ {len(entries)} levels indexed in {(time.perf_counter() - start) * 1000:.1f} ms "
+          f"({index.parsed} parsed, {index.reused} unchanged) -> {args.index}")
@@ -1,14 +1,18 @@
 # level_manager.py - AUTO-DISCOVERY LEVEL SYSTEM WITH MODERN UI
 import pygame
-import json
-import os
-import glob
 import math
+import time
 from config import *
+from level_index import LevelIndex
+from progress_store import ProgressStore
+from run_store import RunStore, DEFAULT_RUNS_DB, DEFAULT_PLAYER
+
+LEADERBOARD_ROWS = 10
 
 class LevelManager:
-    def __init__(self, screen):
+    def __init__(self, screen, player=DEFAULT_PLAYER):
         self.screen = screen
+        self.player = player
         self.clock = pygame.time.Clock()
         
         # Fonts
@@ -19,8 +23,15 @@ class LevelManager:
         self.font_status = pygame.font.SysFont("Arial", 20, bold=True)
         
         self.progress_file = "progress.json"
-        self.completed_levels = self.load_progress()
-        
+        # Đọc lazy ở lần vẽ menu đầu tiên, ghi ở nền (atomic)
+        self.progress = ProgressStore(self.progress_file)
+        self.runs_file = DEFAULT_RUNS_DB
+        self._run_store = None
+        # level -> (top runs, lịch sử của player), xoá khi có lượt chơi mới
+        self._leaderboard_cache = {}
+        self.leaderboard_index = None
+        
+        self.level_index = LevelIndex()
         regular_levels, special_modes = self.discover_levels()
         
         editor_item = {
@@ -41,55 +52,39 @@ class LevelManager:
         self.visible_items = 6
 
     def discover_levels(self):
-        levels_dir = "levels"
-        level_files = glob.glob(os.path.join(levels_dir, "*.json"))
+        # Chỉ stat các file level; file chỉ được đọc lại khi đổi (xem level_index.py)
+        entries = self.level_index.refresh()
         
         discovered_levels = []
         special_modes = []
         
-        for filepath in level_files:
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                metadata = data.get("metadata", {})
-                is_special_mode = data.get("mode") == "endless"
+        for filename, entry in sorted(entries.items()):
+            is_special_mode = entry["mode"] == "endless"
 
-                level_info = {
-                    "display_name": metadata.get("display_name", os.path.basename(filepath)),
-                    "filename": os.path.basename(filepath),
-                    "difficulty": metadata.get("difficulty", "Normal"),
-                    "description": metadata.get("description", ""),
-                    "is_editor": False,
-                    "is_special_mode": is_special_mode
-                }
+            level_info = {
+                "display_name": entry["display_name"],
+                "filename": filename,
+                "difficulty": entry["difficulty"],
+                "description": entry["description"],
+                "is_editor": False,
+                "is_special_mode": is_special_mode
+            }
 
-                if is_special_mode:
-                    special_modes.append(level_info)
-                else:
-                    level_info["order"] = metadata.get("order", 999)
-                    discovered_levels.append(level_info)
-                
-            except Exception as e:
-                print(f"⚠️ Warning: Could not load {filepath}: {e}")
+            if is_special_mode:
+                special_modes.append(level_info)
+            else:
+                level_info["order"] = entry["order"]
+                discovered_levels.append(level_info)
         
         discovered_levels.sort(key=lambda x: x["order"])
         
-        print(f"✓ Discovered {len(discovered_levels)} regular levels and {len(special_modes)} special modes.")
+        print(f"✓ Discovered {len(discovered_levels)} regular levels and {len(special_modes)} special modes "
+              f"({self.level_index.parsed} re-indexed).")
         return discovered_levels, special_modes
 
-    def load_progress(self):
-        if os.path.exists(self.progress_file):
-            try:
-                with open(self.progress_file, 'r') as f:
-                    return set(json.load(f))
-            except json.JSONDecodeError:
-                return set()
-        return set()
-
-    def save_progress(self):
-        with open(self.progress_file, 'w') as f:
-            json.dump(list(self.completed_levels), f)
+    @property
+    def completed_levels(self):
+        return self.progress.completed
 
     def complete_level(self, filename):
         item_data = next((item for item in self.menu_items if item["filename"] == filename), None)
@@ -97,11 +92,33 @@ class LevelManager:
             print(f"ℹ️ Endless mode run ended. No progress saved.")
             return
 
-        if filename not in self.completed_levels:
-            self.completed_levels.add(filename)
-            self.save_progress()
+        if self.progress.complete_level(filename):
             print(f"✓ Progress saved: {filename}")
 
+    @property
+    def run_store(self):
+        if self._run_store is None:
+            self._run_store = RunStore(self.runs_file)
+        return self._run_store
+
+    def record_run(self, filename, game, completed=False):
+        """Lưu mọi lượt chơi của game (Game.runs) vào run store, stats và high score vào progress."""
+        if not game.runs:
+            return
+        self.run_store.add_runs(filename, self.player, game.runs)
+        self._leaderboard_cache.pop(filename, None)
+        run_stats = game.run_stats
+        if self.progress.record_run(filename, run_stats["best_distance"], run_stats["attempts"],
+                                    run_stats["deaths"], run_stats["play_time"], completed):
+            print(f"🏆 New high score on {filename}: {int(run_stats['best_distance'])}")
+
+    def close(self):
+        """Đợi writer nền ghi xong tiến độ (gọi trước khi thoát game)."""
+        self.progress.close()
+        if self._run_store is not None:
+            self._run_store.close()
+            self._run_store = None
+
     def get_difficulty_color(self, difficulty):
         """Trả về màu dựa trên độ khó"""
         colors = {
@@ -122,6 +139,11 @@ class LevelManager:
             pygame.draw.line(self.screen, (r, g, b), (x, y + i), (x + w, y + i))
 
     def draw(self):
+        if self.leaderboard_index is not None:
+            self.draw_leaderboard()
+            pygame.display.flip()
+            return
+
         # Background with gradient
         self.draw_gradient_rect(0, 0, SCREEN_W, SCREEN_H, (15, 8, 25), (25, 15, 35))
         
@@ -141,6 +163,8 @@ class LevelManager:
         # Subtitle
         subtitle_surf = self.font_subtitle.render("Choose your adventure", True, (200, 180, 220))
         self.screen.blit(subtitle_surf, (30, 110))
+        hint_surf = self.font_meta.render("L: Leaderboard", True, (150, 130, 180))
+        self.screen.blit(hint_surf, hint_surf.get_rect(topright=(SCREEN_W - 30, 116)))
         
         # Update animation
         self.animation_progress = (self.animation_progress + 1) % 60
@@ -234,6 +258,13 @@ class LevelManager:
             status_rect = status_surf.get_rect(topright=(card_rect.right - 25, card_rect.top + 12))
             self.screen.blit(status_surf, status_rect)
         
+        # High score (quãng đường xa nhất)
+        high_score = self.progress.high_score(item["filename"]) if is_level else None
+        if high_score:
+            score_surf = self.font_meta.render(f"🏆 Best: {high_score}", True, (255, 215, 120))
+            score_rect = score_surf.get_rect(bottomright=(card_rect.right - 25, card_rect.bottom - 10))
+            self.screen.blit(score_surf, score_rect)
+        
         # Locked indicator
         if not is_unlocked:
             lock_surf = self.font_status.render("🔒 LOCKED", True, (255, 150, 100))
@@ -252,11 +283,74 @@ class LevelManager:
                 (arrow_x - 10 + pulse, arrow_y + 8)
             ])
 
+    def _leaderboard_items(self):
+        return [i for i, item in enumerate(self.menu_items) if not item.get("is_editor", False)]
+
+    def _leaderboard_data(self, filename):
+        data = self._leaderboard_cache.get(filename)
+        if data is None:
+            data = (self.run_store.top_runs(filename, LEADERBOARD_ROWS),
+                    self.run_store.player_history(self.player, LEADERBOARD_ROWS, level=filename))
+            self._leaderboard_cache[filename] = data
+        return data
+
+    def draw_leaderboard(self):
+        """Top lượt chơi của level (trái) và các lượt gần nhất của player (phải)."""
+        self.draw_gradient_rect(0, 0, SCREEN_W, SCREEN_H, (15, 8, 25), (25, 15, 35))
+        item = self.menu_items[self.leaderboard_index]
+        top_runs, history = self._leaderboard_data(item["filename"])
+
+        title_surf = self.font_title.render("LEADERBOARD", True, (255, 255, 255))
+        self.screen.blit(title_surf, title_surf.get_rect(center=(SCREEN_W / 2, 50)))
+        subtitle_surf = self.font_subtitle.render(f"< {item['display_name']} >", True, (200, 180, 220))
+        self.screen.blit(subtitle_surf, subtitle_surf.get_rect(center=(SCREEN_W / 2, 110)))
+
+        column_w = SCREEN_W / 2 - 60
+        for column, heading, runs in ((0, "TOP RUNS", top_runs), (1, f"RECENT - {self.player}", history)):
+            x = 40 + column * (column_w + 40)
+            heading_surf = self.font_status.render(heading, True, (200, 150, 255))
+            self.screen.blit(heading_surf, (x, 150))
+            pygame.draw.line(self.screen, (120, 100, 150), (x, 178), (x + column_w, 178), 2)
+            if not runs:
+                empty_surf = self.font_meta.render("No runs yet", True, (150, 150, 150))
+                self.screen.blit(empty_surf, (x, 190))
+            for row, run in enumerate(runs):
+                y = 190 + row * 28
+                if column == 0:
+                    label = f"{row + 1:>2}. {run['player']}"
+                    color = (255, 215, 120) if run["player"] == self.player else (230, 230, 230)
+                else:
+                    label = time.strftime("%m-%d %H:%M", time.localtime(run["created_at"]))
+                    color = (230, 230, 230)
+                result = run["death_cause"] or "quit"
+                self.screen.blit(self.font_meta.render(label, True, color), (x, y))
+                stats_surf = self.font_meta.render(f"{run['distance']:.0f}px  {run['duration']:.1f}s  {result}",
+                                                   True, color)
+                self.screen.blit(stats_surf, stats_surf.get_rect(topright=(x + column_w, y)))
+
+        hint_surf = self.font_meta.render("LEFT/RIGHT: Level | L/ESC: Back", True, (150, 130, 180))
+        self.screen.blit(hint_surf, hint_surf.get_rect(center=(SCREEN_W / 2, SCREEN_H - 30)))
+
+    def _handle_leaderboard_key(self, key):
+        items = self._leaderboard_items()
+        position = items.index(self.leaderboard_index)
+        if key in (pygame.K_LEFT, pygame.K_UP):
+            self.leaderboard_index = items[(position - 1) % len(items)]
+        elif key in (pygame.K_RIGHT, pygame.K_DOWN):
+            self.leaderboard_index = items[(position + 1) % len(items)]
+        elif key in (pygame.K_l, pygame.K_ESCAPE):
+            self.selected_index = self.leaderboard_index
+            self.leaderboard_index = None
+
     def handle_input(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 return None
             
+            if event.type == pygame.KEYDOWN and self.leaderboard_index is not None:
+                self._handle_leaderboard_key(event.key)
+                continue
+
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_UP:
                     self.selected_index = (self.selected_index - 1) % len(self.menu_items)
@@ -284,6 +378,12 @@ class LevelManager:
                     else:
                         print("⚠️ Level is locked! Complete previous level first.")
                 
+                elif event.key == pygame.K_l and self._leaderboard_items():
+                    if self.selected_index in self._leaderboard_items():
+                        self.leaderboard_index = self.selected_index
+                    else:
+                        self.leaderboard_index = self._leaderboard_items()[0]
+                
                 elif event.key == pygame.K_ESCAPE:
                     return None
         
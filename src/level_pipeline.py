@@ -0,0 +1,161 @@
+# level_pipeline.py - BULK LEVEL GENERATION WITH PARALLEL VALIDATION
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+
+from utils import generate_random_level, analyze_level_difficulty, validate_level
+
+# Số level mỗi worker nhận một lần (giảm overhead IPC)
+DEFAULT_CHUNKSIZE = 16
+
+# Dừng nếu tỉ lệ level hợp lệ quá thấp: tối đa count * MAX_ATTEMPT_RATIO lần thử
+MAX_ATTEMPT_RATIO = 50
+
+def _parse_range(text):
+    """'3' -> (3, 3), '2-5' -> (2, 5)"""
+    low, _, high = str(text).partition("-")
+    return int(low), int(high or low)
+
+def _init_worker():
+    # Bảng cung nhảy được tính một lần cho mỗi worker
+    from level_validator import arc_tables
+    arc_tables()
+
+def _generate_task(task):
+    """
+    Worker: sinh, kiểm tra và chấm điểm một level.
+    Mọi thứ suy ra từ seed nên cùng seed cho cùng kết quả ở bất kỳ worker nào.
+    """
+    from level_validator import validate_level_physics
+    attempt, seed, difficulty_range, section_range = task
+    rng = random.Random(seed)
+    difficulty = rng.randint(*difficulty_range)
+    sections = rng.randint(*section_range)
+    level = generate_random_level(difficulty, sections, rng=rng)
+    warnings = validate_level(level)[1] + validate_level_physics(level)[1]
+    if warnings:
+        return attempt, seed, None, None, len(warnings)
+    return attempt, seed, level, analyze_level_difficulty(level), 0
+
+class CorpusWriter:
+    """
+    Ghi level được chấp nhận ngay khi có, mỗi dòng một JSON (JSON Lines, không indent):
+    {"id", "seed", "difficulty", "metrics", "level"}. Ghi vào file .tmp, close() đổi tên khi xong,
+    abort() (lỗi / Ctrl-C) xoá file .tmp, nên file corpus không bao giờ dở dang và corpus cũ
+    không bị ghi đè bởi một lần chạy hỏng.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.file = open(self.tmp_path, "w", encoding="utf-8")
+        self.count = 0
+
+    def write(self, seed, level, metrics):
+        record = {"id": self.count, "seed": seed, "difficulty": metrics["difficulty"],
+                  "metrics": metrics, "level": level}
+        self.file.write(json.dumps(record, separators=(",", ":")))
+        self.file.write("\n")
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+def iter_corpus(path):
+    """Đọc lần lượt các record của một corpus (không load cả file vào bộ nhớ)."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def generate_corpus(output, count, difficulty="1-5", sections="4-8", seed=0, workers=None,
+                    chunksize=DEFAULT_CHUNKSIZE, min_score=1, max_score=5, progress_every=1000):
+    """
+    Sinh level song song cho đến khi có count level qua cả validate_level lẫn physics check
+    và có difficulty score (analyze_level_difficulty) trong [min_score, max_score].
+    Lần thử thứ i dùng seed + i; kết quả được đọc theo thứ tự nên cùng tham số cho cùng corpus.
+    workers=0: chạy trong process hiện tại.
+    Trả về dict thống kê.
+    """
+    difficulty_range = _parse_range(difficulty)
+    section_range = _parse_range(sections)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    max_attempts = count * MAX_ATTEMPT_RATIO
+    tasks = ((attempt, seed + attempt, difficulty_range, section_range) for attempt in range(max_attempts))
+
+    pool = None
+    if workers > 0:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker)
+        results = pool.imap(_generate_task, tasks, chunksize)
+    else:
+        _init_worker()
+        results = map(_generate_task, tasks)
+
+    writer = CorpusWriter(output)
+    attempts = rejected_invalid = rejected_score = 0
+    start = time.perf_counter()
+    try:
+        for attempt, level_seed, level, metrics, _ in results:
+            attempts += 1
+            if level is None:
+                rejected_invalid += 1
+            elif not min_score <= metrics["difficulty"] <= max_score:
+                rejected_score += 1
+            else:
+                writer.write(level_seed, level, metrics)
+                if progress_every and writer.count % progress_every == 0:
+                    elapsed = time.perf_counter() - start
+                    print(f"   {writer.count}/{count} levels ({attempts} attempts, {writer.count / elapsed:,.0f} levels/s)")
+                if writer.count >= count:
+                    break
+    except BaseException:
+        writer.abort()
+        raise
+    else:
+        writer.close()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "accepted": writer.count,
+        "attempts": attempts,
+        "rejected_invalid": rejected_invalid,
+        "rejected_score": rejected_score,
+        "seconds": elapsed,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a validated corpus of random levels (JSON Lines)")
+    parser.add_argument("output", help="corpus file, one level per line")
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--difficulty", default="1-5", help="generator difficulty, e.g. 3 or 2-5")
+    parser.add_argument("--sections", default="4-8", help="sections per level, e.g. 6 or 4-8")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count, 0: none)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--min-score", type=int, default=1, help="minimum analyzed difficulty score (1-5)")
+    parser.add_argument("--max-score", type=int, default=5, help="maximum analyzed difficulty score (1-5)")
+    args = parser.parse_args()
+
+    print(f"🎲 Generating {args.count} validated levels -> {args.output}")
+    stats = generate_corpus(args.output, args.count, args.difficulty, args.sections, args.seed,
+                            args.workers, args.chunksize, args.min_score, args.max_score)
+    print(f"✓ {stats['accepted']} levels in {stats['seconds']:.1f}s "
+          f"({stats['attempts']} attempts, {stats['rejected_invalid']} unplayable, "
+          f"{stats['rejected_score']} outside the score range)")
+    if stats["accepted"] < args.count:
+        print(f"⚠ Stopped after {stats['attempts']} attempts, most generated levels were rejected")
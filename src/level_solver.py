@@ -0,0 +1,228 @@
+# level_solver.py - JUMP SCHEDULE SEARCH OVER SIMULATION STATES
+import argparse
+import json
+import time
+
+from config import *
+from main import build_level
+from simulation import Simulation, STATUS_RUNNING, STATUS_COMPLETED, ACTION_NOOP, ACTION_JUMP
+from trainer import compute_fitness
+
+OBJECTIVES = ("jumps", "safe")
+
+# Khoảng cách (px) tới obstacle thật được coi là an toàn tuyệt đối
+CLEARANCE_CAP = 64
+# Số state tối đa giữ lại mỗi frame (giữ các state tốt nhất nếu vượt)
+MAX_LAYER_STATES = 4000
+
+class SolveResult:
+    """
+    Kết quả của LevelSolver:
+    - solved: tìm được lịch nhảy hoàn thành level (level endless: sống tới max_ticks)
+    - schedule: các tick (đếm từ 0) mà ở đó action là jump, mọi tick khác là noop
+    - ticks: số frame của lời giải
+    - min_clearance: khoảng cách nhỏ nhất tới obstacle thật dọc lời giải (px, tối đa CLEARANCE_CAP)
+    - best_fitness_found: fitness (trainer.compute_fitness) lớn nhất trong các state đã duyệt;
+      chỉ là cận dưới của fitness tốt nhất có thể đạt (các state bị cắt bỏ không được xét)
+    - furthest_x: world x xa nhất tới được
+    """
+    def __init__(self):
+        self.solved = False
+        self.schedule = []
+        self.ticks = None
+        self.min_clearance = None
+        self.best_fitness_found = 0.0
+        self.furthest_x = 0.0
+        self.states_expanded = 0
+        self.seconds = 0.0
+
+    @property
+    def jumps(self):
+        return len(self.schedule)
+
+    def to_dict(self):
+        return {
+            "solved": self.solved,
+            "ticks": self.ticks,
+            "jumps": self.jumps,
+            "schedule": self.schedule,
+            "min_clearance": self.min_clearance,
+            "best_fitness_found": round(self.best_fitness_found, 2),
+            "furthest_x": round(self.furthest_x),
+            "states_expanded": self.states_expanded,
+            "seconds": round(self.seconds, 3),
+        }
+
+class LevelSolver:
+    """
+    BFS theo từng frame trên các state rời rạc của player
+    (x, y, vy, on_ground, trạng thái bám tường + cooldown), action noop / jump.
+    - State được hash (_state_key); một key đã gặp ở frame sớm hơn với chi phí không tệ hơn
+      thì bị bỏ (memo): tương lai giống hệt nhưng còn ít thời gian hơn.
+    - Mỗi frame chỉ giữ state tốt nhất cho mỗi key, nên lời giải đầu tiên là ngắn nhất theo
+      frame, rồi tốt nhất theo objective:
+      "jumps": ít cú nhảy nhất; "safe": xa obstacle thật nhất (max-min clearance), rồi ít cú nhảy.
+    - Khi một frame có quá max_layer_states state, chỉ các state tốt nhất theo objective được
+      giữ lại. Lúc đó tìm kiếm không còn đầy đủ: lời giải đầu tiên có thể không phải ngắn nhất
+      (hay tốt nhất theo objective), và một level qua được vẫn có thể không tìm ra lời giải.
+    """
+    def __init__(self, level_data, seed=None, objective="jumps", max_ticks=None,
+                 max_layer_states=MAX_LAYER_STATES):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective '{objective}', expected one of {OBJECTIVES}")
+        self.sim = Simulation(level_data, seed=seed)
+        self.objective = objective
+        if max_ticks is None:
+            max_ticks = MAX_STEPS_PER_GENOME if self.sim.is_endless else int(3 * self.sim.level_length / RUN_SPEED) + 600
+        self.max_ticks = max_ticks
+        self.max_layer_states = max_layer_states
+
+    def _state_key(self):
+        sim = self.sim
+        player = sim.player
+        wall = player.wall_state
+        return (round(sim.world_x_offset), player.hitbox.y, round(player.vy, 3), player.on_ground,
+                wall.is_sliding, wall.side, wall.can_jump, round(wall.time_elapsed, 2),
+                round(max(wall.jump_cooldown, 0.0), 2), round(max(wall.re_attach_cooldown, 0.0), 2))
+
+    def _clearance(self):
+        """Khoảng cách Chebyshev từ hitbox tới obstacle thật gần nhất (tối đa CLEARANCE_CAP)."""
+        sim = self.sim
+        hitbox = sim.player.hitbox
+        left = sim.player_world_x
+        right = left + hitbox.width
+        best = CLEARANCE_CAP
+        for ob in sim.real_obstacles.window(left - CLEARANCE_CAP, right + CLEARANCE_CAP):
+            dx = max(ob.x - right, left - (ob.x + ob.w), 0)
+            dy = max((ob.y - ob.h) - hitbox.bottom, hitbox.top - ob.y, 0)
+            best = min(best, max(dx, dy))
+        return best
+
+    def _cost(self, jumps, clearance):
+        # Nhỏ hơn là tốt hơn
+        if self.objective == "safe":
+            return (-clearance, jumps)
+        return (jumps,)
+
+    def _succeeded(self):
+        sim = self.sim
+        if sim.is_endless:
+            return sim.status is STATUS_RUNNING and sim.ticks >= self.max_ticks
+        return sim.status == STATUS_COMPLETED
+
+    def solve(self):
+        start_time = time.perf_counter()
+        result = SolveResult()
+        sim = self.sim
+        sim.reset()
+        track_clearance = self.objective == "safe"
+
+        # nodes[i] = (parent, tick của action jump hoặc None) để dựng lại lịch nhảy
+        nodes = [(None, None)]
+        start_clearance = self._clearance() if track_clearance else CLEARANCE_CAP
+        layer = {self._state_key(): (sim.snapshot(), 0, start_clearance, 0)}
+        best_seen = {}
+        goals = []
+
+        while layer and not goals:
+            next_layer = {}
+            for state, jumps, clearance, node in layer.values():
+                sim.restore(state)
+                player = sim.player
+                can_jump = player.on_ground or (player.wall_state.is_sliding and player.wall_state.can_jump)
+                tick = sim.ticks
+                for action in ((ACTION_NOOP, ACTION_JUMP) if can_jump else (ACTION_NOOP,)):
+                    if action == ACTION_JUMP:
+                        sim.restore(state)
+                    sim.step(action)
+                    result.states_expanded += 1
+                    new_jumps = jumps + (action == ACTION_JUMP)
+                    result.best_fitness_found = max(result.best_fitness_found, compute_fitness(sim))
+                    result.furthest_x = max(result.furthest_x, sim.player_world_x)
+                    if sim.status is not STATUS_RUNNING and sim.status != STATUS_COMPLETED:
+                        continue
+                    new_clearance = min(clearance, self._clearance()) if track_clearance else clearance
+                    new_node = len(nodes)
+                    nodes.append((node, tick if action == ACTION_JUMP else None))
+                    cost = self._cost(new_jumps, new_clearance)
+                    if self._succeeded():
+                        goals.append((cost, new_node, sim.ticks, new_clearance))
+                        continue
+                    if sim.status == STATUS_COMPLETED or sim.ticks >= self.max_ticks:
+                        continue
+                    key = self._state_key()
+                    seen = best_seen.get(key)
+                    if seen is not None and seen <= cost:
+                        continue
+                    best_seen[key] = cost
+                    next_layer[key] = (sim.snapshot(), new_jumps, new_clearance, new_node)
+            if len(next_layer) > self.max_layer_states:
+                # Giữ các state tốt nhất (chi phí, rồi xa nhất)
+                kept = sorted(next_layer.items(), key=lambda item: (self._cost(item[1][1], item[1][2]), -item[1][0][0]))
+                next_layer = dict(kept[:self.max_layer_states])
+            layer = next_layer
+
+        if goals:
+            cost, node, ticks, clearance = min(goals)
+            schedule = []
+            while node is not None:
+                parent, jump_tick = nodes[node]
+                if jump_tick is not None:
+                    schedule.append(jump_tick)
+                node = parent
+            result.solved = True
+            result.schedule = schedule[::-1]
+            result.ticks = ticks
+            result.min_clearance = clearance if track_clearance else None
+        result.seconds = time.perf_counter() - start_time
+        return result
+
+def replay(level_data, schedule, seed=None, max_ticks=None):
+    """
+    Chạy lại một lịch nhảy trên Simulation mới (bằng chứng level qua được).
+    Trả về (status, ticks, fitness).
+    """
+    sim = Simulation(level_data, seed=seed)
+    jump_ticks = set(schedule)
+    if max_ticks is None:
+        max_ticks = MAX_STEPS_PER_GENOME if sim.is_endless else int(3 * sim.level_length / RUN_SPEED) + 600
+    while not sim.done and sim.ticks < max_ticks:
+        sim.step(ACTION_JUMP if sim.ticks in jump_ticks else ACTION_NOOP)
+    return sim.status, sim.ticks, compute_fitness(sim)
+
+def solve_level(level_json, seed=None, objective="jumps", max_ticks=None):
+    """Giải một level JSON (dict). Trả về SolveResult."""
+    return LevelSolver(build_level(level_json), seed=seed, objective=objective, max_ticks=max_ticks).solve()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the jump schedule that beats a level")
+    parser.add_argument("levels", nargs="+", help="level JSON files")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="jumps",
+                        help="jumps: fewest jumps, safe: farthest from real obstacles")
+    parser.add_argument("--seed", type=int, default=0, help="seed for endless levels")
+    parser.add_argument("--max-ticks", type=int, default=None)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for filename in args.levels:
+        with open(filename, "r", encoding="utf-8") as f:
+            level_json = json.load(f)
+        level_data = build_level(level_json)
+        result = LevelSolver(level_data, args.seed, args.objective, args.max_ticks).solve()
+        results[filename] = result.to_dict()
+        if result.solved:
+            status, _, _ = replay(level_data, result.schedule, args.seed, args.max_ticks)
+            verified = "verified" if status == STATUS_COMPLETED or (status is STATUS_RUNNING and level_data["is_endless"]) \
+                else f"REPLAY FAILED ({status})"
+            clearance = "" if result.min_clearance is None else f", min clearance {result.min_clearance:.0f}px"
+            print(f"✓ {filename}: {result.jumps} jumps in {result.ticks} ticks{clearance} "
+                  f"({result.states_expanded:,} states, {result.seconds:.2f}s, {verified})")
+            print(f"    schedule: {result.schedule}")
+        else:
+            print(f"✗ {filename}: no solution, furthest x={result.furthest_x:.0f} "
+                  f"({result.states_expanded:,} states, {result.seconds:.2f}s)")
+        print(f"    best fitness found: {result.best_fitness_found:.1f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,352 @@
+# level_validator.py - PHYSICS-BASED LEVEL VALIDATION (JUMP-ARC TABLE)
+import argparse
+import json
+import time
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+import pygame
+
+from config import *
+from main import build_level, TerrainGenerator, _START_Y_KEYS
+
+# Số frame tối đa được mô phỏng cho một cung nhảy / rơi
+MAX_ARC_FRAMES = 240
+
+# Sai số (px) khi quyết định obstacle đứng trên platform
+GROUND_TOLERANCE = 2
+
+# -------------------------
+# Jump-Arc Table
+# -------------------------
+class JumpArcTable:
+    """
+    Quỹ đạo của player tính sẵn một lần bằng đúng physics của Player.update_physics
+    (GRAVITY, JUMP_V, làm tròn của pygame.Rect), theo frame:
+    - dx[k]: quãng đường đã đi sau k frame (camera cuộn RUN_SPEED mỗi frame)
+    - bottom[k]: đáy hitbox so với điểm cất cánh (âm = cao hơn)
+    - landing[h]: frame đầu tiên đáp xuống được một platform có mặt trên ở độ cao h
+    Mọi kiểm tra sau đó chỉ là tra bảng.
+    """
+    def __init__(self, initial_vy, run_speed=RUN_SPEED):
+        self.dx = [0.0]
+        self.bottom = [0]
+        self.landing = {}
+        rect = pygame.Rect(0, -PLAYER_H, PLAYER_W, PLAYER_H)
+        vy = initial_vy
+        for k in range(1, MAX_ARC_FRAMES + 1):
+            old_bottom = rect.bottom
+            vy += GRAVITY
+            rect.y += vy
+            self.dx.append(k * run_speed)
+            self.bottom.append(rect.bottom)
+            # Điều kiện đáp của update_physics: đang rơi, đáy cũ ở trên mặt platform, đáy mới xuyên qua
+            if vy >= 0:
+                for h in range(old_bottom, rect.bottom):
+                    self.landing.setdefault(h, k)
+        self.apex = -min(self.bottom)
+
+    def landing_frame(self, height):
+        """height: mặt platform đích so với điểm cất cánh. None nếu không tới được."""
+        return self.landing.get(int(height))
+
+    def clear_window(self, obstacle_height):
+        """
+        (a, b): player ở cao hơn obstacle_height trong các frame k với dx[k] nằm trong
+        (a, b); ngoài khoảng đó hitbox không được chồng lên obstacle. None nếu không nhảy qua được.
+        """
+        frames = [k for k, bottom in enumerate(self.bottom) if bottom <= -obstacle_height]
+        if not frames:
+            return None
+        return self.dx[frames[0] - 1], self.dx[min(frames[-1] + 1, len(self.dx) - 1)]
+
+    def landing_distance(self):
+        """Quãng đường của một cú nhảy đáp lại đúng độ cao cất cánh."""
+        return self.dx[self.landing_frame(0) or len(self.dx) - 1]
+
+JUMP_ARC = None
+FALL_ARC = None
+
+def arc_tables():
+    """Bảng cho cú nhảy và cho việc chạy khỏi mép platform (tính một lần cho mỗi process)."""
+    global JUMP_ARC, FALL_ARC
+    if JUMP_ARC is None:
+        JUMP_ARC = JumpArcTable(JUMP_V)
+        FALL_ARC = JumpArcTable(0.0)
+    return JUMP_ARC, FALL_ARC
+
+# -------------------------
+# Level Graph
+# -------------------------
+class _Node:
+    """Một platform trong level và section chứa nó."""
+    __slots__ = ("x", "y", "right", "section", "label", "obstacles")
+
+    def __init__(self, platform, section, label):
+        self.x = platform.x
+        self.y = platform.y
+        self.right = platform.x + platform.length
+        self.section = section
+        self.label = label
+        self.obstacles = []
+
+class PhysicsValidator:
+    """
+    Kiểm tra level có thể hoàn thành với physics thật:
+    - mỗi platform tới được từ platform trước bằng một cú nhảy hoặc bằng cách rơi
+      (gap, bậc thang, đường vào / ra của branch), đồ thị được duyệt BFS từ safe zone
+    - wall_jump: leo tường được và bay qua shaft tới platform ra
+    - obstacle thật trên mỗi platform có thể nhảy qua (tham lam theo thứ tự x)
+    - mọi path của branch đều đi được, cuối level tới được
+
+    Xấp xỉ: không xét va chạm với obstacle lơ lửng khi đang nhảy qua gap,
+    và wall jump được kiểm tra bằng cung nhảy từ đỉnh tường trái.
+    """
+    def __init__(self):
+        self.jump, self.fall = arc_tables()
+        self.max_reach = self.fall.dx[-1] + PLAYER_W
+
+    def validate(self, level_json):
+        """Trả về (is_valid, warnings) như utils.validate_level."""
+        if level_json.get("mode") == "endless":
+            warnings = []
+            for i, pattern in enumerate(level_json.get("patterns", [])):
+                for w in self.validate_pattern(pattern)[1]:
+                    warnings.append(f"Pattern {pattern.get('id', i)}: {w}")
+            return not warnings, warnings
+
+        if not level_json.get("sections"):
+            return False, ["Level has no sections"]
+        level = build_level(level_json)
+        return self.validate_world(level["world"], level["length"])
+
+    def validate_pattern(self, pattern):
+        """Một pattern endless, nối sau một đoạn chạy cùng độ cao với điểm vào của pattern."""
+        terrain_type = pattern.get("type", "straight")
+        entry_y = pattern.get(_START_Y_KEYS.get(terrain_type, "platform_y"), GROUND_Y)
+        lead_in = TerrainGenerator.straight(0, {"platform_y": entry_y, "length": SAFE_ZONE_DISTANCE, "obstacles": []})
+        terrain_func = getattr(TerrainGenerator, terrain_type, TerrainGenerator.straight)
+        segment = terrain_func(SAFE_ZONE_DISTANCE, pattern)
+        return self.validate_world([lead_in, segment], SAFE_ZONE_DISTANCE + segment["length"], spawn_x=0)
+
+    def validate_world(self, world, length, spawn_x=PLAYER_TARGET_X):
+        """spawn_x: x (world) của hitbox lúc bắt đầu, như Simulation.reset."""
+        warnings = []
+        nodes, shafts = self._collect_nodes(world)
+        nodes.sort(key=lambda n: (n.x, n.y))
+        self._assign_obstacles(world, nodes, warnings)
+        for node in nodes:
+            self._check_obstacles(node, spawn_x, warnings)
+
+        edges = self._build_edges(nodes, shafts, warnings)
+        reachable = self._reachable(nodes, edges, spawn_x + PLAYER_W / 2)
+        if not any(reachable):
+            return False, ["No platform under the spawn point"]
+        for i, node in enumerate(nodes):
+            # Platform nằm hẳn sau điểm spawn không cần tới
+            if not reachable[i] and node.right > spawn_x + PLAYER_W / 2:
+                warnings.append(f"Section {node.section} {node.label}: platform at x={node.x:.0f}, "
+                                f"y={node.y:.0f} cannot be reached")
+        if not any(reachable[i] and node.right >= length - PLAYER_W for i, node in enumerate(nodes)):
+            warnings.append("End of level cannot be reached")
+        return not warnings, warnings
+
+    # --- nodes ---
+    def _collect_nodes(self, world):
+        """Platform của mọi segment; shafts: (entry node, exit node, segment) của wall_jump."""
+        nodes = []
+        shafts = []
+
+        def add_segment(seg, section, label):
+            if seg.get("type") == "branch":
+                path_ids = {id(p) for path in seg["paths"] for p in path["platforms"]}
+                for p in seg["platforms"]:
+                    if id(p) not in path_ids:
+                        nodes.append(_Node(p, section, f"{label}lead-in"))
+                for path in seg["paths"]:
+                    for p in path["platforms"]:
+                        nodes.append(_Node(p, section, f"{label}path '{path['label']}'"))
+                    if path["wall_tiles"]:
+                        self._add_shaft(nodes, shafts, path["platforms"], path["wall_tiles"], section)
+                return
+            for p in seg.get("platforms", [seg.get("platform")]):
+                if p is not None:
+                    nodes.append(_Node(p, section, label or seg.get("type", "straight")))
+            if seg.get("wall_tiles"):
+                self._add_shaft(nodes, shafts, seg.get("platforms", []), seg["wall_tiles"], section)
+
+        for section, seg in enumerate(world):
+            # Segment 0 là safe zone do load_level thêm vào
+            add_segment(seg, section - 1, "")
+        return nodes, shafts
+
+    def _add_shaft(self, nodes, shafts, platforms, wall_tiles, section):
+        walls = {}
+        for tile in wall_tiles:
+            walls.setdefault(tile.x, []).append(tile)
+        for left_x in sorted(walls):
+            tiles = walls[left_x]
+            right_candidates = [x for x in walls if x > left_x]
+            if not right_candidates:
+                continue
+            right_x = min(right_candidates)
+            entry = [p for p in platforms if p.x + p.length <= left_x]
+            exits = [p for p in platforms if p.x >= right_x]
+            if entry and exits:
+                shafts.append((max(entry, key=lambda p: p.x), min(exits, key=lambda p: p.x),
+                               min(t.y for t in tiles), right_x + tiles[0].width, section))
+
+    # --- obstacles ---
+    def _assign_obstacles(self, world, nodes, warnings):
+        xs = [n.x for n in nodes]
+        for section, seg in enumerate(world):
+            for ob in seg.get("obstacles", []):
+                if ob.kind != "real":
+                    continue
+                # Hitbox va chạm như trong game / Simulation
+                box = ob.hitbox()
+                center = box.centerx
+                # Platform ngay dưới obstacle
+                candidates = [n for n in nodes[:bisect_right(xs, center)]
+                              if n.x <= center < n.right and n.y >= ob.y - GROUND_TOLERANCE]
+                if not candidates:
+                    continue
+                node = min(candidates, key=lambda n: n.y)
+                top = box.top
+                if top >= node.y:
+                    continue
+                # Chỉ obstacle chắn đường chạy (player cao PLAYER_H) mới cần nhảy qua
+                if box.bottom <= node.y - PLAYER_H - GROUND_TOLERANCE:
+                    continue
+                node.obstacles.append((box.left, box.right, node.y - top, section - 1))
+
+    def _check_obstacles(self, node, spawn_x, warnings):
+        """Nhảy tham lam: cất cánh sớm nhất có thể cho mỗi nhóm obstacle."""
+        if not node.obstacles:
+            return
+        node.obstacles.sort()
+        land = self.jump.landing_distance()
+        free_x = max(node.x - PLAYER_W, spawn_x)
+        t_lo = t_hi = None
+        for left, right, height, section in node.obstacles:
+            window = self.jump.clear_window(height)
+            if window is None:
+                warnings.append(f"Section {section}: obstacle at x={left:.0f} is too tall to jump "
+                                f"({height:.0f}px > {self.jump.apex}px)")
+                return
+            a, b = window
+            lo, hi = right - b, left - PLAYER_W - a
+            if t_lo is not None and max(t_lo, lo) <= min(t_hi, hi):
+                # Cùng một cú nhảy qua được cả obstacle này
+                t_lo, t_hi = max(t_lo, lo), min(t_hi, hi)
+                continue
+            if t_lo is not None:
+                free_x = t_lo + land
+            t_lo, t_hi = max(lo, free_x, node.x - PLAYER_W + 1), min(hi, node.right - 1)
+            if t_lo > t_hi:
+                warnings.append(f"Section {section}: obstacle at x={left:.0f} cannot be cleared "
+                                f"(no take-off point on the platform)")
+                return
+
+    # --- edges ---
+    def _can_reach(self, a, b):
+        height = b.y - a.y
+        frame = self.jump.landing_frame(height)
+        if frame is not None:
+            dx = self.jump.dx[frame]
+            # Cất cánh ở bất kỳ đâu trên a, hitbox phải chồng lên b khi đáp
+            if a.x - PLAYER_W + dx < b.right and a.right + dx > b.x - PLAYER_W:
+                return True
+        frame = self.fall.landing_frame(height)
+        if frame is not None:
+            dx = self.fall.dx[frame]
+            if a.right + dx < b.right and a.right + dx + RUN_SPEED > b.x - PLAYER_W:
+                return True
+        return False
+
+    def _build_edges(self, nodes, shafts, warnings):
+        xs = [n.x for n in nodes]
+        index = {id(n): i for i, n in enumerate(nodes)}
+        edges = [[] for _ in nodes]
+        for i, a in enumerate(nodes):
+            stop = bisect_right(xs, a.right + self.max_reach)
+            start = bisect_left(xs, a.x - 1)
+            for j in range(start, stop):
+                b = nodes[j]
+                if j != i and b.right > a.right and self._can_reach(a, b):
+                    edges[i].append(j)
+
+        by_platform = {}
+        for i, n in enumerate(nodes):
+            by_platform[(n.x, n.y, n.right)] = i
+        for entry, exit_, wall_top, exit_x, section in shafts:
+            i = by_platform[(entry.x, entry.y, entry.x + entry.length)]
+            j = by_platform[(exit_.x, exit_.y, exit_.x + exit_.length)]
+            if self._can_cross_shaft(exit_, wall_top, exit_x):
+                edges[i].append(j)
+            else:
+                warnings.append(f"Section {section}: wall_jump shaft cannot be crossed to the exit at "
+                                f"y={exit_.y:.0f}")
+        return edges
+
+    def _can_cross_shaft(self, exit_platform, wall_top, exit_x):
+        """
+        Leo tường trái bằng wall jump (không giới hạn độ cao vì mỗi lần bám lại reset
+        thời gian), sau đó một cung nhảy từ đỉnh tường phải tới được platform ra.
+        """
+        frame = self.jump.landing_frame(exit_platform.y - wall_top)
+        if frame is None:
+            return False
+        return exit_x + self.jump.dx[frame] >= exit_platform.x - PLAYER_W
+
+    def _reachable(self, nodes, edges, spawn_center):
+        reachable = [False] * len(nodes)
+        starts = [i for i, n in enumerate(nodes) if n.x <= spawn_center < n.right]
+        if not starts:
+            return reachable
+        # Simulation.reset đặt player lên platform đầu tiên dưới điểm spawn
+        start = starts[0]
+        reachable[start] = True
+        queue = deque([start])
+        while queue:
+            i = queue.popleft()
+            for j in edges[i]:
+                if not reachable[j]:
+                    reachable[j] = True
+                    queue.append(j)
+        return reachable
+
+_VALIDATOR = None
+
+def validate_level_physics(level_json):
+    """(is_valid, warnings) cho một level JSON (dict), dùng bảng cung nhảy dùng chung."""
+    global _VALIDATOR
+    if _VALIDATOR is None:
+        _VALIDATOR = PhysicsValidator()
+    return _VALIDATOR.validate(level_json)
+
+def benchmark(count=1000, difficulty=3, sections=8, seed=0):
+    """Đo số level sinh ngẫu nhiên được kiểm tra mỗi phút. Trả về (levels/min, số level hợp lệ)."""
+    from utils import generate_random_level
+    levels = [generate_random_level(difficulty, sections, seed=seed + i + 1) for i in range(count)]
+    start = time.perf_counter()
+    valid = sum(validate_level_physics(level)[0] for level in levels)
+    elapsed = time.perf_counter() - start
+    return count / elapsed * 60, valid
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate levels with the jump-arc physics check")
+    parser.add_argument("levels", nargs="*", help="level JSON files (none: benchmark on generated levels)")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--difficulty", type=int, default=3)
+    parser.add_argument("--sections", type=int, default=8)
+    args = parser.parse_args()
+    if not args.levels:
+        per_minute, valid = benchmark(args.count, args.difficulty, args.sections)
+        print(f"✓ {per_minute:,.0f} levels/min ({valid}/{args.count} generated levels valid)")
+    for filename in args.levels:
+        with open(filename, "r", encoding="utf-8") as f:
+            is_valid, warnings = validate_level_physics(json.load(f))
+        print(f"{'✓' if is_valid else '⚠'} {filename}")
+        for w in warnings:
+            print(f"  - {w}")
@@ -5,6 +5,7 @@ import random
 import math
 import neat
 import os
+import time
 from collections import deque
 
 # Import responsive config
@@ -16,8 +17,11 @@ except ImportError:
     print("⚠️ Using old config, responsive features may not work properly")
 
 from assets_manager import LOADED_THEMES, load_assets
-from enemy_manager import LOADED_ENEMIES, load_enemies, get_random_enemy, get_enemy_data, get_enemy_config
+from enemy_manager import LOADED_ENEMIES, load_enemies, get_enemy_data, get_enemy_config, enemy_hitbox_sizes
 from decoy_manager import LOADED_DECOYS, load_decoys, get_random_decoy, get_decoy_data, get_decoy_config
+from observations import ObservationIndex, ObservationBuilder
+from level_geometry import LevelGeometry
+from sensors import RaySensor, ray_angles
 
 # Thiết lập giá trị mặc định
 if 'PLAYER_TARGET_X' not in globals():
@@ -45,6 +49,24 @@ def initialize_pygame_and_assets():
     if not LOADED_DECOYS: load_decoys()
     else: print("ℹ️ Decoys already loaded, skipping...")
 
+# -------------------------
+# Surface Cache
+# -------------------------
+# Ảnh đã load/scale được dùng lại giữa các lần tạo PlayingState (ví dụ play-test trong editor)
+_SURFACE_CACHE = {}
+
+def load_cached_image(path, size=None):
+    """pygame.image.load(path).convert_alpha(), scale về size nếu có. Mỗi (path, size) chỉ load một lần."""
+    key = (path, size)
+    surface = _SURFACE_CACHE.get(key)
+    if surface is None:
+        if size is None:
+            surface = pygame.image.load(path).convert_alpha()
+        else:
+            surface = pygame.transform.scale(load_cached_image(path), size)
+        _SURFACE_CACHE[key] = surface
+    return surface
+
 # -------------------------
 # Multi-Layer Background (RESPONSIVE)
 # -------------------------
@@ -56,9 +78,8 @@ class MultiLayerBackground:
         self.layers = []
         try:
             for config in layer_configs:
-                surface = pygame.image.load(config["file"]).convert_alpha()
                 # Scale to full screen size
-                scaled_surface = pygame.transform.scale(surface, (SCREEN_W, SCREEN_H))
+                scaled_surface = load_cached_image(config["file"], (SCREEN_W, SCREEN_H))
                 self.layers.append({
                     "image": scaled_surface,
                     "speed": config["speed"],
@@ -101,6 +122,32 @@ class Obstacle:
     def rect(self):
         return pygame.Rect(self.x, self.y - self.h, self.w, self.h)
 
+    @property
+    def sprite_type(self):
+        """
+        Enemy vẽ cho obstacle thật. Chọn theo vị trí (không ngẫu nhiên) để game và Simulation
+        cùng biết trước hitbox của từng obstacle.
+        """
+        names = sorted(enemy_hitbox_sizes())
+        if self.kind != "real" or not names:
+            return None
+        return random.Random(int(self.x) * 100003 + int(self.y)).choice(names)
+
+    def hitbox_geometry(self):
+        """
+        (center_x, bottom_y, width, height) của rect va chạm giống collide_player_hitbox trong
+        PlayingState: ảnh của ObstacleSprite đặt midbottom tại (x + 15, y + y_offset); không có
+        sprite thì là khối 30x50.
+        """
+        width, height, y_offset = enemy_hitbox_sizes().get(self.sprite_type, (30, 50, 0))
+        return self.x + 15, self.y + y_offset, width, height
+
+    def hitbox(self):
+        center_x, bottom_y, width, height = self.hitbox_geometry()
+        rect = pygame.Rect(0, 0, width, height)
+        rect.midbottom = (center_x, bottom_y)
+        return rect
+
 class Platform:
     def __init__(self, x, y, length):
         self.x = x
@@ -319,13 +366,130 @@ class TerrainGenerator:
             "length": total_length
         }
 
+    @staticmethod
+    def section_sequence(cursor_x, config):
+        # Several sections laid out back to back (used as a branch path)
+        base_y = config.get("platform_y", GROUND_Y)
+        platforms, wall_tiles, obstacles, choice_points = [], [], [], []
+        x = cursor_x
+        for sub_config in config.get("sequence", []):
+            sub_config = _with_default_y(sub_config, base_y)
+            terrain_func = getattr(TerrainGenerator, sub_config.get("type", "straight"), TerrainGenerator.straight)
+            sub = terrain_func(x, sub_config)
+            platforms.extend(_segment_platforms(sub))
+            wall_tiles.extend(sub.get("wall_tiles", []))
+            obstacles.extend(sub.get("obstacles", []))
+            choice_points.extend(sub.get("choice_points", []))
+            base_y = _segment_exit_y(sub, base_y)
+            x += sub["length"]
+        return {"type": "section_sequence", "platforms": platforms, "wall_tiles": wall_tiles,
+                "obstacles": obstacles, "choice_points": choice_points, "length": x - cursor_x}
+
+    @staticmethod
+    def branch(cursor_x, config):
+        """
+        Split into several paths at branch_x and merge again at the end of the section.
+        Paths can be any terrain type, including section_sequence. The result carries
+        the path graph: per-path geometry/entry/exit y, the upper/lower paths and a
+        flat list of choice points (nested branches included) for the AI inputs.
+        """
+        base_y = config.get("platform_y", GROUND_Y)
+        # Editor/generator files store branch_x in level coordinates (no safe zone),
+        # hand-written levels store it relative to the start of the section.
+        branch_x = config.get("branch_x", 0)
+        if branch_x + SAFE_ZONE_DISTANCE >= cursor_x:
+            split_x = branch_x + SAFE_ZONE_DISTANCE
+        else:
+            split_x = cursor_x + branch_x
+
+        platforms, wall_tiles, obstacles, nested_choices = [], [], [], []
+        if split_x > cursor_x:
+            platforms.append(Platform(cursor_x, base_y, split_x - cursor_x))
+
+        paths = []
+        for index, path_config in enumerate(config.get("paths", [])):
+            path_config = _with_default_y(path_config, base_y + path_config.get("offset_y", 0))
+            terrain_func = getattr(TerrainGenerator, path_config.get("type", "straight"), TerrainGenerator.straight)
+            segment = terrain_func(split_x, path_config)
+            path_platforms = _segment_platforms(segment)
+            exit_y = _segment_exit_y(segment, base_y)
+            paths.append({
+                "index": index,
+                "label": path_config.get("label", f"Path {index + 1}"),
+                "type": path_config.get("type", "straight"),
+                "offset_y": path_config.get("offset_y", exit_y - base_y),
+                "entry_y": path_platforms[0].y if path_platforms else base_y,
+                "exit_y": exit_y,
+                "length": segment["length"],
+                "platforms": path_platforms,
+                "wall_tiles": segment.get("wall_tiles", []),
+                "obstacles": segment.get("obstacles", []),
+            })
+            nested_choices.extend(segment.get("choice_points", []))
+
+        merge_x = split_x + max([p["length"] for p in paths] + [0])
+        for path in paths:
+            # Shorter paths run out on a platform at their exit height up to the merge point
+            if path["platforms"] and path["length"] < merge_x - split_x:
+                run_out_x = split_x + path["length"]
+                path["platforms"].append(Platform(run_out_x, path["exit_y"], merge_x - run_out_x))
+            path["x_start"] = split_x
+            path["x_end"] = merge_x
+            platforms.extend(path["platforms"])
+            wall_tiles.extend(path["wall_tiles"])
+            obstacles.extend(path["obstacles"])
+
+        upper_path = min(paths, key=lambda p: p["offset_y"])["index"] if paths else None
+        lower_path = max(paths, key=lambda p: p["offset_y"])["index"] if paths else None
+        choice_points = [{"x": split_x, "paths": [p["offset_y"] for p in paths]}] + nested_choices
+        return {
+            "type": "branch",
+            "branch_x": split_x,
+            "merge_x": merge_x,
+            "paths": paths,
+            "upper_path": upper_path,
+            "lower_path": lower_path,
+            "choice_points": sorted(choice_points, key=lambda c: c["x"]),
+            "platforms": platforms,
+            "wall_tiles": wall_tiles,
+            "obstacles": obstacles,
+            # Không chọn gì thì đi tiếp đường dưới
+            "exit_y": paths[lower_path]["exit_y"] if paths else base_y,
+            "length": merge_x - cursor_x,
+        }
+
+def _segment_platforms(segment):
+    return [p for p in segment.get("platforms", [segment.get("platform")]) if p is not None]
+
+def _segment_exit_y(segment, default_y):
+    """Height at which a segment ends: its explicit exit_y or the y of its right-most platform."""
+    if "exit_y" in segment:
+        return segment["exit_y"]
+    platforms = _segment_platforms(segment)
+    if not platforms:
+        return default_y
+    return max(platforms, key=lambda p: p.x + p.length).y
+
+# Key chứa độ cao bắt đầu của từng loại terrain
+_START_Y_KEYS = {"straight": "platform_y", "stairs_up": "start_y", "stairs_down": "start_y",
+                 "gap": "base_y", "wall_jump": "entry_y", "section_sequence": "platform_y", "branch": "platform_y"}
+
+def _with_default_y(config, y):
+    """Copy of a section config that starts at y unless the file sets its own height."""
+    key = _START_Y_KEYS.get(config.get("type", "straight"), "platform_y")
+    if key in config:
+        return config
+    return dict(config, **{key: y})
+
 # -------------------------
 # Endless Manager
 # -------------------------
 class EndlessManager:
-    def __init__(self, patterns_data, spawn_logic):
+    def __init__(self, patterns_data, spawn_logic, rng=None):
         self.patterns = patterns_data
         self.spawn_logic = spawn_logic
+        # rng riêng cho phép replay một run endless theo seed (AI training)
+        self.rng = rng or random
         self.last_pattern_id = None
         print(f"✓ EndlessManager initialized with {len(self.patterns)} patterns.")
         if not self.patterns:
@@ -335,13 +499,13 @@ class EndlessManager:
         if self.spawn_logic.get("order") == "random":
             if self.spawn_logic.get("avoid_consecutive_same") and len(self.patterns) > 1:
                 available_patterns = [p for p in self.patterns if p.get("id") != self.last_pattern_id]
-                chosen_pattern = random.choice(available_patterns)
+                chosen_pattern = self.rng.choice(available_patterns)
             else:
-                chosen_pattern = random.choice(self.patterns)
+                chosen_pattern = self.rng.choice(self.patterns)
             self.last_pattern_id = chosen_pattern.get("id")
             return chosen_pattern
         else:
-            return random.choice(self.patterns)
+            return self.rng.choice(self.patterns)
 
 # -------------------------
 # Level Loader (JSON)
@@ -350,6 +514,15 @@ def load_level(path):
     full_path = os.path.join('levels', path)
     with open(full_path, "r", encoding="utf-8") as f: 
         data = json.load(f)
+    if data.get("mode") != "endless":
+        print(f"💡 Injecting a {SAFE_ZONE_DISTANCE}px safe zone at the start of the level.")
+    return build_level(data)
+
+def build_level(data, builder=None):
+    """
+    Build the runtime level (segments) from level JSON that is already in memory.
+    builder: IncrementalLevelBuilder that reuses sections compiled by a previous build.
+    """
     theme_name = data.get("theme", "dungeon").strip()
     is_endless = data.get("mode") == "endless"
     
@@ -359,26 +532,90 @@ def load_level(path):
         return {"patterns": patterns, "spawn_logic": spawn_logic, "theme": theme_name, "is_endless": True}
     else:
         world = []
-        print(f"💡 Injecting a {SAFE_ZONE_DISTANCE}px safe zone at the start of the level.")
         # Determine the y of the very first platform from the JSON to create a matching safe zone
-        first_plat_y = GROUND_Y
-        if data.get("sections"):
-            first_plat_y = data["sections"][0].get("platform_y", data["sections"][0].get("start_y", GROUND_Y))
+        first_plat_y = _first_platform_y(data.get("sections", []))
 
         safe_zone_config = {"type": "straight", "platform_y": first_plat_y, "length": SAFE_ZONE_DISTANCE, "obstacles": []}
         safe_segment = TerrainGenerator.straight(0, safe_zone_config)
         world.append(safe_segment)
         cursor_x = SAFE_ZONE_DISTANCE
+        last_y = first_plat_y
         
         for sec in data.get("sections", []):
-            terrain_type = sec.get("type", "straight")
-            terrain_func = getattr(TerrainGenerator, terrain_type, TerrainGenerator.straight)
-            segment = terrain_func(cursor_x, sec)
+            if builder is not None:
+                segment = builder.compile_section(sec, cursor_x, last_y)
+            else:
+                segment = _compile_section(sec, cursor_x, last_y)
             world.append(segment)
             cursor_x += segment["length"]
+            last_y = _segment_exit_y(segment, last_y)
         total_length = cursor_x
         return {"world": world, "length": total_length, "theme": theme_name, "is_endless": False}
 
+def _first_platform_y(sections):
+    if not sections:
+        return GROUND_Y
+    return sections[0].get("platform_y", sections[0].get("start_y", GROUND_Y))
+
+def _compile_section(sec, cursor_x, last_y):
+    terrain_type = sec.get("type", "straight")
+    terrain_func = getattr(TerrainGenerator, terrain_type, TerrainGenerator.straight)
+    if terrain_type in ("branch", "section_sequence"):
+        # Paths without their own height continue from where the previous section ended
+        sec = _with_default_y(sec, last_y)
+    return terrain_func(cursor_x, sec)
+
+def _shift_segment(segment, dx):
+    """Dời một segment đã compile theo trục x (tại chỗ)."""
+    for p in _segment_platforms(segment):
+        p.x += dx
+    for tile in segment.get("wall_tiles", []):
+        tile.x += dx
+    for ob in segment.get("obstacles", []):
+        ob.x += dx
+    for choice in segment.get("choice_points", []):
+        choice["x"] += dx
+
+class IncrementalLevelBuilder:
+    """
+    build_level với cache theo section (dùng cho play-test trong editor): section không đổi
+    được dùng lại, chỉ dời theo x nếu các section phía trước đổi chiều dài; section bị sửa
+    (invalidate) được compile lại bằng TerrainGenerator. Branch và section_sequence compile lại
+    khi vị trí hoặc độ cao bắt đầu đổi vì branch_x có thể là toạ độ tuyệt đối.
+    Segment dùng lại bị dời tại chỗ, nên level của lần build trước không còn dùng được.
+    """
+    def __init__(self):
+        self._cache = {}  # id(section) -> (section, cursor_x, last_y, segment)
+        self.compiled = 0
+        self.reused = 0
+
+    def invalidate(self, section=None):
+        """Section đã bị sửa; None khi đổi cả level."""
+        if section is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(id(section), None)
+
+    def compile_section(self, sec, cursor_x, last_y):
+        cached = self._cache.get(id(sec))
+        if cached is not None and cached[0] is sec:
+            _, cached_x, cached_y, segment = cached
+            # Branch/section_sequence phụ thuộc vị trí và độ cao của section trước
+            movable = sec.get("type", "straight") not in ("branch", "section_sequence")
+            if movable or (cached_x == cursor_x and cached_y == last_y):
+                if cached_x != cursor_x:
+                    _shift_segment(segment, cursor_x - cached_x)
+                self._cache[id(sec)] = (sec, cursor_x, last_y, segment)
+                self.reused += 1
+                return segment
+        segment = _compile_section(sec, cursor_x, last_y)
+        self._cache[id(sec)] = (sec, cursor_x, last_y, segment)
+        self.compiled += 1
+        return segment
+
+    def build(self, data):
+        return build_level(data, builder=self)
+
 # -------------------------
 # Game Sprites
 # -------------------------
@@ -387,6 +624,9 @@ def collide_player_hitbox(player, obstacle_sprite):
     obstacle_rect = obstacle_sprite.image.get_rect(midbottom=obstacle_sprite.rect.midbottom)
     return player_hitbox.colliderect(obstacle_rect)
 
+# (kind, sprite_type, scale) -> frames đã scale, dùng chung giữa các ObstacleSprite
+_SCALED_FRAMES = {}
+
 class ObstacleSprite(pygame.sprite.Sprite):
     def __init__(self, world_x, y, kind='real', sprite_type=None):
         super().__init__()
@@ -417,10 +657,15 @@ class ObstacleSprite(pygame.sprite.Sprite):
             self.world_pos.y += y_offset
             self.world_pos.x += 15 
             
-            for frame in self.frames:
-                original_w, original_h = frame.get_size()
-                new_w, new_h = int(original_w * self.scale), int(original_h * self.scale)
-                self.scaled_frames.append(pygame.transform.scale(frame, (new_w, new_h)))
+            frames_key = (self.kind, self.sprite_type, self.scale)
+            if frames_key not in _SCALED_FRAMES:
+                scaled = []
+                for frame in self.frames:
+                    original_w, original_h = frame.get_size()
+                    new_w, new_h = int(original_w * self.scale), int(original_h * self.scale)
+                    scaled.append(pygame.transform.scale(frame, (new_w, new_h)))
+                _SCALED_FRAMES[frames_key] = scaled
+            self.scaled_frames = _SCALED_FRAMES[frames_key]
                 
             self.image = self.scaled_frames[0]
             self.rect = self.image.get_rect()
@@ -444,6 +689,10 @@ class ObstacleSprite(pygame.sprite.Sprite):
         self.rect.midbottom = (screen_x, self.world_pos.y)
 
 class Player(pygame.sprite.Sprite):
+    verbose = True
+    # Animation đã cắt từ spritesheet, dùng chung giữa các Player
+    _animation_cache = {}
+
     def __init__(self, x, y):
         super().__init__()
         self._layer = 2
@@ -471,9 +720,15 @@ class Player(pygame.sprite.Sprite):
         self.rect = self.image.get_rect(midbottom=self.hitbox.midbottom)
 
     def load_spritesheet(self, path, num_frames, frame_w, frame_h, scale, anim_speed):
+        key = (path, num_frames, frame_w, frame_h, scale, anim_speed)
+        if key not in Player._animation_cache:
+            Player._animation_cache[key] = self._cut_spritesheet(path, num_frames, frame_w, frame_h, scale, anim_speed)
+        return Player._animation_cache[key]
+
+    def _cut_spritesheet(self, path, num_frames, frame_w, frame_h, scale, anim_speed):
         frames = []
         try:
-            spritesheet = pygame.image.load(path).convert_alpha()
+            spritesheet = load_cached_image(path)
             for i in range(num_frames):
                 rect = pygame.Rect(i * (spritesheet.get_width() // num_frames), 0, 
                                  (spritesheet.get_width() // num_frames), frame_h)
@@ -495,7 +750,8 @@ class Player(pygame.sprite.Sprite):
             self.on_ground = False
         elif self.wall_state.is_sliding and self.wall_state.execute_jump():
             wall_side = self.wall_state.side
-            print(f"🚀 WALL CLIMB JUMP from {wall_side} wall!")
+            if self.verbose:
+                print(f"🚀 WALL CLIMB JUMP from {wall_side} wall!")
             jump_vy = -abs(JUMP_V)
             jump_vx = 0
             self.vy = jump_vy
@@ -526,6 +782,14 @@ class Player(pygame.sprite.Sprite):
         return (None, None, 0)
 
     def update(self, platforms, world_x_offset, delta_time, wall_tiles=None, current_run_speed=RUN_SPEED):
+        wall_check = self.update_physics(platforms, world_x_offset, delta_time, wall_tiles)
+        if wall_check:
+            return wall_check
+        self.update_animation(delta_time)
+        return None
+
+    def update_physics(self, platforms, world_x_offset, delta_time, wall_tiles=None):
+        """Movement + collision only. Shared with the headless simulation."""
         old_hitbox = self.hitbox.copy()
         self.wall_state.update(delta_time)
         
@@ -577,7 +841,9 @@ class Player(pygame.sprite.Sprite):
         if self.wall_state.is_sliding and not self.on_ground:
             if self.wall_state.time_elapsed > WALL_CLIMB_TIME_LIMIT:
                 return "WALL_TIME_EXCEEDED"
-        
+        return None
+
+    def update_animation(self, delta_time):
         # Update animation state
         previous_state = self.state
         if self.wall_state.is_sliding and not self.on_ground:
@@ -609,13 +875,26 @@ class Player(pygame.sprite.Sprite):
         
         # ✨ REFACTOR: Sync the visual rect to the final hitbox position.
         self.rect.midbottom = self.hitbox.midbottom
-        
-        return None
 
 
 # -------------------------
 # Game State Management
 # -------------------------
+# Kết thúc của một lượt chơi (death_cause trong game.runs); None = thoát giữa chừng
+DEATH_OBSTACLE = "obstacle"
+DEATH_FALL = "fall"
+DEATH_WALL_TIME = "wall_time"
+RUN_COMPLETED = "completed"
+
+def summarize_runs(runs):
+    """Gộp các lượt chơi thành stats của progress.json."""
+    return {
+        "attempts": len(runs),
+        "deaths": sum(1 for run in runs if run["death_cause"] not in (None, RUN_COMPLETED)),
+        "best_distance": max((run["distance"] for run in runs), default=0.0),
+        "play_time": sum(run["duration"] for run in runs),
+    }
+
 class GameState:
     def __init__(self, game): 
         self.game = game
@@ -626,14 +905,22 @@ class GameState:
     def exit_state(self): pass
 
 class PlayingState(GameState):
-    def __init__(self, game, level_file):
+    def __init__(self, game, level_file, level_data=None, start_x=0):
+        """
+        level_data: level đã build sẵn (build_level), khi đó không đọc level_file từ đĩa.
+        start_x: world_x_offset lúc bắt đầu (play-test từ vị trí camera của editor).
+        """
         super().__init__(game)
         self.level_file = level_file
-        try: 
-            level_data = load_level(self.level_file)
-        except Exception as e:
-            print(f"✗ Error loading {self.level_file}, falling back to default: {e}")
-            level_data = load_level(DEFAULT_LEVEL)
+        self.start_x = start_x
+        # Số tia RaySensor trong observation của AI (genome có num_inputs = 7 + 2 * rays)
+        self.rays = 0
+        if level_data is None:
+            try: 
+                level_data = load_level(self.level_file)
+            except Exception as e:
+                print(f"✗ Error loading {self.level_file}, falling back to default: {e}")
+                level_data = load_level(DEFAULT_LEVEL)
             
         self.is_endless = level_data["is_endless"]
         theme_name = level_data["theme"]
@@ -667,6 +954,8 @@ class PlayingState(GameState):
         self.visible_platforms = [] 
         self.visible_walls = []
         self.visible_wall_tiles = []
+        self.observation_index = None
+        self.observer = None
 
     def enter_state(self):
         self.all_sprites.empty()
@@ -686,8 +975,20 @@ class PlayingState(GameState):
         self.player.wall_state.reset()
         self.all_sprites.add(self.player)
         
-        self.world_x_offset = 0
+        self.world_x_offset = self.start_x
         self.current_run_speed = RUN_SPEED
+        self.observation_index = None
+
+        # Mỗi lượt chơi là một record trong game.runs (xem summarize_runs / run_store)
+        seed = None
+        if self.is_endless:
+            # Seed riêng cho mỗi lượt: Simulation(level_data, seed) phát lại đúng chuỗi pattern này
+            seed = random.randrange(2 ** 31)
+            self.endless_manager.rng = random.Random(seed)
+            self.endless_manager.last_pattern_id = None
+        self.run = {"seed": seed, "distance": 0.0, "duration": 0.0, "max_speed": RUN_SPEED, "death_cause": None,
+                    "ended_at": None}
+        self.game.runs.append(self.run)
 
         if self.is_endless:
             self.active_segments.clear()
@@ -707,9 +1008,16 @@ class PlayingState(GameState):
                 self._spawn_next_segment()
         else:
             self._create_fixed_level()
+
+        # AI observations: index tĩnh của level + cursor cho player hiện tại
+        initial_segments = self.active_segments if self.is_endless else self.world_data
+        self.observation_index = ObservationIndex(initial_segments)
+        sensor = None
+        if self.rays:
+            sensor = RaySensor(LevelGeometry.from_segments(initial_segments), ray_angles(self.rays))
+        self.observer = ObservationBuilder(self.observation_index, sensor)
             
         # CRITICAL: Find the correct starting platform and place the player on it.
-        initial_segments = self.active_segments if self.is_endless else self.world_data
         all_platforms = []
         for seg in initial_segments:
             platforms_in_seg = seg.get("platforms", [seg.get("platform")])
@@ -722,8 +1030,9 @@ class PlayingState(GameState):
 
         player_on_platform = False
         if all_platforms:
+            player_world_x = self.world_x_offset + self.player.hitbox.centerx
             for p in all_platforms:
-                if p.x <= self.player.hitbox.centerx < p.x + p.length:
+                if p.x <= player_world_x < p.x + p.length:
                     self.player.hitbox.bottom = p.y
                     self.player.on_ground = True
                     self.player.vy = 0
@@ -760,12 +1069,17 @@ class PlayingState(GameState):
         for ob_data in segment.get("obstacles", []): 
             self._create_obstacle_sprite(ob_data)
         self.active_segments.append(segment)
+        if self.observation_index is not None:
+            self.observation_index.add_segment(segment)
+        if self.observer is not None and self.observer.sensor is not None:
+            self.observer.sensor.geometry = LevelGeometry.from_segments(self.active_segments)
         self.cursor_x += segment["length"]
         
     def _create_obstacle_sprite(self, ob_data):
         sprite_type = None
-        if ob_data.kind == 'real' and LOADED_ENEMIES: 
-            sprite_type = get_random_enemy()
+        if ob_data.kind == 'real' and ob_data.sprite_type in LOADED_ENEMIES:
+            # Cùng sprite (và hitbox) mà Simulation dùng cho obstacle này
+            sprite_type = ob_data.sprite_type
         elif ob_data.kind == 'fake' and LOADED_DECOYS: 
             sprite_type = get_random_decoy()
         obstacle_sprite = ObstacleSprite(ob_data.x, ob_data.y, ob_data.kind, sprite_type=sprite_type)
@@ -775,6 +1089,10 @@ class PlayingState(GameState):
             self.fake_obstacles.add(obstacle_sprite)
         self.all_sprites.add(obstacle_sprite)
         
+    def get_observation(self):
+        """7 NEAT inputs (+ các tia RaySensor nếu self.rays) cho player hiện tại (xem observations.py)"""
+        return self.observer.observe_player(self.player, self.world_x_offset)
+
     def handle_events(self, events):
         for event in events:
             if event.type == pygame.QUIT: 
@@ -830,9 +1148,14 @@ class PlayingState(GameState):
         self.player.hitbox.x = PLAYER_TARGET_X
         self.player.rect.midbottom = self.player.hitbox.midbottom # re-sync after camera adjust
 
+        run = self.run
+        run["duration"] += delta_time
+        run["distance"] = max(run["distance"], self.world_x_offset - self.start_x)
+        run["max_speed"] = max(run["max_speed"], self.current_run_speed)
+
         if wall_check == "WALL_TIME_EXCEEDED":
             print("Game Over: Wall time exceeded!")
-            self.game.flip_state("game_over")
+            self._end_run(DEATH_WALL_TIME)
             return
         
         for sprite in self.all_sprites:
@@ -843,12 +1166,12 @@ class PlayingState(GameState):
                                                  False, collided=collide_player_hitbox)
         if collisions:
             print("Player collided with an obstacle! Game Over.")
-            self.game.flip_state("game_over")
+            self._end_run(DEATH_OBSTACLE)
             return
 
         if self.player.hitbox.top > SCREEN_H:
             print("Player fell into the abyss! Game Over.")
-            self.game.flip_state("game_over")
+            self._end_run(DEATH_FALL)
             return
 
         if self.is_endless:
@@ -863,10 +1186,19 @@ class PlayingState(GameState):
                 if not isinstance(sprite, Player) and sprite.world_pos.x < self.world_x_offset - 200:
                     sprite.kill()
         else:
-            if self.world_x_offset >= self.level_length - PLAYER_W:
+            # Hoàn thành khi player (không phải camera) tới cuối level
+            if self.world_x_offset + self.player.hitbox.x >= self.level_length - PLAYER_W:
+                self.run["death_cause"] = RUN_COMPLETED
+                self.run["ended_at"] = time.time()
                 self.game.game_status = 'COMPLETED'
                 self.game.running = False
                 return
+
+
+    def _end_run(self, cause):
+        self.run["death_cause"] = cause
+        self.run["ended_at"] = time.time()
+        self.game.flip_state("game_over")
                     
     def draw(self, screen):
         screen.fill((30, 30, 40))
@@ -1019,21 +1351,27 @@ class GameOverState(GameState):
         screen.blit(self.instr_text, self.instr_rect)
 
 class Game:
-    def __init__(self, screen, level_file):
+    def __init__(self, screen, level_file, level_data=None, start_x=0):
         initialize_pygame_and_assets()
         self.screen = screen
         pygame.display.set_caption(f"Parkour Game - {level_file}")
         self.clock = pygame.time.Clock()
         self.running = True
         self.game_status = 'QUIT'
+        # Mọi lượt chơi (kể cả chơi lại sau game over), lưu bởi LevelManager.record_run
+        self.runs = []
         self.states = {
-            "playing": PlayingState(self, level_file), 
+            "playing": PlayingState(self, level_file, level_data=level_data, start_x=start_x), 
             "game_over": GameOverState(self)
         }
         self.current_state_name = "playing"
         self.current_state = self.states[self.current_state_name]
         self.current_state.enter_state()
 
+    @property
+    def run_stats(self):
+        return summarize_runs(self.runs)
+
     def flip_state(self, new_state_name):
         self.current_state.exit_state()
         self.current_state_name = new_state_name
@@ -0,0 +1,149 @@
+# observations.py - 7 NEAT INPUTS FOR HEADLESS AGENTS
+from bisect import bisect_right
+
+from config import *
+
+# Số lượng inputs khớp với num_inputs trong config-neat.txt
+NUM_INPUTS = 7
+
+# Khoảng cách tối đa agent "nhìn thấy" phía trước (dùng để chuẩn hoá)
+SIGHT_DISTANCE = SCREEN_W
+
+def ray_count(num_inputs):
+    """Số tia RaySensor ứng với num_inputs của config NEAT: 7 inputs cơ bản + 2 giá trị mỗi tia."""
+    extra = num_inputs - NUM_INPUTS
+    if extra < 0 or extra % 2:
+        raise ValueError(f"num_inputs must be {NUM_INPUTS} + 2 * rays, got {num_inputs}")
+    return extra // 2
+
+# -------------------------
+# Static Level Index
+# -------------------------
+class ObservationIndex:
+    """
+    Danh sách obstacle và branch của level, sắp xếp theo x.
+    Index là dữ liệu tĩnh, dùng chung cho mọi agent trên cùng một level;
+    mỗi agent chỉ giữ cursor riêng trong ObservationBuilder.
+    """
+    def __init__(self, segments=()):
+        # Obstacle: (left, right, kind_value) — tách thành các list song song để duyệt nhanh
+        self.obstacle_left = []
+        self.obstacle_right = []
+        self.obstacle_kind = []
+        # Branch: (branch_x, has_upper, upper_offset_y)
+        self.branch_x = []
+        self.branch_has_upper = []
+        self.branch_upper_offset = []
+        for seg in segments:
+            self.add_segment(seg)
+
+    def add_segment(self, seg):
+        """
+        Thêm obstacles/branch của một segment đã generate.
+        Segments phải được thêm theo thứ tự x tăng dần (giống thứ tự load_level
+        và _spawn_next_segment), nhờ vậy chỉ cần sort obstacles trong segment.
+        """
+        obstacles = sorted(seg.get("obstacles", []), key=lambda ob: ob.x)
+        for ob in obstacles:
+            # Obstacles phía sau cuối index (hiếm, ví dụ branch chồng lên nhau) được chèn đúng vị trí
+            pos = bisect_right(self.obstacle_left, ob.x)
+            self.obstacle_left.insert(pos, ob.x)
+            self.obstacle_right.insert(pos, ob.x + ob.w)
+            self.obstacle_kind.insert(pos, 1.0 if ob.kind == "real" else 0.0)
+
+        # Điểm rẽ của branch (kể cả branch lồng trong section_sequence), xem TerrainGenerator.branch
+        for choice in seg.get("choice_points", []):
+            upper_offsets = [o for o in choice["paths"] if o < 0]
+            pos = bisect_right(self.branch_x, choice["x"])
+            self.branch_x.insert(pos, choice["x"])
+            self.branch_has_upper.insert(pos, 1.0 if upper_offsets else 0.0)
+            self.branch_upper_offset.insert(pos, min(upper_offsets) if upper_offsets else 0)
+
+# -------------------------
+# Per-agent Observation Builder
+# -------------------------
+class ObservationBuilder:
+    """
+    Tính 7 inputs cho một agent:
+    1. Player Y position          5. Distance to branch
+    2. Vertical velocity          6. Branch has upper path
+    3. Distance to next obstacle  7. Upper path offset Y
+    4. Next obstacle type
+
+    Cursor chỉ tiến về phía trước nên mỗi lần observe là O(1) amortised
+    (player không bao giờ quay lại obstacle đã vượt qua).
+    sensor: RaySensor (tuỳ chọn); khi có, mỗi observation thêm 2 giá trị cho mỗi tia
+    (khoảng cách, loại vật thể) bắn từ tâm hitbox, nhờ đó agent thấy được gap và tường.
+    """
+    def __init__(self, index, sensor=None):
+        self.index = index
+        self.sensor = sensor
+        self.obstacle_cursor = 0
+        self.branch_cursor = 0
+
+    @property
+    def size(self):
+        return NUM_INPUTS + (self.sensor.size if self.sensor is not None else 0)
+
+    def reset(self):
+        self.obstacle_cursor = 0
+        self.branch_cursor = 0
+
+    def observe(self, player_x, player_y, vy, player_w=PLAYER_W, player_h=PLAYER_H):
+        """
+        player_x: world x cạnh trái hitbox, player_y: đáy hitbox (world y).
+        Trả về list self.size float đã chuẩn hoá (xấp xỉ trong [-1, 1]).
+        """
+        index = self.index
+        player_right = player_x + player_w
+
+        # Bỏ qua các obstacle đã hoàn toàn ở phía sau player
+        cursor = self.obstacle_cursor
+        obstacle_right = index.obstacle_right
+        count = len(obstacle_right)
+        while cursor < count and obstacle_right[cursor] < player_x:
+            cursor += 1
+        self.obstacle_cursor = cursor
+
+        if cursor < count:
+            gap = max(0.0, index.obstacle_left[cursor] - player_right)
+            obstacle_dist = min(1.0, gap / SIGHT_DISTANCE)
+            obstacle_kind = index.obstacle_kind[cursor]
+        else:
+            obstacle_dist = 1.0
+            obstacle_kind = 0.0
+
+        # Branch đã qua khi điểm rẽ nằm phía sau player
+        cursor = self.branch_cursor
+        branch_x = index.branch_x
+        count = len(branch_x)
+        while cursor < count and branch_x[cursor] < player_x:
+            cursor += 1
+        self.branch_cursor = cursor
+
+        if cursor < count:
+            branch_dist = min(1.0, max(0.0, branch_x[cursor] - player_right) / SIGHT_DISTANCE)
+            has_upper = index.branch_has_upper[cursor]
+            upper_offset = index.branch_upper_offset[cursor] / SCREEN_H
+        else:
+            branch_dist = 1.0
+            has_upper = 0.0
+            upper_offset = 0.0
+
+        observation = [
+            player_y / SCREEN_H,
+            vy / abs(JUMP_V),
+            obstacle_dist,
+            obstacle_kind,
+            branch_dist,
+            has_upper,
+            upper_offset,
+        ]
+        if self.sensor is not None:
+            observation.extend(self.sensor.cast(player_x + player_w / 2, player_y - player_h / 2).tolist())
+        return observation
+
+    def observe_player(self, player, world_x_offset):
+        """Observation cho một Player đang chơi (hitbox ở toạ độ màn hình)."""
+        hitbox = player.hitbox
+        return self.observe(world_x_offset + hitbox.x, hitbox.bottom, player.vy, hitbox.width, hitbox.height)
@@ -0,0 +1,162 @@
+# progress_store.py - ATOMIC BACKGROUND PERSISTENCE FOR PROGRESS, HIGH SCORES AND RUN STATS
+import json
+import os
+import threading
+
+DEFAULT_PROGRESS_FILE = "progress.json"
+# Gom các thay đổi liên tiếp (hoàn thành level + high score + stats) thành một lần ghi
+WRITE_COALESCE_SECONDS = 0.25
+
+def _empty_progress():
+    return {"completed": [], "high_scores": {}, "stats": {}}
+
+def _empty_stats():
+    return {"attempts": 0, "deaths": 0, "completions": 0, "play_time": 0.0}
+
+class ProgressStore:
+    """
+    Tiến độ người chơi trong progress.json:
+    {"completed": [...], "high_scores": {level: distance}, "stats": {level: {...}}}.
+    - File chỉ được đọc ở lần truy cập đầu tiên (lazy), file cũ dạng list phẳng vẫn đọc được.
+    - Mọi thay đổi chỉ sửa dữ liệu trong bộ nhớ rồi báo cho một writer thread chạy nền;
+      writer đợi WRITE_COALESCE_SECONDS để gom các thay đổi liên tiếp thành một lần ghi.
+    - Mỗi lần ghi: file .tmp, fsync rồi os.replace, nên crash giữa chừng không làm hỏng file cũ.
+    Gọi close() (hoặc flush()) trước khi thoát để chắc chắn thay đổi cuối đã xuống đĩa.
+    """
+    def __init__(self, path=DEFAULT_PROGRESS_FILE, coalesce_seconds=WRITE_COALESCE_SECONDS):
+        self.path = path
+        self.coalesce_seconds = coalesce_seconds
+        self._data = None
+        self._completed = None
+        self._cond = threading.Condition()
+        self._version = 0
+        self._written = 0
+        self._urgent = False
+        self._closing = False
+        self._thread = None
+
+    # ----- Đọc (lazy) -----
+    def _load(self):
+        if self._data is not None:
+            return self._data
+        data = _empty_progress()
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    stored = json.load(f)
+                if isinstance(stored, list):
+                    # Format cũ: chỉ là list các level đã hoàn thành
+                    data["completed"] = stored
+                elif isinstance(stored, dict):
+                    for key in data:
+                        if isinstance(stored.get(key), type(data[key])):
+                            data[key] = stored[key]
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"⚠️ Could not read progress '{self.path}': {e}")
+        self._data = data
+        self._completed = set(data["completed"])
+        return data
+
+    @property
+    def completed(self):
+        self._load()
+        return self._completed
+
+    def is_completed(self, filename):
+        return filename in self.completed
+
+    def high_score(self, filename):
+        return self._load()["high_scores"].get(filename)
+
+    def stats(self, filename):
+        return dict(_empty_stats(), **self._load()["stats"].get(filename, {}))
+
+    # ----- Sửa (chỉ trong bộ nhớ, ghi ở nền) -----
+    def complete_level(self, filename):
+        """Đánh dấu level đã hoàn thành. Trả về True nếu trước đó chưa hoàn thành."""
+        data = self._load()
+        if filename in self._completed:
+            return False
+        with self._cond:
+            self._completed.add(filename)
+            data["completed"].append(filename)
+            self._mark_dirty()
+        return True
+
+    def record_run(self, filename, distance, attempts=1, deaths=0, play_time=0.0, completed=False):
+        """Cộng dồn stats của một lượt chơi và cập nhật high score (quãng đường xa nhất, px).
+        Trả về True nếu là high score mới."""
+        data = self._load()
+        distance = int(distance)
+        with self._cond:
+            stats = data["stats"].setdefault(filename, _empty_stats())
+            stats["attempts"] = stats.get("attempts", 0) + attempts
+            stats["deaths"] = stats.get("deaths", 0) + deaths
+            stats["completions"] = stats.get("completions", 0) + int(completed)
+            stats["play_time"] = round(stats.get("play_time", 0.0) + play_time, 2)
+            new_record = distance > data["high_scores"].get(filename, 0)
+            if new_record:
+                data["high_scores"][filename] = distance
+            self._mark_dirty()
+        return new_record
+
+    def _mark_dirty(self):
+        # Gọi khi đang giữ self._cond
+        self._version += 1
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._writer, name="progress-writer", daemon=True)
+            self._thread.start()
+        self._cond.notify_all()
+
+    # ----- Writer thread -----
+    def _writer(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._version != self._written or self._closing)
+                if self._version == self._written:
+                    return
+                # Gom các thay đổi tới trong lúc chờ (bỏ qua khi flush/close)
+                self._cond.wait_for(lambda: self._urgent or self._closing, timeout=self.coalesce_seconds)
+                version = self._version
+                payload = json.dumps(self._data, indent=2)
+            try:
+                self._write_atomic(payload)
+            except OSError as e:
+                print(f"⚠️ Could not save progress '{self.path}': {e}")
+            with self._cond:
+                self._written = version
+                if self._written == self._version:
+                    self._urgent = False
+                self._cond.notify_all()
+
+    def _write_atomic(self, payload):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def flush(self, timeout=None):
+        """Chờ mọi thay đổi hiện có được ghi xong. Trả về False nếu hết timeout."""
+        with self._cond:
+            # Giữ thread trong biến local: close() đồng thời có thể đặt self._thread = None
+            thread = self._thread
+            if thread is None:
+                return True
+            self._urgent = True
+            self._cond.notify_all()
+            target = self._version
+            return self._cond.wait_for(lambda: self._written >= target or not thread.is_alive(),
+                                       timeout=timeout)
+
+    def close(self, timeout=None):
+        with self._cond:
+            thread = self._thread
+            self._closing = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+        with self._cond:
+            self._thread = None
+            self._closing = False
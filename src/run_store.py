@@ -0,0 +1,149 @@
+# run_store.py - SQLITE STORE OF EVERY RUN, LEADERBOARD AND PLAYER HISTORY QUERIES
+import argparse
+import os
+import random
+import sqlite3
+import time
+
+DEFAULT_RUNS_DB = "runs.db"
+DEFAULT_PLAYER = "player"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id          INTEGER PRIMARY KEY,
+    level       TEXT NOT NULL,
+    player      TEXT NOT NULL,
+    seed        INTEGER,
+    distance    REAL NOT NULL,
+    duration    REAL NOT NULL,
+    death_cause TEXT,
+    max_speed   REAL,
+    completed   INTEGER NOT NULL DEFAULT 0,
+    created_at  REAL NOT NULL
+);
+-- Top-N của một level: đọc thẳng theo index, không sort
+CREATE INDEX IF NOT EXISTS runs_level_rank ON runs (level, distance DESC, duration ASC);
+-- Lịch sử của một player, mới nhất trước (id phân định các lượt cùng created_at)
+DROP INDEX IF EXISTS runs_player_history;
+CREATE INDEX IF NOT EXISTS runs_player_recent ON runs (player, created_at DESC, id DESC);
+"""
+
+_COLUMNS = ("id", "level", "player", "seed", "distance", "duration", "death_cause", "max_speed",
+            "completed", "created_at")
+_SELECT = "SELECT " + ", ".join(_COLUMNS) + " FROM runs"
+
+class RunStore:
+    """
+    Mỗi lượt chơi (Game.runs) là một dòng trong bảng runs của SQLite:
+    level, player, seed (level endless), distance (px), duration (s), death_cause, max_speed.
+    Journal WAL + synchronous=NORMAL: ghi một lượt chỉ là một append ngắn, không fsync mỗi commit.
+    Các query chỉ đi theo index (level, distance) / (player, created_at, id) nên vẫn nhanh khi
+    bảng có hàng trăm nghìn dòng.
+    """
+    def __init__(self, path=DEFAULT_RUNS_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def add_runs(self, level, player, runs, created_at=None):
+        """
+        Ghi các lượt chơi (dict như trong Game.runs) trong một transaction. created_at của mỗi lượt
+        là lúc lượt đó kết thúc (run["ended_at"]); lượt bỏ dở (không có ended_at) dùng created_at
+        (mặc định: bây giờ).
+        """
+        created_at = time.time() if created_at is None else created_at
+        rows = [(level, player, run.get("seed"), float(run["distance"]), float(run["duration"]),
+                 run.get("death_cause"), run.get("max_speed"), int(run.get("death_cause") == "completed"),
+                 run.get("ended_at") or created_at)
+                for run in runs]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO runs (level, player, seed, distance, duration, death_cause, max_speed, "
+                "completed, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def top_runs(self, level, limit=10):
+        """N lượt xa nhất của level (hoà thì lượt nhanh hơn đứng trước)."""
+        return [dict(row) for row in self.conn.execute(
+            _SELECT + " WHERE level = ? ORDER BY distance DESC, duration ASC LIMIT ?", (level, limit))]
+
+    def player_history(self, player, limit=20, level=None):
+        """Các lượt gần nhất của player (lọc theo level nếu có)."""
+        if level is None:
+            query, params = _SELECT + " WHERE player = ? ORDER BY created_at DESC, id DESC LIMIT ?", (player, limit)
+        else:
+            query = _SELECT + " WHERE player = ? AND level = ? ORDER BY created_at DESC, id DESC LIMIT ?"
+            params = (player, level, limit)
+        return [dict(row) for row in self.conn.execute(query, params)]
+
+    def player_best(self, level, player):
+        row = self.conn.execute(
+            _SELECT + " WHERE level = ? AND player = ? ORDER BY distance DESC, duration ASC LIMIT 1",
+            (level, player)).fetchone()
+        return dict(row) if row is not None else None
+
+    def count(self, level=None):
+        if level is None:
+            return self.conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        return self.conn.execute("SELECT COUNT(*) FROM runs WHERE level = ?", (level,)).fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+def _benchmark(store, rows, levels=20, players=200, seed=0):
+    rng = random.Random(seed)
+    level_names = [f"bench_level{i}.json" for i in range(levels)]
+    player_names = [f"bench_player{i}" for i in range(players)]
+    start = time.perf_counter()
+    now = time.time()
+    for batch in range(0, rows, 1000):
+        for i in range(batch, min(rows, batch + 1000)):
+            store.add_runs(rng.choice(level_names), rng.choice(player_names), [{
+                "seed": rng.randrange(2 ** 31), "distance": rng.uniform(0, 20000), "duration": rng.uniform(1, 300),
+                "death_cause": rng.choice(("obstacle", "fall", "wall_time", "completed", None)),
+                "max_speed": rng.uniform(5, 12)}], created_at=now + i)
+    insert_time = time.perf_counter() - start
+    print(f"Inserted {rows:,} runs in {insert_time:.2f}s ({insert_time / max(rows, 1) * 1e6:.0f} µs/run)")
+
+    queries = [
+        ("top 10 of a level", lambda: store.top_runs(rng.choice(level_names), 10)),
+        ("history of a player", lambda: store.player_history(rng.choice(player_names), 20)),
+        ("player best on a level", lambda: store.player_best(rng.choice(level_names), rng.choice(player_names))),
+    ]
+    for name, query in queries:
+        start = time.perf_counter()
+        for _ in range(200):
+            query()
+        print(f"  {name}: {(time.perf_counter() - start) / 200 * 1000:.3f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the run store (leaderboard / player history)")
+    parser.add_argument("--db", default=DEFAULT_RUNS_DB)
+    parser.add_argument("--level", help="show the top runs of this level")
+    parser.add_argument("--player", help="show the recent runs of this player")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--bench", type=int, metavar="ROWS",
+                        help="insert ROWS random runs into a fresh database at --db and time the queries")
+    args = parser.parse_args()
+
+    if args.bench:
+        if os.path.exists(args.db):
+            parser.error(f"--bench needs a new database file, '{args.db}' already exists")
+        _benchmark(RunStore(args.db), args.bench)
+    else:
+        store = RunStore(args.db)
+        print(f"{store.count():,} runs in {args.db}")
+        if args.level:
+            print(f"\nTop {args.limit} - {args.level}:")
+            for rank, run in enumerate(store.top_runs(args.level, args.limit), 1):
+                print(f"  {rank:>2}. {run['player']:<16} {run['distance']:>8.0f}px {run['duration']:>7.1f}s "
+                      f"{run['death_cause'] or 'quit'}")
+        if args.player:
+            print(f"\nRecent runs - {args.player}:")
+            for run in store.player_history(args.player, args.limit, level=args.level):
+                print(f"  {time.strftime('%Y-%m-%d %H:%M', time.localtime(run['created_at']))} {run['level']:<24} "
+                      f"{run['distance']:>8.0f}px {run['death_cause'] or 'quit'}")
@@ -0,0 +1,97 @@
+# sensors.py - RAY-CAST (LIDAR) SENSORS FOR AI AGENTS
+import numpy as np
+
+from config import *
+from level_geometry import GEOM_NONE, NUM_GEOM_TYPES
+
+# Góc tia (độ): 0 = thẳng phía trước, dương = chéo xuống, âm = chéo lên.
+# Các tia chéo xuống phát hiện gap / stairs_down, tia chéo lên thấy stairs_up và tường wall_jump.
+DEFAULT_RAY_ANGLES = (-60, -30, 0, 30, 60, 90)
+RAY_MAX_DISTANCE = int(400 * SCALE_UNIFORM)
+
+def ray_angles(count):
+    """count tia chia đều từ -60° (chéo lên) tới 90° (thẳng xuống); 6 tia là DEFAULT_RAY_ANGLES."""
+    if count == 1:
+        return (0.0,)
+    return tuple(float(angle) for angle in np.linspace(-60, 90, count))
+
+class RaySensor:
+    """
+    Bắn N tia từ tâm hitbox của player vào LevelGeometry.
+    Mỗi tia trả về 2 giá trị: khoảng cách chuẩn hoá (1.0 = không chạm)
+    và loại vật thể chạm phải (GEOM_* / NUM_GEOM_TYPES, 0 = không chạm).
+    """
+    def __init__(self, geometry, angles=DEFAULT_RAY_ANGLES, max_distance=RAY_MAX_DISTANCE):
+        self.geometry = geometry
+        self.angles = tuple(angles)
+        self.max_distance = float(max_distance)
+        radians = np.radians(np.array(self.angles, dtype=np.float32))
+        dx = np.cos(radians)
+        dy = np.sin(radians)
+        # Tránh chia cho 0 trong slab test; tia song song trục vẫn cho kết quả đúng
+        dx[np.abs(dx) < 1e-6] = 1e-6
+        dy[np.abs(dy) < 1e-6] = 1e-6
+        self.inv_dx = (1.0 / dx).astype(np.float32)
+        self.inv_dy = (1.0 / dy).astype(np.float32)
+
+    @property
+    def size(self):
+        """Số float trả về cho mỗi agent"""
+        return 2 * len(self.angles)
+
+    def cast(self, origin_x, origin_y):
+        """Bắn tia cho một agent, trả về mảng phẳng (2 * N,)."""
+        return self.cast_batch(np.array([[origin_x, origin_y]], dtype=np.float32))[0]
+
+    def cast_batch(self, origins):
+        """
+        origins: (A, 2) toạ độ world của A agents.
+        Trả về float32 (A, 2 * N): [dist_0, type_0, dist_1, type_1, ...].
+        """
+        origins = np.asarray(origins, dtype=np.float32).reshape(-1, 2)
+        num_agents = len(origins)
+        num_rays = len(self.angles)
+        out = np.zeros((num_agents, num_rays, 2), dtype=np.float32)
+        out[:, :, 0] = 1.0
+        if num_agents == 0:
+            return out.reshape(num_agents, -1)
+
+        # Chỉ xét các rect trong tầm với của agent xa nhất về hai phía
+        start, stop = self.geometry.window(origins[:, 0].min() - self.max_distance,
+                                           origins[:, 0].max() + self.max_distance)
+        if start >= stop:
+            return out.reshape(num_agents, -1)
+        rects = self.geometry.rects[start:stop]
+        kinds = self.geometry.kinds[start:stop]
+
+        # Slab test vector hoá trên (agent, ray, rect)
+        ox = origins[:, 0, None, None]
+        oy = origins[:, 1, None, None]
+        inv_dx = self.inv_dx[None, :, None]
+        inv_dy = self.inv_dy[None, :, None]
+        x0 = rects[None, None, :, 0]
+        y0 = rects[None, None, :, 1]
+        x1 = x0 + rects[None, None, :, 2]
+        y1 = y0 + rects[None, None, :, 3]
+
+        tx0 = (x0 - ox) * inv_dx
+        tx1 = (x1 - ox) * inv_dx
+        ty0 = (y0 - oy) * inv_dy
+        ty1 = (y1 - oy) * inv_dy
+        t_near = np.maximum(np.minimum(tx0, tx1), np.minimum(ty0, ty1))
+        t_far = np.minimum(np.maximum(tx0, tx1), np.maximum(ty0, ty1))
+        t_hit = np.maximum(t_near, 0.0)
+        hit = (t_far >= t_hit) & (t_hit <= self.max_distance)
+        t_hit = np.where(hit, t_hit, np.inf)
+
+        nearest = np.argmin(t_hit, axis=2)
+        nearest_t = np.take_along_axis(t_hit, nearest[:, :, None], axis=2)[:, :, 0]
+        any_hit = np.isfinite(nearest_t)
+        out[:, :, 0] = np.where(any_hit, nearest_t / self.max_distance, 1.0)
+        out[:, :, 1] = np.where(any_hit, kinds[nearest] / NUM_GEOM_TYPES, GEOM_NONE)
+        return out.reshape(num_agents, -1)
+
+    def sense_player(self, player, world_x_offset):
+        """Tia từ tâm hitbox của một Player đang chơi (hitbox ở toạ độ màn hình)."""
+        hitbox = player.hitbox
+        return self.cast(world_x_offset + hitbox.centerx, hitbox.centery)
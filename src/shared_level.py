@@ -0,0 +1,141 @@
+# shared_level.py - COMPILED LEVELS IN SHARED MEMORY FOR TRAINING WORKERS
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from level_geometry import LevelGeometry
+from observations import ObservationIndex
+from simulation import collision_row
+
+# Thứ tự cột của từng mảng (xem compile_level)
+PLATFORM_COLUMNS = ("x", "y", "length")
+WALL_TILE_COLUMNS = ("x", "y", "width", "tile_height")
+OBSTACLE_COLUMNS = ("x", "y", "w", "h")
+
+# Căn lề mỗi mảng trong block shared memory
+ARRAY_ALIGNMENT = 64
+
+def _sorted_rows(rows, width):
+    array = np.array(rows, dtype=np.float64).reshape(-1, width)
+    return array[np.argsort(array[:, 0], kind="stable")]
+
+def compile_level(level_data):
+    """
+    Chuyển world của một level thường (kết quả load_level) thành các mảng phẳng,
+    mỗi loại sắp xếp theo x:
+    - platforms (P, 3), wall_tiles (W, 4), real_obstacles (R, 4): dùng cho physics
+    - obstacle_* / branch_*: ObservationIndex
+    - geometry_rects / geometry_kinds: LevelGeometry (sensors)
+    Toạ độ giữ float64 để physics cho kết quả giống hệt các object gốc.
+    """
+    if level_data["is_endless"]:
+        raise ValueError("Endless levels are generated at runtime and cannot be compiled")
+    world = level_data["world"]
+    platforms = []
+    wall_tiles = []
+    real_obstacles = []
+    for seg in world:
+        for p in seg.get("platforms", [seg.get("platform")]):
+            if p is not None:
+                platforms.append((p.x, p.y, p.length))
+        for tile in seg.get("wall_tiles", []):
+            wall_tiles.append((tile.x, tile.y, tile.width, tile.tile_height))
+        for ob in seg.get("obstacles", []):
+            if ob.kind == "real":
+                # Hitbox va chạm như trong game (Obstacle.hitbox), không phải khối 30x50
+                real_obstacles.append(collision_row(ob))
+
+    index = ObservationIndex(world)
+    geometry = LevelGeometry.from_segments(world)
+    return {
+        "platforms": _sorted_rows(platforms, len(PLATFORM_COLUMNS)),
+        "wall_tiles": _sorted_rows(wall_tiles, len(WALL_TILE_COLUMNS)),
+        "real_obstacles": _sorted_rows(real_obstacles, len(OBSTACLE_COLUMNS)),
+        "obstacle_left": np.array(index.obstacle_left, dtype=np.float64),
+        "obstacle_right": np.array(index.obstacle_right, dtype=np.float64),
+        "obstacle_kind": np.array(index.obstacle_kind, dtype=np.float64),
+        "branch_x": np.array(index.branch_x, dtype=np.float64),
+        "branch_has_upper": np.array(index.branch_has_upper, dtype=np.float64),
+        "branch_upper_offset": np.array(index.branch_upper_offset, dtype=np.float64),
+        "geometry_rects": geometry.rects,
+        "geometry_kinds": geometry.kinds,
+    }
+
+class SharedLevelHandle:
+    """Thông tin (picklable) để worker map một block đã publish: tên block + layout các mảng."""
+    def __init__(self, name, layout, length):
+        self.name = name
+        # list (array name, dtype str, shape, offset)
+        self.layout = layout
+        self.length = length
+
+class SharedLevel:
+    """
+    Các mảng của compile_level() trong một block multiprocessing.shared_memory.
+    Process chính publish() một lần cho mỗi level; worker attach() để có view
+    read-only trên cùng vùng nhớ, không load level, không tạo object Python.
+    Process chính phải unlink() khi train xong.
+    """
+    def __init__(self, shm, handle, owner):
+        self.shm = shm
+        self.handle = handle
+        self.owner = owner
+        self.arrays = {}
+        for name, dtype, shape, offset in handle.layout:
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            array.flags.writeable = False
+            self.arrays[name] = array
+
+    @classmethod
+    def publish(cls, level_data):
+        arrays = compile_level(level_data)
+        layout = []
+        size = 0
+        for name, array in arrays.items():
+            size = -(-size // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+            layout.append((name, array.dtype.str, array.shape, size))
+            size += array.nbytes
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for (name, dtype, shape, offset) in layout:
+            array = arrays[name]
+            np.ndarray(shape, dtype=array.dtype, buffer=shm.buf, offset=offset)[...] = array
+        return cls(shm, SharedLevelHandle(shm.name, layout, level_data["length"]), owner=True)
+
+    @classmethod
+    def attach(cls, handle):
+        # Worker dùng chung resource tracker với process chính, nên việc attach
+        # không làm block bị unlink khi worker thoát
+        shm = shared_memory.SharedMemory(name=handle.name)
+        return cls(shm, handle, owner=False)
+
+    @property
+    def level_data(self):
+        """Thay cho kết quả load_level khi tạo Simulation từ mảng dùng chung."""
+        return {"is_endless": False, "length": self.handle.length}
+
+    @property
+    def nbytes(self):
+        return self.shm.size
+
+    def observation_index(self):
+        index = ObservationIndex()
+        arrays = self.arrays
+        index.obstacle_left = arrays["obstacle_left"]
+        index.obstacle_right = arrays["obstacle_right"]
+        index.obstacle_kind = arrays["obstacle_kind"]
+        index.branch_x = arrays["branch_x"]
+        index.branch_has_upper = arrays["branch_has_upper"]
+        index.branch_upper_offset = arrays["branch_upper_offset"]
+        return index
+
+    def geometry(self):
+        return LevelGeometry.from_sorted(self.arrays["geometry_rects"], self.arrays["geometry_kinds"])
+
+    def close(self):
+        self.arrays = {}
+        self.shm.close()
+
+    def unlink(self):
+        self.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,349 @@
+# simulation.py - HEADLESS GAME SIMULATION FOR AI TRAINING
+import math
+import random
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+import numpy as np
+import pygame
+
+from config import *
+from main import Player, WallState, TerrainGenerator, EndlessManager, Platform, WallTile, Obstacle
+from observations import ObservationIndex, ObservationBuilder
+from level_geometry import LevelGeometry
+from sensors import RaySensor, ray_angles
+
+# Mỗi bước mô phỏng là một frame cố định ở FPS của game
+SIM_DELTA_TIME = 1.0 / FPS
+
+# AI Actions (xem README)
+ACTION_NOOP = 0
+ACTION_JUMP = 1
+ACTION_UPPER = 2
+ACTION_LOWER = 3
+
+# Kết quả của một bước mô phỏng
+STATUS_RUNNING = None
+STATUS_DEAD = "DEAD"
+STATUS_WALL_TIME = "WALL_TIME_EXCEEDED"
+STATUS_COMPLETED = "COMPLETED"
+
+# Lề culling giống PlayingState.update
+CULL_MARGIN = 200
+
+# -------------------------
+# Headless Player
+# -------------------------
+class HeadlessPlayer(Player):
+    """Player chỉ có physics: không load spritesheet, không animation, không cần display."""
+    verbose = False
+
+    def __init__(self, x, y):
+        pygame.sprite.Sprite.__init__(self)
+        self.vx = 0
+        self.vy = 0
+        self.on_ground = True
+        self.wall_state = WallState()
+        self.hitbox = pygame.Rect(x, 0, PLAYER_W, PLAYER_H)
+        self.hitbox.bottom = y
+
+    def update(self, platforms, world_x_offset, delta_time, wall_tiles=None, current_run_speed=RUN_SPEED):
+        return self.update_physics(platforms, world_x_offset, delta_time, wall_tiles)
+
+# -------------------------
+# Spatial lists (sorted by x)
+# -------------------------
+class _SortedItems:
+    """Danh sách object sắp xếp theo x, cắt cửa sổ theo khoảng x bằng bisect."""
+    def __init__(self, width_of):
+        self.width_of = width_of
+        self.xs = []
+        self.items = []
+        self.max_width = 0
+
+    def add(self, item):
+        pos = bisect_right(self.xs, item.x)
+        self.xs.insert(pos, item.x)
+        self.items.insert(pos, item)
+        self.max_width = max(self.max_width, self.width_of(item))
+
+    def window(self, x_min, x_max):
+        start = bisect_left(self.xs, x_min - self.max_width)
+        stop = bisect_right(self.xs, x_max)
+        return [item for item in self.items[start:stop] if item.x + self.width_of(item) >= x_min]
+
+    def first(self):
+        return self.items[0] if self.items else None
+
+# Object từ một row của compile_level (kích thước đã scale, không scale lại)
+def _platform_from_row(row):
+    return Platform(*row)
+
+def _wall_tile_from_row(row):
+    tile = WallTile.__new__(WallTile)
+    tile.x, tile.y, tile.width, tile.tile_height = row
+    return tile
+
+def _obstacle_from_row(row):
+    ob = Obstacle.__new__(Obstacle)
+    ob.x, ob.y, ob.w, ob.h = row
+    ob.kind = "real"
+    return ob
+
+def collision_row(ob):
+    """
+    Row (x, y, w, h) của hitbox va chạm của ob trong game (Obstacle.hitbox): x là mép trái
+    chưa làm tròn (tâm - w // 2), y là đáy đã làm tròn như pygame.Rect.
+    """
+    center_x, bottom_y, width, height = ob.hitbox_geometry()
+    return (center_x - width // 2, _pygame_round(bottom_y), width, height)
+
+def _pygame_round(value):
+    # pygame.Rect làm tròn toạ độ float ra xa số 0
+    return math.floor(value + 0.5) if value >= 0 else -math.floor(-value + 0.5)
+
+class _ArrayItems:
+    """
+    Như _SortedItems nhưng đọc từ mảng (N, C) đã sắp xếp theo x, ví dụ view
+    read-only trên shared memory (cột 0 = x, cột 2 = chiều rộng). Chỉ các row
+    trong cửa sổ quanh camera được tạo thành object; camera chỉ tiến về phía
+    trước nên mỗi row được tạo một lần cho mỗi lượt chạy.
+    """
+    def __init__(self, rows, make_item, width_of):
+        self.rows = rows
+        self.xs = rows[:, 0]
+        self.make_item = make_item
+        self.width_of = width_of
+        self.max_width = float(rows[:, 2].max()) if len(rows) else 0.0
+        self.start = 0
+        self.stop = 0
+        self.items = deque()
+
+    def window(self, x_min, x_max):
+        start = int(np.searchsorted(self.xs, x_min - self.max_width, side="left"))
+        stop = max(start, int(np.searchsorted(self.xs, x_max, side="right")))
+        if start < self.start or start > self.stop:
+            # Cửa sổ lùi lại (sau reset) hoặc nhảy qua cửa sổ cũ: dựng lại
+            self.items.clear()
+            self.start = self.stop = start
+        while self.start < start:
+            self.items.popleft()
+            self.start += 1
+        if stop > self.stop:
+            self.items.extend(self.make_item(row) for row in self.rows[self.stop:stop].tolist())
+            self.stop = stop
+        return [item for item in self.items if item.x + self.width_of(item) >= x_min and item.x <= x_max]
+
+    def first(self):
+        return self.make_item(self.rows[0].tolist()) if len(self.rows) else None
+
+# -------------------------
+# Simulation
+# -------------------------
+class Simulation:
+    """
+    Bản sao không render của PlayingState.update cho một agent.
+    Va chạm với obstacle thật dùng Obstacle.hitbox: cùng sprite (chọn theo vị trí) và cùng rect
+    ảnh mà collide_player_hitbox dùng trong game, lấy lớn nhất qua các frame animation.
+    level_data là kết quả của load_level() và có thể dùng chung giữa nhiều Simulation;
+    với level endless, seed quyết định chuỗi pattern được spawn.
+    shared_level: SharedLevel của một level thường; khi có, world được đọc từ
+    các mảng dùng chung thay vì từ object (level_data = shared_level.level_data).
+    rays: số tia RaySensor thêm vào observation (0 = chỉ 7 inputs cơ bản).
+    """
+    def __init__(self, level_data, seed=None, shared_level=None, rays=0):
+        self.level_data = level_data
+        self.is_endless = level_data["is_endless"]
+        self.seed = seed
+        self.rays = rays
+        self.level_length = -1 if self.is_endless else level_data["length"]
+        self.player = HeadlessPlayer(PLAYER_TARGET_X, GROUND_Y)
+        self.sensor = None
+        if shared_level is not None:
+            self._attach_shared_index(shared_level)
+        elif not self.is_endless:
+            self._build_static_index(level_data["world"])
+        if rays:
+            # Level endless: geometry được dựng lại mỗi khi spawn segment (xem _spawn_next_segment)
+            if shared_level is not None:
+                geometry = shared_level.geometry()
+            else:
+                geometry = LevelGeometry.from_segments([] if self.is_endless else level_data["world"])
+            self.sensor = RaySensor(geometry, ray_angles(rays))
+        self.reset()
+
+    def _new_index(self):
+        self.platforms = _SortedItems(lambda p: p.length)
+        self.wall_tiles = _SortedItems(lambda t: t.width)
+        self.real_obstacles = _SortedItems(lambda ob: ob.w)
+        self.observation_index = ObservationIndex()
+
+    def _add_segment(self, seg):
+        for p in seg.get("platforms", [seg.get("platform")]):
+            if p is not None:
+                self.platforms.add(p)
+        for tile in seg.get("wall_tiles", []):
+            self.wall_tiles.add(tile)
+        for ob in seg.get("obstacles", []):
+            if ob.kind == "real":
+                self.real_obstacles.add(_obstacle_from_row(collision_row(ob)))
+        self.observation_index.add_segment(seg)
+        if self.is_endless:
+            self.segments.append(seg)
+            if self.sensor is not None:
+                self.sensor.geometry = LevelGeometry.from_segments(self.segments)
+
+    def _build_static_index(self, world):
+        self._new_index()
+        for seg in world:
+            self._add_segment(seg)
+
+    def _attach_shared_index(self, shared_level):
+        arrays = shared_level.arrays
+        self.platforms = _ArrayItems(arrays["platforms"], _platform_from_row, lambda p: p.length)
+        self.wall_tiles = _ArrayItems(arrays["wall_tiles"], _wall_tile_from_row, lambda t: t.width)
+        self.real_obstacles = _ArrayItems(arrays["real_obstacles"], _obstacle_from_row, lambda ob: ob.w)
+        self.observation_index = shared_level.observation_index()
+
+    def reset(self):
+        self.world_x_offset = 0
+        self.current_run_speed = RUN_SPEED
+        self.ticks = 0
+        self.status = STATUS_RUNNING
+
+        if self.is_endless:
+            # Giống PlayingState.enter_state: safe zone rồi spawn đủ pattern phía trước
+            rng = random.Random(self.seed)
+            self.endless_manager = EndlessManager(self.level_data["patterns"], self.level_data["spawn_logic"], rng=rng)
+            self._new_index()
+            self.segments = []
+            self.cursor_x = 0
+            first_plat_y = self.endless_manager.patterns[0].get("platform_y", GROUND_Y)
+            safe_zone_config = {"type": "straight", "platform_y": first_plat_y,
+                                "length": SAFE_ZONE_DISTANCE, "obstacles": []}
+            self._add_segment(TerrainGenerator.straight(0, safe_zone_config))
+            while self.cursor_x < self.world_x_offset + SCREEN_W * 1.5:
+                self._spawn_next_segment()
+
+        self.observer = ObservationBuilder(self.observation_index, self.sensor)
+
+        player = self.player
+        player.hitbox.x = PLAYER_TARGET_X
+        player.vx = 0
+        player.vy = 0
+        player.on_ground = True
+        player.wall_state.reset()
+        start_platforms = self.platforms.window(player.hitbox.centerx, player.hitbox.centerx)
+        start_platforms = [p for p in start_platforms if p.x <= player.hitbox.centerx < p.x + p.length]
+        if start_platforms:
+            player.hitbox.bottom = start_platforms[0].y
+        elif self.platforms.first() is not None:
+            player.hitbox.bottom = self.platforms.first().y
+        else:
+            player.hitbox.bottom = GROUND_Y
+
+    def _spawn_next_segment(self):
+        pattern = self.endless_manager.get_next_pattern()
+        terrain_func = getattr(TerrainGenerator, pattern.get("type", "straight"), TerrainGenerator.straight)
+        segment = terrain_func(self.cursor_x, pattern)
+        self._add_segment(segment)
+        self.cursor_x += segment["length"]
+
+    @property
+    def player_world_x(self):
+        return self.world_x_offset + self.player.hitbox.x
+
+    @property
+    def done(self):
+        return self.status is not STATUS_RUNNING
+
+    @property
+    def observation_size(self):
+        return self.observer.size
+
+    def observe(self):
+        """7 NEAT inputs (+ 2 giá trị mỗi tia nếu có rays) cho trạng thái hiện tại."""
+        hitbox = self.player.hitbox
+        return self.observer.observe(self.player_world_x, hitbox.bottom, self.player.vy, hitbox.width, hitbox.height)
+
+    def snapshot(self):
+        """
+        Trạng thái động (player, camera, status) dưới dạng tuple, để quay lui khi tìm kiếm.
+        World không thuộc snapshot: level thường không đổi, level endless chỉ spawn thêm
+        segment phía trước nên quay lại một snapshot cũ vẫn thấy cùng world.
+        """
+        player = self.player
+        wall = player.wall_state
+        return (self.world_x_offset, self.current_run_speed, self.ticks, self.status,
+                player.hitbox.y, player.vx, player.vy, player.on_ground,
+                wall.is_sliding, wall.side, wall.time_elapsed, wall.can_jump,
+                wall.jump_cooldown, wall.re_attach_cooldown,
+                self.observer.obstacle_cursor, self.observer.branch_cursor)
+
+    def restore(self, state):
+        player = self.player
+        wall = player.wall_state
+        (self.world_x_offset, self.current_run_speed, self.ticks, self.status,
+         player.hitbox.y, player.vx, player.vy, player.on_ground,
+         wall.is_sliding, wall.side, wall.time_elapsed, wall.can_jump,
+         wall.jump_cooldown, wall.re_attach_cooldown,
+         self.observer.obstacle_cursor, self.observer.branch_cursor) = state
+        player.hitbox.x = PLAYER_TARGET_X
+
+    def apply_action(self, action):
+        # Đường trên chỉ tới được bằng cách nhảy lên; đường dưới là tiếp tục chạy
+        if action == ACTION_JUMP or action == ACTION_UPPER:
+            self.player.jump()
+
+    def step(self, action=ACTION_NOOP):
+        """Một frame, cùng thứ tự với PlayingState.update. Trả về status (None = còn chạy)."""
+        if self.status is not STATUS_RUNNING:
+            return self.status
+        self.apply_action(action)
+        self.ticks += 1
+
+        if self.is_endless:
+            if self.current_run_speed < MAX_RUN_SPEED:
+                self.current_run_speed += SPEED_INCREASE_RATE * SIM_DELTA_TIME
+            self.current_run_speed = min(self.current_run_speed, MAX_RUN_SPEED)
+
+        self.world_x_offset += self.current_run_speed * SIM_DELTA_TIME * 60
+
+        view_min = self.world_x_offset - CULL_MARGIN
+        view_max = self.world_x_offset + SCREEN_W + CULL_MARGIN
+        player = self.player
+        wall_check = player.update(
+            self.platforms.window(view_min, view_max),
+            self.world_x_offset,
+            SIM_DELTA_TIME,
+            wall_tiles=self.wall_tiles.window(view_min, view_max),
+        )
+
+        # Camera lock
+        self.world_x_offset += player.hitbox.x - PLAYER_TARGET_X
+        player.hitbox.x = PLAYER_TARGET_X
+
+        if wall_check == STATUS_WALL_TIME:
+            self.status = STATUS_WALL_TIME
+            return self.status
+
+        px = self.player_world_x
+        hitbox = player.hitbox
+        for ob in self.real_obstacles.window(px - 1, px + hitbox.width + 1):
+            # Như ObstacleSprite: tâm được làm tròn trên màn hình (sau khi trừ world_x_offset)
+            half = ob.w // 2
+            left = _pygame_round(ob.x + half - self.world_x_offset) - half
+            if hitbox.colliderect((left, ob.y - ob.h, ob.w, ob.h)):
+                self.status = STATUS_DEAD
+                return self.status
+
+        if player.hitbox.top > SCREEN_H:
+            self.status = STATUS_DEAD
+            return self.status
+
+        if self.is_endless:
+            if self.cursor_x < self.world_x_offset + SCREEN_W * 1.5:
+                self._spawn_next_segment()
+        elif self.player_world_x >= self.level_length - PLAYER_W:
+            self.status = STATUS_COMPLETED
+        return self.status
@@ -0,0 +1,699 @@
+# trainer.py - HEADLESS NEAT TRAINING
+import argparse
+import copy
+import glob
+import heapq
+import json
+import multiprocessing
+import os
+import pickle
+
+import neat
+import numpy as np
+from neat.reporting import BaseReporter
+
+from config import *
+from main import load_level
+from simulation import Simulation, STATUS_COMPLETED, SIM_DELTA_TIME
+from fitness_cache import FitnessCache, level_file_hash, DEFAULT_CACHE_FILE
+from compiled_network import CompiledPopulation
+from observations import ray_count
+from shared_level import SharedLevel
+from checkpoint import (IncrementalCheckpointer, latest_checkpoint, new_run_directory, restore_checkpoint,
+                        DEFAULT_CHECKPOINT_DIR)
+
+NEAT_CONFIG_FILE = "config-neat.txt"
+BEST_GENOME_FILE = "best_genome.pkl"
+
+# Thưởng thêm khi agent hoàn thành level (fitness cơ bản = quãng đường đã chạy)
+COMPLETION_BONUS = 500
+
+# Lý do dừng sớm (xem EarlyStopping)
+STOP_NO_PROGRESS = "NO_PROGRESS"
+STOP_WALL_SLIDE = "WALL_SLIDE"
+STOP_CANNOT_WIN = "CANNOT_BEAT_TOP_K"
+
+def load_neat_config(config_path=NEAT_CONFIG_FILE):
+    return neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                       neat.DefaultSpeciesSet, neat.DefaultStagnation, config_path)
+
+def choose_action(output):
+    """Action có output lớn nhất (0: noop, 1: jump, 2: upper, 3: lower)"""
+    return max(range(len(output)), key=output.__getitem__)
+
+def compute_fitness(sim):
+    fitness = float(sim.world_x_offset)
+    if sim.status == STATUS_COMPLETED:
+        fitness += COMPLETION_BONUS
+    return fitness
+
+# -------------------------
+# Early Termination
+# -------------------------
+class EarlyStopping:
+    """
+    Dừng sớm các run không còn ý nghĩa:
+    - không tiến về phía trước trong no_progress_ticks ticks (kẹt vào tường, ...)
+    - trượt tường mà không lên cao hơn trong wall_slide_ticks ticks
+    - fitness tối đa còn có thể đạt < fitness thứ top_k của generation hiện tại
+
+    Quy tắc cuối không bao giờ loại một genome có thể lọt vào top-k, nên
+    các genome thắng không đổi; fitness bị cắt theo quy tắc này không được cache.
+    """
+    def __init__(self, no_progress_ticks=EARLY_STOP_NO_PROGRESS_TICKS,
+                 wall_slide_ticks=EARLY_STOP_WALL_SLIDE_TICKS, top_k=EARLY_STOP_TOP_K):
+        self.no_progress_ticks = no_progress_ticks
+        self.wall_slide_ticks = wall_slide_ticks
+        self.top_k = top_k
+        self.top_scores = []
+        self.stop_counts = {}
+
+    def settings(self):
+        """Tham số khởi tạo, để tạo lại EarlyStopping trong worker process"""
+        return {"no_progress_ticks": self.no_progress_ticks, "wall_slide_ticks": self.wall_slide_ticks,
+                "top_k": self.top_k}
+
+    def describe(self):
+        """Các quy tắc ảnh hưởng tới fitness được cache (quy tắc top-k không được cache)"""
+        return f"np={self.no_progress_ticks},ws={self.wall_slide_ticks}"
+
+    def start_generation(self):
+        self.top_scores = []
+        self.stop_counts = {}
+
+    def record(self, fitness):
+        if not self.top_k:
+            return
+        if len(self.top_scores) < self.top_k:
+            heapq.heappush(self.top_scores, fitness)
+        elif fitness > self.top_scores[0]:
+            heapq.heapreplace(self.top_scores, fitness)
+
+    def start_run(self, sim):
+        """Trạng thái theo dõi cho một run (mỗi agent một object khi chạy lockstep)."""
+        return RunProgress(sim)
+
+    def check(self, sim, progress, max_steps):
+        """Trả về lý do dừng hoặc None."""
+        if sim.world_x_offset > progress.best_x:
+            progress.best_x = sim.world_x_offset
+            progress.last_progress_tick = sim.ticks
+        elif self.no_progress_ticks and sim.ticks - progress.last_progress_tick >= self.no_progress_ticks:
+            return STOP_NO_PROGRESS
+
+        player = sim.player
+        if player.wall_state.is_sliding and not player.on_ground:
+            if progress.slide_best_bottom is None or player.hitbox.bottom < progress.slide_best_bottom:
+                progress.slide_best_bottom = player.hitbox.bottom
+                progress.slide_ticks = 0
+            else:
+                progress.slide_ticks += 1
+                if self.wall_slide_ticks and progress.slide_ticks >= self.wall_slide_ticks:
+                    return STOP_WALL_SLIDE
+        else:
+            progress.slide_best_bottom = None
+            progress.slide_ticks = 0
+
+        if self.top_k and len(self.top_scores) == self.top_k:
+            best_possible = sim.world_x_offset + (max_steps - sim.ticks) * progress.max_progress_per_tick
+            if not sim.is_endless:
+                best_possible = min(best_possible, sim.level_length + progress.max_progress_per_tick)
+                best_possible += COMPLETION_BONUS
+            if best_possible < self.top_scores[0]:
+                return STOP_CANNOT_WIN
+        return None
+
+    def count_stop(self, reason):
+        self.stop_counts[reason] = self.stop_counts.get(reason, 0) + 1
+
+class RunProgress:
+    """Tiến độ của một run, dùng bởi EarlyStopping.check"""
+    def __init__(self, sim):
+        self.best_x = sim.world_x_offset
+        self.last_progress_tick = sim.ticks
+        self.slide_best_bottom = None
+        self.slide_ticks = 0
+        # Quãng đường tối đa mỗi tick (chỉ camera scroll đẩy player về phía trước)
+        self.max_progress_per_tick = (MAX_RUN_SPEED if sim.is_endless else RUN_SPEED) * SIM_DELTA_TIME * 60
+
+def run_genome(net, sim, max_steps=MAX_STEPS_PER_GENOME, early_stopping=None):
+    """
+    Chạy một network trên simulation đến khi chết, xong level, hết số bước
+    hoặc bị early_stopping dừng. Trả về (fitness, lý do dừng sớm hoặc None).
+    """
+    sim.reset()
+    progress = early_stopping.start_run(sim) if early_stopping is not None else None
+    stop_reason = None
+    while not sim.done and sim.ticks < max_steps:
+        sim.step(choose_action(net.activate(sim.observe())))
+        if early_stopping is not None:
+            stop_reason = early_stopping.check(sim, progress, max_steps)
+            if stop_reason:
+                break
+    return compute_fitness(sim), stop_reason
+
+def run_population(compiled, sims, max_steps=MAX_STEPS_PER_GENOME, early_stopping=None, on_finish=None):
+    """
+    Chạy lockstep cả population: mỗi tick gom observation của các agent còn sống
+    thành một mảng và tính mọi network bằng một lần CompiledPopulation.activate.
+    sims[i] là Simulation của genome thứ i. on_finish(i, fitness, stop_reason) được
+    gọi ngay khi agent i kết thúc (để EarlyStopping cập nhật top-k sớm).
+    Trả về list (fitness, stop_reason).
+    """
+    results = [None] * len(sims)
+    progress = []
+    for sim in sims:
+        sim.reset()
+        progress.append(early_stopping.start_run(sim) if early_stopping is not None else None)
+
+    active = list(range(len(sims)))
+    observations = np.zeros((len(sims), sims[0].observation_size if sims else 0), dtype=np.float64)
+    while active:
+        for row, i in enumerate(active):
+            observations[row] = sims[i].observe()
+        rows = None if len(active) == len(sims) else active
+        actions = compiled.activate(observations[:len(active)], rows).argmax(axis=1)
+
+        still_active = []
+        for row, i in enumerate(active):
+            sim = sims[i]
+            sim.step(int(actions[row]))
+            stop_reason = None
+            if early_stopping is not None:
+                stop_reason = early_stopping.check(sim, progress[i], max_steps)
+            if stop_reason or sim.done or sim.ticks >= max_steps:
+                results[i] = (compute_fitness(sim), stop_reason)
+                if on_finish is not None:
+                    on_finish(i, results[i][0], stop_reason)
+            else:
+                still_active.append(i)
+        active = still_active
+    return results
+
+# -------------------------
+# Resident Levels
+# -------------------------
+class LevelRuntime:
+    """
+    Một (level, seed) đã load cùng các Simulation tái sử dụng giữa các generation.
+    Mỗi process giữ thường trú mọi LevelRuntime nó cần, nên đổi level không tốn gì.
+    level_data có thể dùng chung giữa các seed của cùng một level.
+    shared_level: SharedLevel của level (trong worker) thay cho load_level.
+    """
+    def __init__(self, level_file, seed=0, level_data=None, digest=None, shared_level=None):
+        self.level_file = level_file
+        self.seed = seed
+        self.shared_level = shared_level
+        if shared_level is not None:
+            level_data = shared_level.level_data
+        self.level_data = level_data if level_data is not None else load_level(level_file)
+        self._digest = digest
+        self.simulations = []
+
+    @property
+    def digest(self):
+        # Chỉ process chính cần (cache key), worker không phải đọc lại file level
+        if self._digest is None:
+            self._digest = level_file_hash(os.path.join("levels", self.level_file))
+        return self._digest
+
+    @property
+    def key(self):
+        return (self.level_file, self.seed)
+
+    @property
+    def is_endless(self):
+        return self.level_data["is_endless"]
+
+    @property
+    def level_length(self):
+        return -1 if self.is_endless else self.level_data["length"]
+
+    def estimated_ticks(self, max_steps=MAX_STEPS_PER_GENOME):
+        """Số tick tối đa một genome có thể chạy trên level này (chi phí để chia tải)."""
+        if self.is_endless:
+            return max_steps
+        return min(max_steps, int(self.level_length / (RUN_SPEED * SIM_DELTA_TIME * 60)) + 1)
+
+    def simulations_for(self, count, rays=0):
+        if self.simulations and self.simulations[0].rays != rays:
+            self.simulations = []
+        while len(self.simulations) < count:
+            self.simulations.append(Simulation(self.level_data, seed=self.seed, shared_level=self.shared_level,
+                                               rays=rays))
+        return self.simulations[:count]
+
+def load_runtimes(level_files, seeds=(0,), shared_levels=None):
+    """
+    LevelRuntime cho mọi task: level endless được chạy với từng seed,
+    level thường chỉ một lần (seed không ảnh hưởng).
+    shared_levels: dict level_file -> SharedLevel cho các level thường đã publish.
+    Trả về dict (level_file, seed) -> LevelRuntime, theo thứ tự level_files.
+    """
+    shared_levels = shared_levels or {}
+    runtimes = {}
+    for level_file in level_files:
+        first = LevelRuntime(level_file, seeds[0], shared_level=shared_levels.get(level_file))
+        runtimes[first.key] = first
+        if first.is_endless:
+            for seed in seeds[1:]:
+                runtime = LevelRuntime(level_file, seed, first.level_data, first.digest)
+                runtimes[runtime.key] = runtime
+    return runtimes
+
+def simulate_genomes(runtime, genomes, config, max_steps=MAX_STEPS_PER_GENOME, early_stopping=None, batch=True):
+    """
+    Mô phỏng genomes trên một LevelRuntime (không dùng cache).
+    Trả về list (fitness, stop_reason, ticks) theo thứ tự genomes.
+    Số input của config NEAT quyết định số tia RaySensor (xem observations.ray_count).
+    """
+    results = []
+    rays = ray_count(config.genome_config.num_inputs)
+    if batch:
+        sims = runtime.simulations_for(len(genomes), rays)
+        on_finish = None
+        if early_stopping is not None:
+            on_finish = lambda i, fitness, stop_reason: early_stopping.record(fitness)
+        outcomes = run_population(CompiledPopulation(genomes, config), sims, max_steps, early_stopping, on_finish)
+        for sim, (fitness, stop_reason) in zip(sims, outcomes):
+            results.append((fitness, stop_reason, sim.ticks))
+    else:
+        sim = runtime.simulations_for(1, rays)[0]
+        for genome in genomes:
+            net = neat.nn.FeedForwardNetwork.create(genome, config)
+            fitness, stop_reason = run_genome(net, sim, max_steps, early_stopping)
+            if early_stopping is not None:
+                early_stopping.record(fitness)
+            results.append((fitness, stop_reason, sim.ticks))
+    return results
+
+# Gộp fitness của một genome trên nhiều task thành một giá trị
+REDUCERS = {
+    "mean": lambda values: sum(values) / len(values),
+    "min": min,
+}
+
+def plan_shards(pending, costs, num_shards):
+    """
+    Chia các (task, genome) chưa có fitness thành các shard có chi phí gần bằng nhau.
+    pending: dict task key -> list genome. costs: dict task key -> tick ước tính / genome.
+    Level dài được chia thành nhiều shard hơn; shard được trả về theo chi phí
+    giảm dần (longest-first), để pool phát việc dài trước và không core nào
+    phải chờ một shard dài cuối cùng.
+    Trả về list (cost, task key, list vị trí genome trong pending[task key]).
+    """
+    total_cost = sum(costs[key] * len(genomes) for key, genomes in pending.items())
+    target = max(1, total_cost / max(1, num_shards))
+    shards = []
+    for key, genomes in pending.items():
+        if not genomes:
+            continue
+        count = min(len(genomes), max(1, round(costs[key] * len(genomes) / target)))
+        for i in range(count):
+            positions = list(range(i, len(genomes), count))
+            shards.append((costs[key] * len(positions), key, positions))
+    shards.sort(key=lambda shard: shard[0], reverse=True)
+    return shards
+
+# -------------------------
+# Worker Processes
+# -------------------------
+# Trạng thái thường trú của mỗi worker: mọi level được nạp một lần khi worker khởi động.
+# Level thường được map read-only từ shared memory, chỉ level endless mới load_level.
+_WORKER_STATE = {}
+
+def _init_worker(level_files, seeds, shared_handles, config, max_steps, early_stop_settings, batch):
+    shared_levels = {level_file: SharedLevel.attach(handle) for level_file, handle in shared_handles.items()}
+    _WORKER_STATE["levels"] = load_runtimes(level_files, seeds, shared_levels)
+    _WORKER_STATE["config"] = config
+    _WORKER_STATE["max_steps"] = max_steps
+    _WORKER_STATE["early_stop_settings"] = early_stop_settings
+    _WORKER_STATE["batch"] = batch
+
+def _simulate_shard(task):
+    """
+    task = (shard_id, level key, genomes, top_scores). top_scores là top-k của
+    level đó đã biết ở process chính. Trả về (shard_id, kết quả).
+    """
+    shard_id, key, genomes, top_scores = task
+    early_stopping = None
+    settings = _WORKER_STATE["early_stop_settings"]
+    if settings is not None:
+        early_stopping = EarlyStopping(**settings)
+        for fitness in top_scores:
+            early_stopping.record(fitness)
+    results = simulate_genomes(_WORKER_STATE["levels"][key], genomes, _WORKER_STATE["config"],
+                               _WORKER_STATE["max_steps"], early_stopping, _WORKER_STATE["batch"])
+    return shard_id, results
+
+# -------------------------
+# Genome Evaluation
+# -------------------------
+class GenomeEvaluator:
+    """
+    Hàm eval_genomes cho neat.Population.run.
+    - Mỗi genome được chấm trên mọi task (level, seed) đang bật (set_levels /
+      set_level để đổi, ví dụ theo curriculum); fitness các task được gộp bằng reduce.
+    - Fitness được tra trong FitnessCache trước (theo từng task); các genome đã cache
+      được tính trước để quy tắc top-k của EarlyStopping có ngưỡng ngay từ đầu.
+      Top-k được giữ riêng cho từng task vì fitness các level không cùng thang đo.
+    - workers > 0: các cặp (task, genome) chưa cache được chia shard cho process pool.
+    """
+    def __init__(self, level_files=DEFAULT_LEVEL, config=None, seed=0, cache=None,
+                 max_steps=MAX_STEPS_PER_GENOME, early_stopping=None, batch=True, workers=0,
+                 seeds=None, reduce="mean"):
+        if isinstance(level_files, str):
+            level_files = [level_files]
+        self.seeds = list(seeds) if seeds else [seed]
+        self.cache = cache
+        self.max_steps = max_steps
+        self.early_stopping = early_stopping
+        # batch: mô phỏng lockstep với CompiledPopulation thay vì từng genome một
+        self.batch = batch
+        self.reduce = REDUCERS[reduce]
+        self.levels = load_runtimes(level_files, self.seeds)
+        self.task_stopping = {}
+        if early_stopping is not None:
+            self.task_stopping = {key: EarlyStopping(**early_stopping.settings()) for key in self.levels}
+        self.set_levels(level_files)
+        # Thiết lập ảnh hưởng tới fitness, là một phần của cache key
+        self.cache_context = f"steps={max_steps}"
+        if early_stopping is not None:
+            self.cache_context += f",{early_stopping.describe()}"
+        self.ticks_simulated = 0
+
+        self.workers = workers
+        self.pool = None
+        self.shared_levels = {}
+        if workers:
+            self.shared_levels = self.publish_levels()
+            shared_handles = {level_file: shared.handle for level_file, shared in self.shared_levels.items()}
+            early_stop_settings = early_stopping.settings() if early_stopping is not None else None
+            self.pool = multiprocessing.Pool(workers, initializer=_init_worker,
+                                             initargs=(level_files, self.seeds, shared_handles, config,
+                                                       max_steps, early_stop_settings, batch))
+
+    def publish_levels(self):
+        """Publish mỗi level thường một lần vào shared memory cho các worker."""
+        shared_levels = {}
+        for (level_file, seed), runtime in self.levels.items():
+            if not runtime.is_endless and level_file not in shared_levels:
+                shared_levels[level_file] = SharedLevel.publish(runtime.level_data)
+        if shared_levels:
+            total = sum(shared.nbytes for shared in shared_levels.values())
+            print(f"📦 Published {len(shared_levels)} levels to shared memory ({total / 1024:.1f} KB)")
+        return shared_levels
+
+    def runtimes_for(self, level_file):
+        runtimes = [runtime for key, runtime in self.levels.items() if key[0] == level_file]
+        if not runtimes:
+            raise KeyError(f"Level {level_file} is not resident in this evaluator")
+        return runtimes
+
+    def set_levels(self, level_files):
+        self.tasks = [runtime.key for level_file in level_files for runtime in self.runtimes_for(level_file)]
+        self.level_files = list(level_files)
+
+    def set_level(self, level_file):
+        self.set_levels([level_file])
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        for shared in self.shared_levels.values():
+            shared.unlink()
+        self.shared_levels = {}
+
+    def cache_key(self, genome, key):
+        runtime = self.levels[key]
+        return FitnessCache.make_key(genome, runtime.digest, runtime.seed, self.cache_context)
+
+    def lookup(self, genome, key):
+        if self.cache is None:
+            return None
+        return self.cache.get(self.cache_key(genome, key))
+
+    def record_result(self, genome, key, fitness, stop_reason):
+        if stop_reason is not None:
+            self.early_stopping.count_stop(stop_reason)
+        if self.cache is not None and stop_reason != STOP_CANNOT_WIN:
+            self.cache.put(self.cache_key(genome, key), fitness)
+
+    def simulate_pending(self, pending, config):
+        """pending: dict task key -> list genome. Trả về dict task key -> list (fitness, stop_reason, ticks)."""
+        if self.pool is None:
+            return {key: simulate_genomes(self.levels[key], genomes, config, self.max_steps,
+                                          self.task_stopping.get(key), self.batch)
+                    for key, genomes in pending.items() if genomes}
+
+        # Vài shard cho mỗi worker; shard dài được phát trước (imap_unordered, chunksize 1)
+        costs = {key: self.levels[key].estimated_ticks(self.max_steps) for key in pending}
+        shards = plan_shards(pending, costs, self.workers * 4)
+        tasks = []
+        for shard_id, (cost, key, positions) in enumerate(shards):
+            stopping = self.task_stopping.get(key)
+            top_scores = list(stopping.top_scores) if stopping is not None else []
+            tasks.append((shard_id, key, [pending[key][p] for p in positions], top_scores))
+
+        results = {key: [None] * len(genomes) for key, genomes in pending.items()}
+        for shard_id, shard_results in self.pool.imap_unordered(_simulate_shard, tasks):
+            cost, key, positions = shards[shard_id]
+            stopping = self.task_stopping.get(key)
+            for position, result in zip(positions, shard_results):
+                results[key][position] = result
+                if stopping is not None:
+                    stopping.record(result[0])
+        return results
+
+    def __call__(self, genomes, config):
+        if self.early_stopping is not None:
+            self.early_stopping.start_generation()
+        for stopping in self.task_stopping.values():
+            stopping.start_generation()
+        self.ticks_simulated = 0
+
+        scores = {genome_id: [] for genome_id, genome in genomes}
+        pending = {key: [] for key in self.tasks}
+        for key in self.tasks:
+            stopping = self.task_stopping.get(key)
+            for genome_id, genome in genomes:
+                cached = self.lookup(genome, key)
+                if cached is None:
+                    pending[key].append(genome)
+                    continue
+                scores[genome_id].append(cached)
+                if stopping is not None:
+                    stopping.record(cached)
+
+        num_simulated = 0
+        for key, results in self.simulate_pending(pending, config).items():
+            for genome, (fitness, stop_reason, ticks) in zip(pending[key], results):
+                scores[genome.key].append(fitness)
+                self.ticks_simulated += ticks
+                self.record_result(genome, key, fitness, stop_reason)
+            num_simulated += len(results)
+
+        for genome_id, genome in genomes:
+            genome.fitness = self.reduce(scores[genome_id])
+
+        print(f"   🏃 Simulated {self.ticks_simulated} ticks for {num_simulated} runs on {', '.join(self.level_files)}")
+        if self.early_stopping is not None and self.early_stopping.stop_counts:
+            stops = ", ".join(f"{reason}: {count}" for reason, count in self.early_stopping.stop_counts.items())
+            print(f"   ⏱️ Early stops: {stops}")
+        if self.cache is not None:
+            self.cache.save()
+            stats = self.cache.stats()
+            print(f"   💾 Fitness cache: {stats['entries']} entries, hit rate {stats['hit_rate']*100:.1f}%")
+
+# -------------------------
+# Curriculum
+# -------------------------
+def default_curriculum(levels_dir="levels"):
+    """Các level thường, theo metadata 'order' (giống menu chọn level)."""
+    ordered = []
+    for filepath in glob.glob(os.path.join(levels_dir, "*.json")):
+        try:
+            with open(filepath, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Warning: Could not load {filepath}: {e}")
+            continue
+        if data.get("mode") == "endless":
+            continue
+        ordered.append((data.get("metadata", {}).get("order", 999), os.path.basename(filepath)))
+    return [level_file for order, level_file in sorted(ordered)]
+
+class Curriculum(BaseReporter):
+    """
+    Train lần lượt trên một chuỗi level: khi best fitness của generation đạt
+    promote_ratio * độ dài level (mặc định 1.0 = phải hoàn thành level), chuyển
+    evaluator sang level kế tiếp. Điều kiện dừng fitness_threshold của NEAT chỉ
+    được xét ở level cuối.
+    best_genome: genome tốt nhất của level cao nhất đã train (fitness của các level
+    khác nhau không so sánh được, nên best_genome của neat.Population không dùng được).
+    """
+    def __init__(self, evaluator, config, level_files, promote_ratio=1.0, stage=0):
+        self.evaluator = evaluator
+        self.config = config
+        self.level_files = list(level_files)
+        self.promote_ratio = promote_ratio
+        self.stage = min(stage, len(self.level_files) - 1)
+        self.fitness_termination_disabled = config.no_fitness_termination
+        self.best_genome = None
+        self.best_stage = None
+        evaluator.set_level(self.level_files[self.stage])
+
+    def threshold(self, level_file):
+        runtime = self.evaluator.runtimes_for(level_file)[0]
+        if runtime.is_endless:
+            # Endless: sống hết số bước tối đa
+            return self.promote_ratio * self.evaluator.max_steps * RUN_SPEED
+        return self.promote_ratio * runtime.level_length
+
+    @property
+    def is_final_stage(self):
+        return self.stage == len(self.level_files) - 1
+
+    def post_evaluate(self, config, population, species, best_genome):
+        config.no_fitness_termination = self.fitness_termination_disabled or not self.is_final_stage
+        level_file = self.level_files[self.stage]
+        if self.best_stage != self.stage or best_genome.fitness > self.best_genome.fitness:
+            # Bản sao: genome elite được chấm lại (fitness mới) ở level kế tiếp
+            self.best_genome = copy.deepcopy(best_genome)
+            self.best_stage = self.stage
+        if self.is_final_stage or best_genome.fitness < self.threshold(level_file):
+            return
+        self.stage += 1
+        self.evaluator.set_level(self.level_files[self.stage])
+        print(f"🎓 Curriculum: best fitness {best_genome.fitness:.1f} on {level_file}, "
+              f"promoting to {self.level_files[self.stage]} ({self.stage + 1}/{len(self.level_files)})")
+
+    def state(self):
+        return {"curriculum_stage": self.stage}
+
+# -------------------------
+# Training Entry Point
+# -------------------------
+def run_training(level_file=DEFAULT_LEVEL, generations=DEFAULT_GENERATIONS, seed=0,
+                 config_path=NEAT_CONFIG_FILE, cache_path=DEFAULT_CACHE_FILE, early_stop=True, batch=True,
+                 checkpoint_dir=DEFAULT_CHECKPOINT_DIR, checkpoint_every=5, resume=False,
+                 curriculum=None, promote_ratio=1.0, workers=0, levels=None, seeds=None, reduce="mean",
+                 render=False):
+    """
+    generations là tổng số generation của cả quá trình train; khi resume từ
+    checkpoint chỉ chạy phần còn lại. curriculum: list level thay cho level_file.
+    levels: chấm mỗi genome trên mọi level này (và mọi seed trong seeds với
+    level endless), gộp fitness bằng reduce ("mean" hoặc "min").
+    render: mở cửa sổ viewer (process riêng) phát lại genome tốt nhất mỗi generation.
+    """
+    checkpoint_path = latest_checkpoint(checkpoint_dir) if (resume and checkpoint_dir) else None
+    extra_state = {}
+    if checkpoint_path:
+        population, saved_cache_path, extra_state = restore_checkpoint(checkpoint_path)
+        config = population.config
+        if cache_path and saved_cache_path:
+            cache_path = saved_cache_path
+    else:
+        if resume:
+            print(f"ℹ️ No checkpoint found in '{checkpoint_dir}', starting a new run.")
+        config = load_neat_config(config_path)
+        population = neat.Population(config)
+
+    level_files = curriculum or levels or [level_file]
+    cache = FitnessCache(cache_path) if cache_path else None
+    early_stopping = EarlyStopping() if early_stop else None
+    evaluator = GenomeEvaluator(level_files, config, seed=seed, cache=cache, early_stopping=early_stopping,
+                                batch=batch, workers=workers, seeds=seeds, reduce=reduce)
+
+    population.add_reporter(neat.StdOutReporter(True))
+    population.add_reporter(neat.StatisticsReporter())
+    schedule = None
+    if curriculum:
+        schedule = Curriculum(evaluator, config, curriculum, promote_ratio,
+                              stage=extra_state.get("curriculum_stage", 0))
+        population.add_reporter(schedule)
+    viewer = None
+    if render:
+        from training_viewer import TrainingViewer
+        viewer = TrainingViewer(evaluator, config)
+        population.add_reporter(viewer)
+    if checkpoint_dir and checkpoint_every:
+        # Resume ghi tiếp vào thư mục run đang resume, lần train mới có thư mục run-NNNN riêng
+        run_dir = os.path.dirname(checkpoint_path) if checkpoint_path else new_run_directory(checkpoint_dir)
+        population.add_reporter(IncrementalCheckpointer(population, run_dir, checkpoint_every,
+                                                        fitness_cache=cache,
+                                                        extra_state=schedule.state if schedule else None))
+
+    remaining = generations - population.generation
+    if remaining <= 0:
+        print(f"ℹ️ Checkpoint is already at generation {population.generation}, nothing to train.")
+        evaluator.close()
+        if viewer is not None:
+            viewer.close()
+        return None
+
+    print(f"\n🤖 Training on {', '.join(level_files)} for {remaining} generations (seed={seed}, workers={workers})")
+    try:
+        winner = population.run(evaluator, remaining)
+    finally:
+        evaluator.close()
+
+    if schedule is not None and schedule.best_genome is not None:
+        winner = schedule.best_genome
+        print(f"🎓 Curriculum reached {schedule.level_files[schedule.best_stage]} "
+              f"({schedule.best_stage + 1}/{len(schedule.level_files)})")
+    with open(BEST_GENOME_FILE, "wb") as f:
+        pickle.dump(winner, f)
+    print(f"✓ Best genome (fitness {winner.fitness:.1f}) saved to {BEST_GENOME_FILE}")
+    if viewer is not None:
+        viewer.close()
+    return winner
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the parkour AI with NEAT (headless)")
+    parser.add_argument("--gen", type=int, default=DEFAULT_GENERATIONS, help="number of generations")
+    parser.add_argument("--level", default=DEFAULT_LEVEL, help="level file inside levels/")
+    parser.add_argument("--seed", type=int, default=0, help="seed for endless levels")
+    parser.add_argument("--config", default=NEAT_CONFIG_FILE, help="NEAT config file")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_FILE, help="fitness cache file")
+    parser.add_argument("--no-cache", action="store_true", help="disable the fitness cache")
+    parser.add_argument("--no-early-stop", action="store_true", help="always run genomes to death or max steps")
+    parser.add_argument("--no-batch", action="store_true", help="evaluate genomes one by one with neat.nn")
+    parser.add_argument("--checkpoint-dir", default=DEFAULT_CHECKPOINT_DIR, help="checkpoint directory")
+    parser.add_argument("--checkpoint-every", type=int, default=5, help="generations between checkpoints (0 = off)")
+    parser.add_argument("--resume", action="store_true", help="continue from the latest checkpoint")
+    parser.add_argument("--curriculum", nargs="?", const="default",
+                        help="comma-separated level schedule (no value: all levels by menu order)")
+    parser.add_argument("--promote-at", type=float, default=1.0,
+                        help="promote when best fitness >= this fraction of the level length")
+    parser.add_argument("--workers", type=int, default=0, help="evaluation worker processes (0 = in-process)")
+    parser.add_argument("--levels", help="comma-separated levels; every genome is scored on all of them")
+    parser.add_argument("--seeds", help="comma-separated seeds for endless levels (default: --seed)")
+    parser.add_argument("--render", action="store_true",
+                        help="watch the best genome in a separate viewer window while training")
+    parser.add_argument("--reduce", choices=sorted(REDUCERS), default="mean",
+                        help="how per-level fitness is combined")
+    args = parser.parse_args(argv)
+    if args.curriculum and args.levels:
+        parser.error("--curriculum and --levels cannot be combined")
+
+    curriculum = None
+    if args.curriculum == "default":
+        curriculum = default_curriculum()
+    elif args.curriculum:
+        curriculum = [name.strip() for name in args.curriculum.split(",") if name.strip()]
+    levels = [name.strip() for name in args.levels.split(",") if name.strip()] if args.levels else None
+    seeds = [int(seed) for seed in args.seeds.split(",")] if args.seeds else None
+
+    run_training(args.level, args.gen, seed=args.seed, config_path=args.config,
+                 cache_path=None if args.no_cache else args.cache,
+                 early_stop=not args.no_early_stop, batch=not args.no_batch,
+                 checkpoint_dir=args.checkpoint_dir, checkpoint_every=args.checkpoint_every,
+                 resume=args.resume, curriculum=curriculum, promote_ratio=args.promote_at,
+                 workers=args.workers, levels=levels, seeds=seeds, reduce=args.reduce,
+                 render=args.render)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# training_viewer.py - LIVE TRAINING VIEWER IN A SEPARATE PROCESS
+import multiprocessing
+import queue
+import time
+
+import neat
+import pygame
+
+from config import *
+from main import PlayingState, initialize_pygame_and_assets
+from observations import ray_count
+from simulation import SIM_DELTA_TIME, ACTION_JUMP, ACTION_UPPER
+
+# Số message tối đa chờ trong queue; trainer bỏ message thay vì chờ viewer
+VIEWER_QUEUE_SIZE = 4
+
+PANEL_BG = (0, 0, 0, 160)
+PANEL_TEXT = (230, 230, 230)
+
+# -------------------------
+# Trainer side
+# -------------------------
+class TrainingViewer(neat.reporting.BaseReporter):
+    """
+    Reporter gửi genome tốt nhất và thống kê của mỗi generation sang process viewer.
+    Không bao giờ chặn training: nếu viewer chưa kịp đọc, message bị bỏ qua;
+    nếu cửa sổ viewer đã đóng, reporter ngừng gửi.
+    """
+    def __init__(self, evaluator, config):
+        self.evaluator = evaluator
+        self.queue = multiprocessing.Queue(VIEWER_QUEUE_SIZE)
+        self.process = multiprocessing.Process(target=run_viewer, args=(self.queue, config), name="training-viewer")
+        self.process.start()
+        self.generation = 0
+        self.generation_start = time.perf_counter()
+
+    def start_generation(self, generation):
+        self.generation = generation
+        self.generation_start = time.perf_counter()
+
+    def post_evaluate(self, config, population, species, best_genome):
+        if not self.process.is_alive():
+            return
+        elapsed = max(time.perf_counter() - self.generation_start, 1e-9)
+        fitnesses = [g.fitness for g in population.values() if g.fitness is not None]
+        stats = {
+            "generation": self.generation,
+            "best_fitness": best_genome.fitness,
+            "mean_fitness": sum(fitnesses) / len(fitnesses) if fitnesses else 0.0,
+            "species": len(species.species),
+            "ticks_per_sec": self.evaluator.ticks_simulated / elapsed,
+        }
+        try:
+            self.queue.put_nowait((self.evaluator.level_files[0], best_genome, stats))
+        except queue.Full:
+            pass
+
+    def close(self):
+        """Để viewer tiếp tục chiếu genome cuối cùng cho đến khi cửa sổ được đóng."""
+        self.queue.close()
+        if self.process.is_alive():
+            print("ℹ️ Training finished, close the viewer window to exit.")
+        self.process.join()
+
+# -------------------------
+# Viewer side
+# -------------------------
+class _ReplayGame:
+    """Thay cho Game: PlayingState chỉ cần flip_state/running/game_status/runs."""
+    def __init__(self):
+        self.running = True
+        self.game_status = None
+        self.runs = []
+
+    def flip_state(self, new_state_name):
+        # Chết hoặc hết thời gian bám tường: phát lại từ đầu
+        self.running = False
+        self.game_status = new_state_name
+
+class ReplayViewer:
+    """
+    Phát lại genome tốt nhất hiện tại bằng PlayingState, cộng bảng thống kê.
+    Level endless được phát lại với chuỗi pattern ngẫu nhiên, không theo seed của trainer.
+    """
+    def __init__(self, screen, config):
+        self.screen = screen
+        self.config = config
+        self.clock = pygame.time.Clock()
+        self.font = pygame.font.SysFont(None, int(26 * SCALE_UNIFORM))
+        self.game = _ReplayGame()
+        self.level_file = None
+        self.state = None
+        self.net = None
+        self.stats = None
+        self.pending = None
+        self.replays = 0
+
+    def receive(self, message):
+        """Thống kê được cập nhật ngay; genome mới được dùng từ lượt replay kế tiếp."""
+        self.pending = message
+        self.stats = message[2]
+        if self.state is None:
+            self.restart()
+
+    def restart(self):
+        if self.pending is not None:
+            level_file, genome, stats = self.pending
+            self.pending = None
+            self.net = neat.nn.FeedForwardNetwork.create(genome, self.config)
+            if level_file != self.level_file:
+                self.level_file = level_file
+                self.state = PlayingState(self.game, level_file)
+                self.state.rays = ray_count(self.config.genome_config.num_inputs)
+        self.game.running = True
+        self.game.game_status = None
+        self.game.runs.clear()  # Replay của AI không được lưu
+        self.state.enter_state()
+        self.replays += 1
+
+    def step(self):
+        if self.state is None:
+            return
+        output = self.net.activate(self.state.get_observation())
+        action = max(range(len(output)), key=output.__getitem__)
+        if action == ACTION_JUMP or action == ACTION_UPPER:
+            self.state.player.jump()
+        # Bước cố định như simulation để replay khớp với lúc đánh giá
+        self.state.update(SIM_DELTA_TIME)
+        if not self.game.running:
+            self.restart()
+
+    def draw(self):
+        if self.state is None:
+            self.screen.fill((20, 20, 28))
+            text = self.font.render("Waiting for the first generation...", True, PANEL_TEXT)
+            self.screen.blit(text, text.get_rect(center=(SCREEN_W // 2, SCREEN_H // 2)))
+            return
+        self.state.draw(self.screen)
+        self.draw_panel()
+
+    def draw_panel(self):
+        stats = self.stats
+        lines = [
+            f"Generation {stats['generation']}  |  {self.level_file}",
+            f"Best fitness: {stats['best_fitness']:.1f}",
+            f"Mean fitness: {stats['mean_fitness']:.1f}",
+            f"Species: {stats['species']}",
+            f"Headless speed: {stats['ticks_per_sec']:,.0f} ticks/s",
+            f"Replay #{self.replays}  x={self.state.world_x_offset:.0f}",
+        ]
+        rendered = [self.font.render(line, True, PANEL_TEXT) for line in lines]
+        padding = int(10 * SCALE_UNIFORM)
+        width = max(surface.get_width() for surface in rendered) + 2 * padding
+        height = sum(surface.get_height() for surface in rendered) + 2 * padding
+        panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        panel.fill(PANEL_BG)
+        y = padding
+        for surface in rendered:
+            panel.blit(surface, (padding, y))
+            y += surface.get_height()
+        self.screen.blit(panel, (padding, padding))
+
+    def run(self, message_queue):
+        running = True
+        while running:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                    running = False
+
+            # Chỉ lấy message mới nhất
+            latest = None
+            try:
+                while True:
+                    latest = message_queue.get_nowait()
+            except queue.Empty:
+                pass
+            except (EOFError, OSError):
+                pass
+            if latest is not None:
+                self.receive(latest)
+
+            self.step()
+            self.draw()
+            pygame.display.flip()
+            self.clock.tick(FPS)
+
+def run_viewer(message_queue, config):
+    """Entry point của process viewer."""
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
+    pygame.display.set_caption("Parkour AI - Training Viewer")
+    initialize_pygame_and_assets()
+    ReplayViewer(screen, config).run(message_queue)
+    pygame.quit()
@@ -3,8 +3,9 @@ import random
 import pygame
 
 from config import *
+from level_grammar import SectionGrammar
 
-def generate_random_level(difficulty=2, sections=5, seed=None):
+def generate_random_level(difficulty=2, sections=5, seed=None, rng=None, terrain_types=None, validate=True):
     """
     Generate random level with specified difficulty
     
@@ -12,85 +13,47 @@ def generate_random_level(difficulty=2, sections=5, seed=None):
         difficulty (int): 1-5, higher = harder
         sections (int): Number of sections
         seed (int): Random seed for reproducibility
+        rng (random.Random): Generator to draw from instead of seed
+        terrain_types (list): Allowed section types (default: all, see level_grammar)
+        validate (bool): Regenerate sections that fail the physics check
     
     Returns:
         dict: Level data structure
     """
-    if seed:
-        random.seed(seed)
-    
-    # Obstacle density based on difficulty
-    obstacle_density = {
-        1: (150, 250, 0.3),  # (min_gap, max_gap, real_ratio)
-        2: (120, 200, 0.5),
-        3: (100, 150, 0.6),
-        4: (80, 130, 0.7),
-        5: (70, 100, 0.8)
-    }
-    
-    min_gap, max_gap, real_ratio = obstacle_density.get(difficulty, (100, 150, 0.5))
-    
-    level = {"sections": []}
-    
-    for i in range(sections):
-        # 40% chance for branch, 60% for straight
-        if random.random() > 0.6 and i > 0:  # No branch at start
-            # Branch section
-            cursor_x = sum([
-                s.get("length", max([p["length"] for p in s.get("paths", [{"length": 300}])]))
-                for s in level["sections"]
-            ])
-            
-            paths = []
-            for path_idx in range(2):
-                offset = 0 if path_idx == 0 else random.randint(-170, -110)
-                length = random.randint(350, 500)
-                obstacles = []
-                
-                x = random.randint(80, 150)
-                while x < length - 100:
-                    kind = "real" if random.random() < real_ratio else "fake"
-                    obstacles.append({
-                        "x": x,
-                        "y": "ground",
-                        "kind": kind
-                    })
-                    x += random.randint(min_gap + 20, max_gap + 30)
-                
-                paths.append({
-                    "offset_y": offset,
-                    "length": length,
-                    "obstacles": obstacles
-                })
-            
-            level["sections"].append({
-                "type": "branch",
-                "branch_x": cursor_x + 50,
-                "paths": paths
-            })
-        else:
-            # Straight section
-            length = random.randint(400, 700)
-            obstacles = []
-            
-            x = random.randint(80, 150)
-            while x < length - 100:
-                kind = "real" if random.random() < real_ratio else "fake"
-                obstacles.append({
-                    "x": x,
-                    "y": "ground",
-                    "kind": kind
-                })
-                x += random.randint(min_gap, max_gap)
-            
-            level["sections"].append({
-                "type": "straight",
-                "length": length,
-                "platform_y": GROUND_Y,
-                "obstacles": obstacles
-            })
-    
-    return level
+    # Generator riêng: không đụng tới random toàn cục của caller / worker khác
+    if rng is None:
+        rng = random.Random(seed)
+    grammar = SectionGrammar(difficulty, rng=rng, validate=validate)
+    return grammar.level(sections, terrain_types=terrain_types)
+
+# Số lần sinh section tối đa cho mỗi pattern endless (grammar có thể không đủ pattern khác nhau)
+ENDLESS_ATTEMPTS_PER_PATTERN = 50
+
+def generate_endless_patterns(count=12, difficulty=3, seed=None, base_y=360):
+    """
+    Patterns cho level endless: mỗi pattern bắt đầu ở base_y và không kết thúc thấp hơn
+    base_y, nên pattern kế tiếp (bắt đầu lại ở base_y) luôn tới được bằng cách rơi xuống.
+    Raise ValueError nếu sau count * ENDLESS_ATTEMPTS_PER_PATTERN lần thử vẫn chưa đủ count
+    pattern khác nhau.
+    """
+    grammar = SectionGrammar(difficulty, seed=seed)
+    terrain_types = ["straight", "stairs_up", "gap", "wall_jump", "branch"]
+    patterns = []
+    seen = set()
+    max_attempts = count * ENDLESS_ATTEMPTS_PER_PATTERN
+    for _ in range(max_attempts):
+        if len(patterns) >= count:
+            break
+        config, _, exit_y = grammar.section(base_y, terrain_types)
+        key = json.dumps(config, sort_keys=True)
+        if exit_y > base_y or key in seen:
+            continue
+        seen.add(key)
+        patterns.append(dict(config, id=f"{config['type']}_{len(patterns)}"))
+    if len(patterns) < count:
+        raise ValueError(f"Only {len(patterns)} of {count} distinct endless patterns found at difficulty "
+                         f"{difficulty} after {max_attempts} attempts, request fewer patterns")
+    return patterns
 
 def save_level(level_data, filename):
     """Save level to JSON file"""
@@ -103,6 +66,26 @@ def load_level_json(filename):
     with open(filename, "r", encoding="utf-8") as f:
         return json.load(f)
 
+def _section_length(sec):
+    """Length of a section JSON, using the same defaults as TerrainGenerator"""
+    terrain = sec.get("type", "straight")
+    if terrain in ("stairs_up", "stairs_down"):
+        return sec.get("step_width", 120 if terrain == "stairs_up" else 100) * sec.get("step_count", 5)
+    if terrain == "wall_jump":
+        return 100 + sec.get("shaft_width", 150) + 10 + 150
+    if terrain == "section_sequence":
+        return sum(_section_length(sub) for sub in sec.get("sequence", []))
+    if terrain == "branch":
+        return max([_section_length(p) for p in sec.get("paths", [])] + [0])
+    return sec.get("length", 500)
+
+def _section_obstacles(sec):
+    """All obstacle entries of a section, including branch paths and sequences"""
+    obstacles = list(sec.get("obstacles", []))
+    for sub in sec.get("paths", []) + sec.get("sequence", []):
+        obstacles.extend(_section_obstacles(sub))
+    return obstacles
+
 def analyze_level_difficulty(level_data):
     """
     Analyze level and return difficulty metrics
@@ -111,29 +94,17 @@ def analyze_level_difficulty(level_data):
         dict: Difficulty metrics
     """
     sections = level_data.get("sections", [])
-    total_length = 0
+    total_length = sum(_section_length(sec) for sec in sections)
     real_monsters = 0
     fake_monsters = 0
-    branches = 0
+    branches = sum(1 for sec in sections if sec.get("type") == "branch")
     
     for sec in sections:
-        if sec["type"] == "straight":
-            total_length += sec["length"]
-            for ob in sec.get("obstacles", []):
-                if ob["kind"] == "real":
-                    real_monsters += 1
-                else:
-                    fake_monsters += 1
-        else:
-            branches += 1
-            max_len = max([p["length"] for p in sec["paths"]])
-            total_length += max_len
-            for path in sec["paths"]:
-                for ob in path.get("obstacles", []):
-                    if ob["kind"] == "real":
-                        real_monsters += 1
-                    else:
-                        fake_monsters += 1
+        for ob in _section_obstacles(sec):
+            if ob.get("kind", "real") == "real":
+                real_monsters += 1
+            else:
+                fake_monsters += 1
     
     total_monsters = real_monsters + fake_monsters
     monster_density = total_monsters / (total_length / 100) if total_length > 0 else 0
@@ -189,7 +160,8 @@ def validate_level(level_data):
                 warnings.append(f"Section {i}: Branch must have at least 2 paths")
             
             for path_idx, path in enumerate(sec.get("paths", [])):
-                obstacles = sorted(path.get("obstacles", []), key=lambda x: x["x"])
+                # Stairs paths place obstacles by step_index/x_offset, not x
+                obstacles = sorted((ob for ob in path.get("obstacles", []) if "x" in ob), key=lambda x: x["x"])
                 for j in range(len(obstacles) - 1):
                     gap = obstacles[j+1]["x"] - obstacles[j]["x"]
                     if gap < 60:
@@ -304,9 +276,10 @@ if __name__ == "__main__":
         print("\nUsage:")
         print("  python utils.py generate <difficulty> <sections> <output.json>")
         print("  python utils.py analyze <level.json>")
-        print("  python utils.py validate <level.json>")
+        print("  python utils.py validate <level.json> [more.json ...]")
         print("  python utils.py batch <count> [base_name]")
         print("  python utils.py theme <theme_name> <output.json>")
+        print("  python utils.py endless <patterns> <difficulty> <output.json>")
         print("\nExamples:")
         print("  python utils.py generate 3 6 my_level.json")
         print("  python utils.py analyze level1.json")
@@ -344,17 +317,23 @@ if __name__ == "__main__":
             print("Usage: python utils.py validate <level.json>")
             sys.exit(1)
         
-        filename = sys.argv[2]
-        level = load_level_json(filename)
-        is_valid, warnings = validate_level(level)
+        # Physics check (jump-arc table) cần main.py, chỉ import khi dùng
+        from level_validator import validate_level_physics
         
-        print(f"\nValidation for {filename}:")
-        if is_valid:
-            print("✓ Level is valid!")
-        else:
-            print("⚠ Level has warnings:")
-            for w in warnings:
-                print(f"  - {w}")
+        for filename in sys.argv[2:]:
+            level = load_level_json(filename)
+            warnings = []
+            if level.get("mode") != "endless":
+                warnings.extend(validate_level(level)[1])
+            warnings.extend(validate_level_physics(level)[1])
+            
+            print(f"\nValidation for {filename}:")
+            if not warnings:
+                print("✓ Level is valid!")
+            else:
+                print("⚠ Level has warnings:")
+                for w in warnings:
+                    print(f"  - {w}")
     
     elif command == "batch":
         count = int(sys.argv[2]) if len(sys.argv) > 2 else 5
@@ -375,6 +354,24 @@ if __name__ == "__main__":
         save_level(level, output)
         print_level_info(output)
     
+    elif command == "endless":
+        if len(sys.argv) < 5:
+            print("Usage: python utils.py endless <patterns> <difficulty> <output.json>")
+            sys.exit(1)
+        
+        count = int(sys.argv[2])
+        difficulty = int(sys.argv[3])
+        output = sys.argv[4]
+        
+        patterns = generate_endless_patterns(count, difficulty)
+        level = {
+            "mode": "endless",
+            "spawn_logic": {"order": "random", "avoid_consecutive_same": True},
+            "patterns": patterns,
+        }
+        save_level(level, output)
+        print(f"   {count} patterns: {', '.join(p['id'] for p in patterns)}")
+    
     else:
         print(f"Unknown command: {command}")
         sys.exit(1)